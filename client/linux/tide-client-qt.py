@@ -10,13 +10,14 @@ Usage: python3 tide-client-qt.py
 
 import sys
 import os
+import threading
 from pathlib import Path
 from typing import Optional
 
 from PyQt6.QtWidgets import (
     QApplication, QSystemTrayIcon, QMenu
 )
-from PyQt6.QtCore import QTimer, pyqtSlot
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
 from PyQt6.QtGui import QIcon, QAction
 
 # Add parent directory to path for shared module
@@ -24,6 +25,12 @@ sys.path.insert(0, str(Path(__file__).parent.parent / "shared"))
 from tide_gateway import TideGateway
 
 
+class _EventBridge(QObject):
+    """Carries gateway results from worker threads to the Qt thread"""
+    changed = pyqtSignal(dict)
+    rotated = pyqtSignal(dict)
+
+
 class TideClientApp:
     """Linux Tide Client with system tray"""
     
@@ -36,6 +43,11 @@ class TideClientApp:
         self.menu = None
         self.discovery_timer = None
         self.status_timer = None
+        self.subscription = None
+        
+        self.bridge = _EventBridge()
+        self.bridge.changed.connect(self._on_gateway_event)
+        self.bridge.rotated.connect(self._on_circuit_rotated)
         
         self._setup_tray()
         self._start_discovery()
@@ -172,11 +184,30 @@ class TideClientApp:
                 )
                 self._update_menu()
                 self._update_icon()
-        else:
-            # Refresh status
+                self._subscribe()
+        elif not self.gateway.live:
+            # No live /events stream - fall back to polling
             self.gateway.get_status()
             self._update_menu()
     
+    def _subscribe(self):
+        """Follow gateway state changes instead of polling /status"""
+        if self.subscription is None:
+            self.subscription = self.gateway.subscribe(
+                lambda changed, status: self.bridge.changed.emit(dict(changed))
+            )
+    
+    def _unsubscribe(self):
+        if self.subscription is not None:
+            self.subscription.set()
+            self.subscription = None
+    
+    @pyqtSlot(dict)
+    def _on_gateway_event(self, changed):
+        """Gateway pushed a state change"""
+        self._update_menu()
+        self._update_icon()
+    
     def _update_icon(self):
         """Update tray icon based on connection state"""
         icon = self._create_icon(self.gateway.connected)
@@ -218,21 +249,45 @@ class TideClientApp:
     @pyqtSlot()
     def _on_new_circuit(self):
         """Request new Tor circuit"""
-        if self.gateway.new_circuit():
-            self.tray_icon.showMessage(
-                "Tide Gateway",
-                "New circuit requested.",
-                QSystemTrayIcon.MessageIcon.Information,
-                2000
-            )
-            # Refresh circuit info after a moment
-            QTimer.singleShot(3000, lambda: self.gateway.get_circuit())
+        self.tray_icon.showMessage(
+            "Tide Gateway",
+            "New circuit requested.",
+            QSystemTrayIcon.MessageIcon.Information,
+            2000
+        )
+        # The gateway answers once the new circuit is in use - no guessing
+        threading.Thread(
+            target=lambda: self.bridge.rotated.emit(
+                self.gateway.rotate_circuit(wait=True) or {}),
+            daemon=True
+        ).start()
+    
+    @pyqtSlot(dict)
+    def _on_circuit_rotated(self, result: dict):
+        """New circuit is ready (Qt thread)"""
+        if not result.get("success"):
+            msg = "New circuit failed."
+        elif result.get("ready"):
+            exit_ip = result.get("exit", {}).get("IP", "?")
+            msg = f"New exit IP: {exit_ip}"
+            if result.get("changed") is False:
+                msg += " (same exit)"
+        else:
+            msg = "New circuit ready."
+        
+        self.tray_icon.showMessage(
+            "Tide Gateway",
+            msg,
+            QSystemTrayIcon.MessageIcon.Information,
+            3000
+        )
     
     @pyqtSlot()
     def _on_show_status(self):
         """Show detailed status"""
-        status = self.gateway.get_status()
-        circuit = self.gateway.get_circuit()
+        snapshot = self.gateway.get_snapshot() or {}
+        status = snapshot.get("status")
+        circuit = snapshot.get("circuit")
         
         if status:
             msg = f"Mode: {status.get('mode', '?')}\n"
@@ -251,6 +306,7 @@ class TideClientApp:
     @pyqtSlot()
     def _on_retry_discovery(self):
         """Manually retry gateway discovery"""
+        self._unsubscribe()
         self.gateway.gateway_ip = None
         self._discover()
     
@@ -269,9 +325,10 @@ class TideClientApp:
         if self.gateway.connected:
             self.gateway.disconnect()
         
-        # Stop timers
+        # Stop timers and the event stream
         if self.discovery_timer:
             self.discovery_timer.stop()
+        self._unsubscribe()
         
         # Quit
         self.app.quit()
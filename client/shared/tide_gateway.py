@@ -5,15 +5,798 @@ Shared module for discovering and communicating with Tide Gateway.
 Used by all client platforms (macOS, Windows, Linux).
 """
 
+import asyncio
+import hashlib
+import http.client
+import ipaddress
+import os
 import socket
+import struct
 import subprocess
 import sys
 import json
-from typing import Optional, Dict, Any
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, Iterator, List, Sequence, Tuple
 from urllib.request import urlopen, Request
-from urllib.error import URLError
+from urllib.error import HTTPError, URLError
 from time import sleep
 
+# /status fields fetched while probing candidate gateways
+DISCOVERY_FIELDS = "gateway,version,tor"
+
+# Addresses probed on every discovery, after the system's default gateway
+COMMON_GATEWAYS = (
+    "10.101.101.10",     # Default Tide IP
+    "192.168.1.1",
+    "192.168.0.1",
+    "10.0.0.1",
+)
+BEACON_PORT = 19050
+BEACON_EXPIRY = 35.0     # Gateways beacon every 10 s: three missed, plus slack
+BEACON_RECHECK = 30.0    # Re-probe a beacon IP that did not answer as Tide
+PROBE_TIMEOUT = 2.0      # Per candidate
+CACHE_PROBE_TIMEOUT = 1.0  # Revalidating the cached gateway
+MAX_PROBE_RESPONSE = 65536
+CACHE_NETWORKS = 32      # Networks remembered in the discovery cache
+SWEEP_CONCURRENCY = 128  # Connects in flight during a subnet sweep
+SWEEP_CONNECT_TIMEOUT = 0.25  # A LAN host that has not answered by now is not there
+SWEEP_MAX_PREFIX = 24    # Wider local networks are swept as the /24 around us
+
+
+def sweep_enabled() -> bool:
+    """Subnet sweep is opt-in (TIDE_DISCOVERY_SWEEP=1)"""
+    return os.getenv("TIDE_DISCOVERY_SWEEP", "").lower() in ("1", "true", "yes", "on")
+
+
+def _default_deadline() -> float:
+    """Seconds a discovery round may take (TIDE_DISCOVERY_DEADLINE, default 5)"""
+    try:
+        return max(0.1, float(os.getenv("TIDE_DISCOVERY_DEADLINE", "5")))
+    except ValueError:
+        return 5.0
+
+
+async def _probe(ip: str, api_port: int, timeout: float, etag: Optional[str] = None,
+                 cached: Optional[Dict[str, Any]] = None):
+    """
+    GET /status from one candidate -> (fields, ETag) if it is a Tide
+    gateway. With etag, a 304 Not Modified answer returns `cached`.
+    """
+    # Only ask for what identification (and the tray) needs, so probing
+    # a gateway never triggers its expensive status fields
+    request = (f"GET /status?fields={DISCOVERY_FIELDS} HTTP/1.1\r\n"
+               f"Host: {ip}:{api_port}\r\n"
+               f"User-Agent: TideClient/1.0\r\n"
+               + (f"If-None-Match: {etag}\r\n" if etag else "") +
+               f"Connection: close\r\n\r\n").encode()
+    
+    async def fetch():
+        reader, writer = await asyncio.open_connection(ip, api_port)
+        try:
+            writer.write(request)
+            await writer.drain()
+            # Connection: close - the answer ends at EOF, in however many reads
+            raw = b""
+            while len(raw) < MAX_PROBE_RESPONSE:
+                chunk = await reader.read(MAX_PROBE_RESPONSE - len(raw))
+                if not chunk:
+                    break
+                raw += chunk
+            return raw
+        finally:
+            writer.close()
+    
+    try:
+        raw = await asyncio.wait_for(fetch(), timeout)
+        head, _, body = raw.partition(b"\r\n\r\n")
+        lines = head.split(b"\r\n")
+        status = lines[0].split(b" ", 2)[1]
+        headers = dict((name.strip().lower(), value.strip())
+                       for name, _, value in (line.partition(b":") for line in lines[1:]))
+        tag = headers.get(b"etag", b"").decode() or None
+        if status == b"304" and etag and cached:
+            return dict(cached), tag or etag
+        if status != b"200":
+            return None
+        data = json.loads(body.decode())
+    except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+        return None
+    if isinstance(data, dict) and data.get("gateway") == "tide":
+        return data, tag
+    return None
+
+
+def _beacon_socket(port: int) -> Optional[socket.socket]:
+    """UDP socket bound to the beacon port, or None if it is unavailable"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("", port))
+        sock.setblocking(False)
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def parse_beacon(data: bytes, addr=None) -> Optional[Dict[str, Any]]:
+    """
+    Gateway beacon datagram -> {"ip"}, plus "api_port", "protocol",
+    "seq", "tor", "bootstrap" and "version" for protocol 1 beacons:
+    
+        TIDE:<ip>:<api port>:<protocol>:<seq>:<tor>:<bootstrap>:<version>
+    """
+    try:
+        parts = data.decode("ascii").split(":")
+    except UnicodeDecodeError:
+        return None
+    if parts[0] != "TIDE" or len(parts) < 2 or not (parts[1] or addr):
+        return None
+    beacon: Dict[str, Any] = {"ip": parts[1] or addr[0]}
+    if len(parts) >= 8:
+        try:
+            beacon.update(api_port=int(parts[2]), protocol=int(parts[3]),
+                          seq=int(parts[4]), tor=parts[5],
+                          bootstrap=int(parts[6]) if parts[6] else None,
+                          version=parts[7])
+        except ValueError:
+            pass  # Layout we cannot read - the IP is still good
+    return beacon
+
+
+class _BeaconProtocol(asyncio.DatagramProtocol):
+    """Hands the gateway IP of each beacon to on_beacon"""
+    
+    def __init__(self, on_beacon: Callable[[str], None]):
+        self.on_beacon = on_beacon
+    
+    def datagram_received(self, data, addr):
+        beacon = parse_beacon(data, addr)
+        if beacon:
+            self.on_beacon(beacon["ip"])
+
+
+class BeaconListener:
+    """
+    Listens for gateway beacons in a background thread, bound once for
+    the life of the process, and keeps a table of the gateways heard.
+    
+    Entries expire `expiry` seconds after their last beacon. Subscribers
+    are called from the listener thread with every beacon.
+    
+    Beacons are unauthenticated broadcasts, so the table only says who
+    claims to be a gateway. locate_gateway probes each one's /status on
+    first sighting and records the answer with mark(); a later beacon
+    from the same ip:api_port keeps it.
+    """
+    
+    def __init__(self, port: int = BEACON_PORT, expiry: float = BEACON_EXPIRY):
+        self.port = port
+        self.expiry = expiry
+        self._table: Dict[str, Dict[str, Any]] = {}  # ip -> last beacon
+        self._subscribers: List[Callable[[Dict[str, Any]], None]] = []
+        self._sock: Optional[socket.socket] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+    
+    @property
+    def running(self) -> bool:
+        return self._sock is not None
+    
+    def start(self) -> bool:
+        """Bind and start listening; False if the port is unavailable"""
+        with self._lock:
+            if self._sock is not None:
+                return True
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind(("", self.port))
+                sock.settimeout(1.0)  # Notice stop() within a second
+            except OSError:
+                sock.close()
+                return False
+            self._sock, self._stop = sock, threading.Event()
+        threading.Thread(target=self._run, args=(sock, self._stop),
+                         name="tide-beacons", daemon=True).start()
+        return True
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _run(self, sock: socket.socket, stop: threading.Event):
+        try:
+            while not stop.is_set():
+                try:
+                    data, addr = sock.recvfrom(1024)
+                except socket.timeout:
+                    continue
+                beacon = parse_beacon(data, addr)
+                if beacon is None:
+                    continue
+                beacon["seen"] = time.monotonic()
+                with self._lock:
+                    previous = self._table.get(beacon["ip"])
+                    if previous and previous.get("api_port") == beacon.get("api_port"):
+                        for key in ("verified", "checked"):
+                            if key in previous:
+                                beacon[key] = previous[key]
+                    self._table[beacon["ip"]] = beacon
+                    subscribers = list(self._subscribers)
+                for callback in subscribers:
+                    try:
+                        callback(beacon)
+                    except:
+                        pass
+        except OSError:
+            pass
+        finally:
+            sock.close()
+            with self._lock:
+                if self._sock is sock:
+                    self._sock = None
+    
+    def gateways(self) -> List[Dict[str, Any]]:
+        """Gateways heard within `expiry` seconds, latest first, with their "age" """
+        now = time.monotonic()
+        with self._lock:
+            for ip in [ip for ip, b in self._table.items() if now - b["seen"] > self.expiry]:
+                del self._table[ip]
+            heard = sorted(self._table.values(), key=lambda b: b["seen"], reverse=True)
+        return [dict(b, age=now - b["seen"]) for b in heard]
+    
+    def mark(self, ip: str, api_port: Optional[int], verified: bool):
+        """Record whether the gateway beaconing as ip:api_port answered as Tide"""
+        with self._lock:
+            beacon = self._table.get(ip)
+            if beacon is not None and beacon.get("api_port") == api_port:
+                beacon["verified"] = verified
+                beacon["checked"] = time.monotonic()
+    
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> Callable[[], None]:
+        """Call callback(beacon) for every beacon; returns the unsubscribe function"""
+        with self._lock:
+            self._subscribers.append(callback)
+        
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        
+        return unsubscribe
+
+
+_listeners: Dict[int, BeaconListener] = {}
+_listeners_lock = threading.Lock()
+
+
+def beacon_listener(port: int = BEACON_PORT) -> BeaconListener:
+    """The process's listener for `port`, started on first use"""
+    with _listeners_lock:
+        listener = _listeners.get(port)
+        if listener is None:
+            listener = _listeners[port] = BeaconListener(port)
+    listener.start()
+    return listener
+
+
+async def _sweep(hosts: Sequence[str], port: int, on_open: Callable[[str], None],
+                 concurrency: int = SWEEP_CONCURRENCY,
+                 connect_timeout: float = SWEEP_CONNECT_TIMEOUT):
+    """TCP connect scan: on_open(ip) for every host accepting on port"""
+    slots = asyncio.Semaphore(concurrency)
+    
+    async def knock(ip):
+        async with slots:
+            try:
+                _reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(ip, port), connect_timeout)
+            except (OSError, asyncio.TimeoutError):
+                return
+            writer.close()
+            on_open(ip)
+    
+    await asyncio.gather(*(knock(ip) for ip in hosts))
+
+
+async def _first_gateway(candidates, api_port: int, deadline: float,
+                         beacon_port: Optional[int], sweep: Sequence[str] = (),
+                         concurrency: int = SWEEP_CONCURRENCY):
+    loop = asyncio.get_running_loop()
+    found = loop.create_future()
+    probes: Dict[str, asyncio.Task] = {}
+    transport = scan = unsubscribe = None
+    
+    def settle():
+        # Every probe failed and nothing can add more - give up early
+        if transport is None and unsubscribe is None and \
+                (scan is None or scan.done()) and \
+                not found.done() and all(task.done() for task in probes.values()):
+            found.set_result(None)
+    
+    async def check(ip):
+        answer = await _probe(ip, api_port, min(PROBE_TIMEOUT, deadline))
+        if answer is not None and not found.done():
+            found.set_result((ip,) + answer)
+    
+    def start(ip):
+        if ip and ip not in probes:
+            probes[ip] = loop.create_task(check(ip))
+            probes[ip].add_done_callback(lambda _task: settle())
+    
+    for ip in candidates:
+        start(ip)
+    
+    listener = _listeners.get(beacon_port) if beacon_port else None
+    if listener is not None and listener.running:
+        # The process already listens - follow it instead of binding again
+        for beacon in listener.gateways():
+            start(beacon["ip"])
+        unsubscribe = listener.subscribe(
+            lambda beacon: loop.call_soon_threadsafe(start, beacon["ip"]))
+    elif beacon_port:
+        sock = _beacon_socket(beacon_port)
+        if sock is not None:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _BeaconProtocol(start), sock=sock)
+    if sweep:
+        # Hosts found listening are validated like any other candidate
+        scan = loop.create_task(_sweep(sweep, api_port, start, concurrency))
+        scan.add_done_callback(lambda _task: settle())
+    settle()
+    
+    try:
+        return await asyncio.wait_for(found, deadline)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        # First answer wins - abandon every other attempt
+        if transport is not None:
+            transport.close()
+        if unsubscribe is not None:
+            unsubscribe()
+        tasks = list(probes.values()) + ([scan] if scan else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def discover_gateway(candidates, api_port: int = 9051,
+                     deadline: Optional[float] = None,
+                     beacon_port: Optional[int] = BEACON_PORT,
+                     sweep=False, concurrency: int = SWEEP_CONCURRENCY
+                     ) -> Optional[Tuple[str, Dict[str, Any], Optional[str]]]:
+    """
+    Find a Tide gateway among `candidates` -> (ip, discovery fields, ETag).
+    
+    Probes every candidate's /status and listens for the UDP beacon at
+    the same time; an IP heard in a beacon is probed as soon as it
+    arrives. If this process runs a BeaconListener on beacon_port, the
+    gateways in its table are probed too and no socket is bound.
+    
+    The first gateway that answers as Tide wins and the other attempts
+    are cancelled. Gives up after `deadline` seconds
+    (TIDE_DISCOVERY_DEADLINE, default 5), or as soon as every probe has
+    failed when the beacon port cannot be bound.
+    
+    With sweep=True every host of the local networks (sweep_hosts) is
+    also connect-scanned on api_port, `concurrency` at a time, and the
+    hosts that accept are probed too. sweep may also be a list of hosts.
+    """
+    if deadline is None:
+        deadline = _default_deadline()
+    candidates = list(dict.fromkeys(candidates))
+    if sweep is True:
+        sweep = sweep_hosts()
+    hosts = [ip for ip in sweep or () if ip not in candidates]
+    try:
+        return asyncio.run(_first_gateway(
+            candidates, api_port, deadline, beacon_port, hosts, concurrency))
+    except:
+        return None
+
+
+def default_route() -> Optional[Tuple[str, str]]:
+    """(gateway IP, interface) of the Linux default route, without forking"""
+    try:
+        with open("/proc/net/route") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                # Destination and mask 0 = default; flag 0x2 = RTF_GATEWAY
+                if fields[1] == fields[7] == "00000000" and int(fields[3], 16) & 2:
+                    gateway = int(fields[2], 16).to_bytes(4, "little")
+                    return socket.inet_ntoa(gateway), fields[0]
+    except:
+        pass
+    return None
+
+
+def network_identity() -> Optional[str]:
+    """
+    Name of the network this machine is on, without forking: the default
+    gateway's MAC (Linux ARP table), else its IP, else the /24 of the
+    address the OS would route to Tide from.
+    """
+    route = default_route()
+    if route:
+        gateway, iface = route
+        try:
+            with open("/proc/net/arp") as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[0] == gateway and fields[5] == iface and \
+                            fields[3] != "00:00:00:00:00:00":
+                        return f"mac:{fields[3]}"
+        except:
+            pass
+        return f"gw:{gateway}"
+    
+    try:
+        # connect() on UDP only picks a route - nothing is sent
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect((COMMON_GATEWAYS[0], 9))
+            local = sock.getsockname()[0]
+        return f"net:{ipaddress.ip_network(f'{local}/24', strict=False)}"
+    except:
+        return None
+
+
+def _netlink_addresses() -> List[ipaddress.IPv4Interface]:
+    """IPv4 addresses and prefixes of every interface (Linux rtnetlink dump)"""
+    RTM_NEWADDR, RTM_GETADDR = 20, 22
+    NLMSG_ERROR, NLMSG_DONE = 2, 3
+    NLM_F_REQUEST, NLM_F_DUMP = 0x1, 0x300
+    IFA_ADDRESS, IFA_LOCAL = 1, 2
+    RT_SCOPE_HOST = 254
+    
+    found = []
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, 0) as sock:
+        sock.settimeout(1)
+        sock.bind((0, 0))
+        # nlmsghdr + ifaddrmsg (family only)
+        sock.send(struct.pack("=IHHII", 24, RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, 1, 0) +
+                  struct.pack("=BBBBI", socket.AF_INET, 0, 0, 0, 0))
+        while True:
+            data = sock.recv(65536)
+            offset = 0
+            while offset + 16 <= len(data):
+                length, kind = struct.unpack_from("=IH", data, offset)
+                if kind in (NLMSG_DONE, NLMSG_ERROR) or length < 16:
+                    return found
+                if kind == RTM_NEWADDR:
+                    _family, prefixlen, _flags, scope, _index = \
+                        struct.unpack_from("=BBBBI", data, offset + 16)
+                    attrs, pos, end = {}, offset + 24, offset + length
+                    while pos + 4 <= end:
+                        attr_len, attr_type = struct.unpack_from("=HH", data, pos)
+                        if attr_len < 4:
+                            break
+                        attrs[attr_type] = data[pos + 4:pos + attr_len]
+                        pos += (attr_len + 3) & ~3
+                    address = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+                    if scope != RT_SCOPE_HOST and address and len(address) == 4:
+                        found.append(ipaddress.IPv4Interface(
+                            f"{socket.inet_ntoa(address)}/{prefixlen}"))
+                offset += (length + 3) & ~3
+
+
+def _proc_networks() -> List[ipaddress.IPv4Interface]:
+    """Directly connected networks from /proc/net/route (no own address)"""
+    found = []
+    with open("/proc/net/route") as f:
+        next(f)
+        for line in f:
+            fields = line.split()
+            # Up (0x1), not via a gateway (0x2), not the default route
+            if int(fields[3], 16) & 3 == 1 and fields[7] != "00000000":
+                network = socket.inet_ntoa(int(fields[1], 16).to_bytes(4, "little"))
+                mask = socket.inet_ntoa(int(fields[7], 16).to_bytes(4, "little"))
+                found.append(ipaddress.IPv4Interface(f"{network}/{mask}"))
+    return found
+
+
+def local_prefixes() -> List[ipaddress.IPv4Interface]:
+    """
+    This machine's IPv4 networks, as address/prefix: rtnetlink on Linux,
+    else /proc/net/route, else the /24 of the local route source address.
+    """
+    for source in (_netlink_addresses, _proc_networks):
+        try:
+            found = source()
+            if found:
+                return found
+        except:
+            pass
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect((COMMON_GATEWAYS[0], 9))
+            return [ipaddress.IPv4Interface(f"{sock.getsockname()[0]}/24")]
+    except:
+        return []
+
+
+def sweep_hosts(prefixes: Optional[Sequence[ipaddress.IPv4Interface]] = None) -> List[str]:
+    """
+    Addresses a subnet sweep connects to: every host of each local
+    network except our own. Loopback and link-local networks are skipped;
+    networks wider than SWEEP_MAX_PREFIX are cut to the one around us.
+    """
+    hosts, own = [], set()
+    for iface in local_prefixes() if prefixes is None else prefixes:
+        network = iface.network
+        if network.is_loopback or network.is_link_local:
+            continue
+        if network.prefixlen < SWEEP_MAX_PREFIX:
+            network = ipaddress.ip_network(f"{iface.ip}/{SWEEP_MAX_PREFIX}", strict=False)
+        own.add(str(iface.ip))
+        hosts.extend(str(ip) for ip in network.hosts())
+    return [ip for ip in dict.fromkeys(hosts) if ip not in own]
+
+
+def _cache_path() -> str:
+    """Per-user discovery cache file (TIDE_DISCOVERY_CACHE overrides)"""
+    path = os.getenv("TIDE_DISCOVERY_CACHE")
+    if path:
+        return path
+    home = os.path.expanduser("~")
+    if sys.platform == "win32":
+        base = os.path.join(os.getenv("LOCALAPPDATA") or home, "Tide")
+    elif sys.platform == "darwin":
+        base = os.path.join(home, "Library", "Caches", "Tide")
+    else:
+        base = os.path.join(os.getenv("XDG_CACHE_HOME") or
+                            os.path.join(home, ".cache"), "tide")
+    return os.path.join(base, "gateways.json")
+
+
+class DiscoveryCache:
+    """
+    Last gateway found on each network, kept on disk between launches.
+    
+    Networks are stored under a hash of their identity, so the file does
+    not list the MACs and subnets this machine has visited. Each entry
+    keeps the gateway's discovery fields and the ETag they came with; the
+    ETag is the status fingerprint a revalidation sends as If-None-Match.
+    """
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or _cache_path()
+    
+    @staticmethod
+    def _key(identity: str) -> str:
+        return hashlib.sha256(identity.encode()).hexdigest()[:32]
+    
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                networks = json.load(f).get("networks")
+            return networks if isinstance(networks, dict) else {}
+        except:
+            return {}
+    
+    def get(self, identity: str) -> Optional[Dict[str, Any]]:
+        """{"ip", "api_port", "version", "etag", "fields", "seen"} or None"""
+        entry = self._load().get(self._key(identity))
+        return entry if isinstance(entry, dict) and entry.get("ip") else None
+    
+    def put(self, identity: str, ip: str, api_port: int,
+            fields: Dict[str, Any], etag: Optional[str]):
+        networks = self._load()
+        networks[self._key(identity)] = {
+            "ip": ip,
+            "api_port": api_port,
+            "version": fields.get("version"),
+            "etag": etag,
+            "fields": fields,
+            "seen": int(time.time()),
+        }
+        # Forget the networks not visited for longest
+        for key in sorted(networks, key=lambda k: networks[k].get("seen", 0))[:-CACHE_NETWORKS]:
+            del networks[key]
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": 1, "networks": networks}, f)
+            os.replace(tmp, self.path)
+        except:
+            pass
+    
+    def revalidate(self, identity: str) -> Optional[Tuple[str, Dict[str, Any], Optional[str]]]:
+        """One fast conditional probe of the cached gateway -> discover_gateway's result"""
+        entry = self.get(identity)
+        if entry is None:
+            return None
+        try:
+            answer = asyncio.run(_probe(entry["ip"], entry.get("api_port", 9051),
+                                        CACHE_PROBE_TIMEOUT, entry.get("etag"),
+                                        entry.get("fields")))
+        except:
+            return None
+        return (entry["ip"],) + answer if answer else None
+
+
+async def _verify_beacons(listener: BeaconListener, api_port: int, timeout: float):
+    """
+    Latest beaconing gateway that answers /status as Tide -> (ip, port,
+    fields). Unchecked beacons (and ones that failed more than
+    BEACON_RECHECK ago) are probed concurrently; the answer is recorded
+    on the listener so each gateway is probed once per sighting.
+    """
+    now = time.monotonic()
+    heard = []
+    for beacon in listener.gateways():
+        port = beacon.get("api_port", api_port)
+        verified = beacon.get("verified")
+        task = None
+        if verified is None or (not verified and
+                                now - beacon.get("checked", now) > BEACON_RECHECK):
+            task = asyncio.ensure_future(_probe(beacon["ip"], port, timeout))
+        heard.append((beacon, port, verified, task))
+        if verified and task is None:
+            break  # Older beacons could not win
+    
+    try:
+        # Latest beacon first; the probes run side by side meanwhile
+        for beacon, port, verified, task in heard:
+            if task is not None:
+                answer = await task
+                verified = answer is not None
+                listener.mark(beacon["ip"], beacon.get("api_port"), verified)
+                if verified:
+                    return beacon["ip"], port, answer[0]
+            elif verified:
+                fields = {"gateway": "tide"}
+                fields.update((k, beacon[k]) for k in ("version", "tor", "bootstrap")
+                              if k in beacon)
+                return beacon["ip"], port, fields
+        return None
+    finally:
+        tasks = [task for _, _, _, task in heard if task is not None and not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def locate_gateway(default_gateway: Callable[[], Optional[str]], api_port: int = 9051,
+                   deadline: Optional[float] = None,
+                   cache: Optional[DiscoveryCache] = None,
+                   sweep: Optional[bool] = None,
+                   beacon_port: Optional[int] = BEACON_PORT
+                   ) -> Optional[Tuple[str, Dict[str, Any], int]]:
+    """
+    Gateway heard in a beacon first, then the cached one, then full
+    discovery -> (ip, fields, api port).
+    
+    Starts the process's BeaconListener on first use. A gateway it has
+    heard recently is probed once at the API port its beacon names (any
+    LAN host can send a beacon) and, if it answers as Tide, returned with
+    that answer - later calls return it with the state its latest beacon
+    carried, without a request. Otherwise the gateway last found on this
+    network (see network_identity) is revalidated with one conditional
+    /status probe. Only if that fails is `default_gateway()` called (it
+    may fork `ip route`, `route` or `ipconfig`) and discover_gateway run
+    over it plus COMMON_GATEWAYS, sweeping the local subnets too if
+    `sweep` (default: sweep_enabled()).
+    A gateway found any of these ways is remembered for this network.
+    """
+    if deadline is None:
+        deadline = _default_deadline()
+    cache = cache or DiscoveryCache()
+    identity = network_identity()
+    found, port = None, api_port
+    
+    if beacon_port:
+        try:
+            heard = asyncio.run(_verify_beacons(beacon_listener(beacon_port), api_port,
+                                                min(PROBE_TIMEOUT, deadline)))
+        except:
+            heard = None
+        if heard:
+            ip, port, fields = heard
+            found = (ip, fields, None)
+    if found is None and identity:
+        found = cache.revalidate(identity)
+        if found:
+            port = (cache.get(identity) or {}).get("api_port", api_port)
+    
+    if found is None:
+        port = api_port
+        candidates = list(COMMON_GATEWAYS)
+        try:
+            gateway = default_gateway()
+            if gateway:
+                candidates.insert(0, gateway)
+        except:
+            pass
+        if sweep is None:
+            sweep = sweep_enabled()
+        found = discover_gateway(candidates, api_port, deadline, beacon_port, sweep=sweep)
+        if found is None:
+            return None
+    
+    ip, fields, etag = found
+    if identity:
+        cache.put(identity, ip, port, fields, etag)
+    return ip, fields, port
+
+
+def _stale_connection(error: Exception) -> bool:
+    """True if error means the server closed an idle keep-alive socket"""
+    if isinstance(error, (http.client.RemoteDisconnected, ConnectionResetError,
+                          BrokenPipeError)):
+        return True
+    # BadStatusLine stores repr(line): "''" means no bytes came back
+    return (isinstance(error, http.client.BadStatusLine) and
+            error.line in ("", "''"))
+
+
+class _ConnectionPool:
+    """
+    Keep-alive HTTP connections to one gateway API, reused across calls
+    so a status refresh does not pay a TCP handshake every time.
+    """
+    
+    def __init__(self, host: str, port: int, size: int = 4):
+        self.host = host
+        self.port = port
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+    
+    def _acquire(self, timeout: float, fresh: bool = False):
+        if not fresh:
+            with self._lock:
+                if self._idle:
+                    return self._idle.pop(), True
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout), False
+    
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+    
+    def request(self, path: str, headers: Dict[str, str], timeout: float,
+                idempotent: bool = True):
+        """
+        GET path -> (status, etag, body). Retries on a fresh connection if
+        the gateway closed a pooled socket while it sat idle; a timeout or
+        any other error is raised at once. A non-idempotent request (/newcircuit)
+        is never retried - it always opens a fresh connection instead, so
+        a stale socket cannot make the gateway act on it twice.
+        """
+        while True:
+            conn, reused = self._acquire(timeout, fresh=not idempotent)
+            try:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused and _stale_connection(e):
+                    continue  # Server closed the idle connection - retry fresh
+                raise  # Timeouts included: re-sending would double the wait
+            
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return response.status, response.getheader("ETag"), body
+    
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
 
 class TideGateway:
     """Tide Gateway Discovery and API Client"""
@@ -25,62 +808,32 @@ class TideGateway:
         self.dns_port = 5353
         self.connected = False
         self.status: Dict[str, Any] = {}
+        self.discovery: Dict[str, Any] = {}  # Fields from the discovery probe
         self.api_token: Optional[str] = None
+        self.live = False  # True while an /events stream is connected
+        self._pool: Optional[_ConnectionPool] = None
+        self._cache: Dict[str, Tuple[str, Dict[str, Any]]] = {}  # path -> (etag, body)
+        self.sweep = sweep_enabled()  # Also sweep local subnets when discovering
     
     # ─────────────────────────────────────────────────────────────
     # Discovery
     # ─────────────────────────────────────────────────────────────
     
-    def discover(self) -> Optional[str]:
+    def discover(self, deadline: Optional[float] = None) -> Optional[str]:
         """
-        Try to find Tide gateway on the network.
+        Try to find Tide gateway on the network (see locate_gateway).
+        The probe's fields are kept in self.discovery; self.status gets
+        the gateway's full /status, as before concurrent discovery.
         Returns: Gateway IP if found, None otherwise
         """
-        # Common gateway IPs to check
-        candidates = [
-            "10.101.101.10",     # Default Tide IP
-            "192.168.1.1",
-            "192.168.0.1",
-            "10.0.0.1",
-        ]
-        
-        # Try to find via default gateway
-        try:
-            default_gw = self._get_default_gateway()
-            if default_gw:
-                candidates.insert(0, default_gw)
-        except:
-            pass
-        
-        # Check each candidate
-        for ip in candidates:
-            if self._check_gateway(ip):
-                return ip
-        
-        # Listen for UDP beacon as last resort
-        beacon_ip = self._listen_beacon(timeout=3)
-        if beacon_ip and self._check_gateway(beacon_ip):
-            return beacon_ip
-            
-        return None
-    
-    def _check_gateway(self, ip: str) -> bool:
-        """Check if IP is a Tide gateway"""
-        try:
-            url = f"http://{ip}:{self.api_port}/status"
-            req = Request(url, headers={'User-Agent': 'TideClient/1.0'})
-            
-            with urlopen(req, timeout=2) as response:
-                data = json.loads(response.read().decode())
-                
-                if data.get("gateway") == "tide":
-                    self.gateway_ip = ip
-                    self.status = data
-                    return True
-        except:
-            pass
-        
-        return False
+        found = locate_gateway(self._get_default_gateway, self.api_port, deadline,
+                               sweep=self.sweep)
+        if found is None:
+            return None
+        self.gateway_ip, self.discovery, self.api_port = found
+        if self.get_status() is None:
+            self.status = dict(self.discovery)
+        return self.gateway_ip
     
     def _get_default_gateway(self) -> Optional[str]:
         """Get system's default gateway IP"""
@@ -97,6 +850,9 @@ class TideGateway:
                         return line.split(":")[1].strip()
             
             elif sys.platform == "linux":
+                route = default_route()
+                if route:
+                    return route[0]
                 result = subprocess.run(
                     ["ip", "route"],
                     capture_output=True,
@@ -124,41 +880,51 @@ class TideGateway:
         
         return None
     
-    def _listen_beacon(self, timeout: int = 5) -> Optional[str]:
-        """Listen for Tide UDP beacon broadcast"""
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            sock.settimeout(timeout)
-            sock.bind(("", 19050))
-            
-            data, addr = sock.recvfrom(1024)
-            message = data.decode()
-            
-            if message.startswith("TIDE:"):
-                parts = message.split(":")
-                return parts[1] if len(parts) >= 2 else None
-        except:
-            pass
-        
-        return None
-    
     # ─────────────────────────────────────────────────────────────
     # Status & Control
     # ─────────────────────────────────────────────────────────────
     
+    def _api_get(self, path: str, timeout: float,
+                 headers: Optional[Dict[str, str]] = None,
+                 idempotent: bool = True) -> Dict[str, Any]:
+        """GET a JSON endpoint over the gateway's keep-alive pool"""
+        pool = self._pool
+        if pool is None or (pool.host, pool.port) != (self.gateway_ip, self.api_port):
+            if pool is not None:
+                pool.close()
+            pool = self._pool = _ConnectionPool(self.gateway_ip, self.api_port)
+            self._cache.clear()
+        
+        request_headers = {'User-Agent': 'TideClient/1.0'}
+        if headers:
+            request_headers.update(headers)
+        
+        # Revalidate the last body instead of downloading it again
+        cached = self._cache.get(path)
+        if cached:
+            request_headers['If-None-Match'] = cached[0]
+        
+        status, etag, body = pool.request(path, request_headers, timeout, idempotent)
+        if status == 304 and cached:
+            return dict(cached[1])
+        if not 200 <= status < 300:
+            raise HTTPError(path, status, f"HTTP {status}", None, None)
+        
+        data = json.loads(body.decode())
+        if etag:
+            self._cache[path] = (etag, dict(data))
+        else:
+            self._cache.pop(path, None)
+        return data
+    
     def get_status(self) -> Optional[Dict[str, Any]]:
         """Get gateway status"""
         if not self.gateway_ip:
             return None
         
         try:
-            url = f"http://{self.gateway_ip}:{self.api_port}/status"
-            req = Request(url, headers={'User-Agent': 'TideClient/1.0'})
-            
-            with urlopen(req, timeout=5) as response:
-                self.status = json.loads(response.read().decode())
-                return self.status
+            self.status = self._api_get("/status", timeout=5)
+            return self.status
         except:
             return None
     
@@ -168,38 +934,78 @@ class TideGateway:
             return None
         
         try:
-            url = f"http://{self.gateway_ip}:{self.api_port}/circuit"
-            req = Request(url, headers={'User-Agent': 'TideClient/1.0'})
-            
-            with urlopen(req, timeout=10) as response:
-                return json.loads(response.read().decode())
+            return self._api_get("/circuit", timeout=10)
         except:
             return None
     
+    def get_snapshot(self, deadline: float = 3.0) -> Optional[Dict[str, Any]]:
+        """
+        Status, circuit and health check in one round-trip.
+        
+        Returns {"status", "circuit", "check", "partial"}; parts the gateway
+        could not produce within `deadline` seconds are None and named in
+        "partial". Falls back to separate calls only when the gateway has no
+        /snapshot route (404).
+        """
+        if not self.gateway_ip:
+            return None
+        
+        try:
+            snapshot = self._api_get(f"/snapshot?deadline={deadline}",
+                                     timeout=deadline + 5)
+        except HTTPError as e:
+            if e.code != 404:
+                return None  # Busy (429/503) or failing - don't add two more requests
+            # Older gateway - no /snapshot route
+            return {
+                "status": self.get_status(),
+                "circuit": self.get_circuit(),
+                "check": None,
+                "partial": ["check"],
+            }
+        except:
+            return None
+        
+        if snapshot.get("status"):
+            self.status = snapshot["status"]
+        return snapshot
+    
     def new_circuit(self) -> bool:
         """Request new Tor circuit (requires authentication)"""
+        data = self.rotate_circuit(wait=False)
+        return bool(data and data.get("success", False))
+    
+    def rotate_circuit(self, wait: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Request new Tor circuit (requires authentication).
+        
+        With wait=True the gateway answers once a lookup has gone over the
+        new circuit: {"success", "ready", "changed", "exit"} ("changed" is
+        None if the gateway never saw the old exit). Requests from
+        several clients at once share one NEWNYM on the gateway.
+        """
         if not self.gateway_ip:
-            return False
+            return None
         
         # Try to get token from gateway if we don't have it
         if not self.api_token:
             self._fetch_token()
         
         try:
-            url = f"http://{self.gateway_ip}:{self.api_port}/newcircuit"
-            headers = {'User-Agent': 'TideClient/1.0'}
+            headers = {}
             
             # Add Bearer token if available
             if self.api_token:
                 headers['Authorization'] = f'Bearer {self.api_token}'
             
-            req = Request(url, headers=headers)
-            
-            with urlopen(req, timeout=5) as response:
-                data = json.loads(response.read().decode())
-                return data.get("success", False)
+            if wait:
+                # NEWNYM rate limit (10s) + exit lookup over Tor (~15s)
+                return self._api_get("/newcircuit?wait=1", timeout=40,
+                                     headers=headers, idempotent=False)
+            return self._api_get("/newcircuit", timeout=5, headers=headers,
+                                 idempotent=False)
         except:
-            return False
+            return None
     
     def _fetch_token(self):
         """Fetch API token from gateway's /token endpoint"""
@@ -215,12 +1021,8 @@ class TideGateway:
                 return
             
             # Otherwise fetch from gateway
-            url = f"http://{self.gateway_ip}:{self.api_port}/token"
-            req = Request(url, headers={'User-Agent': 'TideClient/1.0'})
-            
-            with urlopen(req, timeout=5) as response:
-                data = json.loads(response.read().decode())
-                self.api_token = data.get("token")
+            data = self._api_get("/token", timeout=5)
+            self.api_token = data.get("token")
         except:
             pass
     
@@ -230,14 +1032,76 @@ class TideGateway:
             return None
         
         try:
-            url = f"http://{self.gateway_ip}:{self.api_port}/check"
-            req = Request(url, headers={'User-Agent': 'TideClient/1.0'})
-            
-            with urlopen(req, timeout=15) as response:
-                return json.loads(response.read().decode())
+            return self._api_get("/check", timeout=15)
         except:
             return None
     
+    # ─────────────────────────────────────────────────────────────
+    # Live Events (/events Server-Sent Events stream)
+    # ─────────────────────────────────────────────────────────────
+    
+    def iter_events(self, timeout: float = 60) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Follow the gateway's /events stream, yielding (event, data).
+        The first event is a full "snapshot", then "delta" events carry
+        only changed fields. Both are merged into self.status.
+        Blocks until the stream ends; raises on connection errors.
+        """
+        if not self.gateway_ip:
+            return
+        
+        url = f"http://{self.gateway_ip}:{self.api_port}/events"
+        req = Request(url, headers={
+            'User-Agent': 'TideClient/1.0',
+            'Accept': 'text/event-stream',
+        })
+        
+        # Server sends a keep-alive comment every 15s, so 60s idle = dead
+        with urlopen(req, timeout=timeout) as response:
+            self.live = True
+            try:
+                event, data = "message", []
+                for raw in response:
+                    line = raw.decode("utf-8", "replace").rstrip("\r\n")
+                    if not line:
+                        if data:
+                            payload = json.loads("\n".join(data))
+                            self.status.update(payload)
+                            yield event, payload
+                        event, data = "message", []
+                    elif line.startswith(":"):
+                        continue
+                    elif line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:"):
+                        data.append(line[5:].lstrip())
+            finally:
+                self.live = False
+    
+    def subscribe(self, on_change: Callable[[Dict[str, Any], Dict[str, Any]], None],
+                  retry: float = 5.0) -> threading.Event:
+        """
+        Follow /events in a background thread, calling
+        on_change(changed_fields, full_status) for every update.
+        Reconnects after `retry` seconds if the stream drops.
+        Returns an Event - set() it to unsubscribe.
+        """
+        stop = threading.Event()
+        
+        def run():
+            while not stop.is_set():
+                try:
+                    for _event, data in self.iter_events():
+                        if stop.is_set():
+                            return
+                        on_change(data, self.status)
+                except:
+                    pass
+                stop.wait(retry)
+        
+        threading.Thread(target=run, name="tide-events", daemon=True).start()
+        return stop
+    
     # ─────────────────────────────────────────────────────────────
     # Proxy Configuration (Platform-specific)
     # ─────────────────────────────────────────────────────────────
@@ -6,18 +6,22 @@ Auto-discovers Tide Gateway and provides one-click Tor connectivity.
 
 Requirements: pip install requests pystray Pillow
 
-Usage: python tide-client.py
+Usage: python tide-client.py [--cli] [--sweep]
 """
 
 import os
 import sys
 import json
-import socket
 import threading
 import subprocess
 import requests
+from pathlib import Path
 from time import sleep
 
+# Shared gateway module (discovery, live /events subscription)
+sys.path.insert(0, str(Path(__file__).parent / "shared"))
+from tide_gateway import TideGateway, default_route, locate_gateway, sweep_enabled
+
 # Try to import GUI libraries
 try:
     import pystray
@@ -36,53 +40,23 @@ class TideClient:
         self.dns_port = 5353
         self.connected = False
         self.status = {}
+        self.discovery = {}  # Fields from the discovery probe
+        self.sweep = sweep_enabled()  # Also sweep local subnets when discovering
         
     # ─────────────────────────────────────────────────────────────
     # Discovery
     # ─────────────────────────────────────────────────────────────
     
-    def discover(self):
-        """Try to find Tide gateway on the network"""
-        
-        # Common gateway IPs to check
-        candidates = [
-            "10.101.101.10",     # Default Tide IP
-            "192.168.1.1",
-            "192.168.0.1",
-            "10.0.0.1",
-        ]
-        
-        # Also try to find via DHCP gateway
-        try:
-            default_gw = self._get_default_gateway()
-            if default_gw:
-                candidates.insert(0, default_gw)
-        except:
-            pass
-        
-        for ip in candidates:
-            if self._check_gateway(ip):
-                return ip
-        
-        # Listen for UDP beacon
-        beacon_ip = self._listen_beacon(timeout=5)
-        if beacon_ip and self._check_gateway(beacon_ip):
-            return beacon_ip
-            
-        return None
-    
-    def _check_gateway(self, ip):
-        """Check if IP is a Tide gateway"""
-        try:
-            r = requests.get(f"http://{ip}:{self.api_port}/status", timeout=2)
-            data = r.json()
-            if data.get("gateway") == "tide":
-                self.gateway_ip = ip
-                self.status = data
-                return True
-        except:
-            pass
-        return False
+    def discover(self, deadline=None):
+        """Try to find Tide gateway on the network (cached, then concurrent discovery)"""
+        found = locate_gateway(self._get_default_gateway, self.api_port, deadline,
+                               sweep=self.sweep)
+        if found is None:
+            return None
+        self.gateway_ip, self.discovery, self.api_port = found
+        if self.get_status() is None:
+            self.status = dict(self.discovery)
+        return self.gateway_ip
     
     def _get_default_gateway(self):
         """Get system's default gateway IP"""
@@ -92,29 +66,15 @@ class TideClient:
                 if "gateway:" in line:
                     return line.split(":")[1].strip()
         elif sys.platform == "linux":
+            route = default_route()
+            if route:
+                return route[0]
             result = subprocess.run(["ip", "route"], capture_output=True, text=True)
             for line in result.stdout.split("\n"):
                 if line.startswith("default"):
                     return line.split()[2]
         return None
     
-    def _listen_beacon(self, timeout=5):
-        """Listen for Tide UDP beacon"""
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            sock.settimeout(timeout)
-            sock.bind(("", 19050))
-            
-            data, addr = sock.recvfrom(1024)
-            message = data.decode()
-            if message.startswith("TIDE:"):
-                parts = message.split(":")
-                return parts[1] if len(parts) >= 2 else None
-        except:
-            pass
-        return None
-    
     # ─────────────────────────────────────────────────────────────
     # Status & Control
     # ─────────────────────────────────────────────────────────────
@@ -140,6 +100,24 @@ class TideClient:
         except:
             return None
     
+    def get_snapshot(self, deadline=3.0):
+        """Status, circuit and health check in one round-trip (see /snapshot)"""
+        if not self.gateway_ip:
+            return None
+        try:
+            r = requests.get(f"http://{self.gateway_ip}:{self.api_port}/snapshot",
+                             params={"deadline": deadline}, timeout=deadline + 5)
+            if r.status_code == 404:
+                # Older gateway - no /snapshot route
+                return {"status": self.get_status(), "circuit": self.get_circuit(),
+                        "check": None, "partial": ["check"]}
+            snapshot = r.json()
+            if snapshot.get("status"):
+                self.status = snapshot["status"]
+            return snapshot
+        except:
+            return None
+    
     def new_circuit(self):
         """Request new Tor circuit"""
         if not self.gateway_ip:
@@ -356,8 +334,9 @@ def run_gui(client):
             icon.notify("New circuit requested", "Tide")
     
     def on_status(icon, item):
-        status = client.get_status()
-        circuit = client.get_circuit()
+        snapshot = client.get_snapshot() or {}
+        status = snapshot.get("status")
+        circuit = snapshot.get("circuit")
         
         if status:
             msg = f"Mode: {status.get('mode', '?')}\n"
@@ -391,12 +370,22 @@ def run_gui(client):
     
     icon = pystray.Icon("Tide", create_icon(), "Tide Client", menu)
     
-    # Background discovery
+    # Background discovery, then follow live state via /events
     def discovery_loop():
+        events = TideGateway()
         while True:
             if not client.gateway_ip:
                 client.discover()
             else:
+                events.gateway_ip = client.gateway_ip
+                events.api_port = client.api_port
+                try:
+                    # Blocks while the stream is up; no polling
+                    for _event, changed in events.iter_events():
+                        client.status.update(changed)
+                except Exception:
+                    pass
+                # Stream unavailable or dropped - poll once, retry later
                 client.get_status()
             sleep(10)
     
@@ -420,13 +409,14 @@ def run_cli(client):
     
     if ip:
         print(f"✓ Found gateway: {ip}")
-        status = client.get_status()
+        snapshot = client.get_snapshot() or {}
+        status = snapshot.get("status")
         if status:
             print(f"  Mode: {status.get('mode', '?')}")
             print(f"  Security: {status.get('security', '?')}")
             print(f"  Tor: {status.get('tor', '?')}")
         
-        circuit = client.get_circuit()
+        circuit = snapshot.get("circuit")
         if circuit:
             print(f"  Exit IP: {circuit.get('IP', '?')}")
         
@@ -460,8 +450,9 @@ def run_cli(client):
                         print("✗ Failed")
                 
                 elif cmd == "s":
-                    status = client.get_status()
-                    circuit = client.get_circuit()
+                    snapshot = client.get_snapshot() or {}
+                    status = snapshot.get("status")
+                    circuit = snapshot.get("circuit")
                     print(f"Tor: {status.get('tor', '?') if status else '?'}")
                     print(f"Exit: {circuit.get('IP', '?') if circuit else '?'}")
                 
@@ -483,6 +474,8 @@ def run_cli(client):
 
 if __name__ == "__main__":
     client = TideClient()
+    if "--sweep" in sys.argv:
+        client.sweep = True
     
     # Try to find gateway immediately
     client.discover()
@@ -50,6 +50,34 @@ wget -q -O /usr/local/bin/tide-web-dashboard.py \
 }
 chmod +x /usr/local/bin/tide-web-dashboard.py
 
+# Optional DNS cache (started by gateway-start.sh with TIDE_DNS_CACHE=1)
+echo "   - tide-dns.py"
+wget -q -O /usr/local/bin/tide-dns.py \
+    "${BASE_URL}/tide-dns.py" || {
+    echo "❌ Failed to download tide-dns.py"
+    exit 1
+}
+chmod +x /usr/local/bin/tide-dns.py
+
+# Optional Tor balancer (run by gateway-start.sh when TIDE_TOR_INSTANCES != 1)
+echo "   - tide-balancer.py"
+wget -q -O /usr/local/bin/tide-balancer.py \
+    "${BASE_URL}/tide-balancer.py" || {
+    echo "❌ Failed to download tide-balancer.py"
+    exit 1
+}
+chmod +x /usr/local/bin/tide-balancer.py
+
+# Shared runtime modules (imported by the dashboard and API)
+TIDE_MODULES="tide_http.py tide_status.py tide_control.py tide_circuit.py tide_events.py tide_config.py tide_metrics.py tide_prefork.py tide_dns.py tide_balance.py tide_procs.py tide_leases.py tide_record.py tide_beacon.py"
+for module in $TIDE_MODULES; do
+    echo "   - $module"
+    wget -q -O "/usr/local/bin/$module" "${BASE_URL}/$module" || {
+        echo "❌ Failed to download $module"
+        exit 1
+    }
+done
+
 # CLI tool
 echo "   - tide-cli.sh"
 wget -q -O /usr/local/bin/tide-cli.sh \
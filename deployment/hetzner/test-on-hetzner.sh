@@ -111,6 +111,7 @@ git clone -q https://github.com/bodegga/tide.git
 echo "→ Installing Tide components..."
 cd tide
 cp scripts/runtime/tide-web-dashboard.py /usr/local/bin/
+cp scripts/runtime/tide_*.py /usr/local/bin/
 cp scripts/runtime/tide-cli.sh /usr/local/bin/
 cp scripts/runtime/tide-config.sh /usr/local/bin/
 cp scripts/runtime/gateway-start.sh /usr/local/bin/
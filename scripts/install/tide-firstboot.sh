@@ -40,6 +40,8 @@ DataDirectory /var/lib/tor
 SocksPort 0.0.0.0:9050
 DNSPort 0.0.0.0:5353
 TransPort 0.0.0.0:9040
+ControlPort 127.0.0.1:9052
+CookieAuthentication 1
 VirtualAddrNetworkIPv4 10.192.0.0/10
 AutomapHostsOnResolve 1
 Log notice syslog
@@ -53,6 +53,7 @@ mkdir -p /usr/local/bin /etc/tide /var/log/tide
 
 cp "$SCRIPT_DIR/scripts/runtime/gateway-start.sh" /usr/local/bin/
 cp "$SCRIPT_DIR/scripts/runtime/tide-api.py" /usr/local/bin/
+cp "$SCRIPT_DIR"/scripts/runtime/tide_*.py /usr/local/bin/
 cp "$SCRIPT_DIR/torrc-gateway" /etc/tor/torrc
 cp "$SCRIPT_DIR/config"/torrc-* /etc/tor/ 2>/dev/null || true
 chmod +x /usr/local/bin/gateway-start.sh /usr/local/bin/tide-api.py
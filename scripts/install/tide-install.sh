@@ -234,6 +234,10 @@ SocksPort 0.0.0.0:9050 IsolateClientAddr IsolateSOCKSAuth
 DNSPort 0.0.0.0:5353
 TransPort 0.0.0.0:9040 IsolateClientAddr
 
+# ControlPort (localhost only - Tide API status, bootstrap % and NEWNYM)
+ControlPort 127.0.0.1:9052
+CookieAuthentication 1
+
 # Virtual addressing for .onion
 VirtualAddrNetworkIPv4 10.192.0.0/10
 AutomapHostsOnResolve 1
@@ -38,6 +38,7 @@ mkdir -p /usr/local/bin /etc/tide /var/log/tide
 # Copy files
 cp "$SCRIPT_DIR/scripts/runtime/gateway-start.sh" /usr/local/bin/
 cp "$SCRIPT_DIR/scripts/runtime/tide-api.py" /usr/local/bin/
+cp "$SCRIPT_DIR"/scripts/runtime/tide_*.py /usr/local/bin/
 cp "$SCRIPT_DIR/torrc-gateway" /etc/tor/torrc
 chmod +x /usr/local/bin/gateway-start.sh
 
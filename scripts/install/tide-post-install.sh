@@ -78,6 +78,7 @@ mkdir -p /usr/local/bin /etc/tide /etc/tor /var/log/tide
 
 cp scripts/runtime/gateway-start.sh /usr/local/bin/
 cp scripts/runtime/tide-api.py /usr/local/bin/
+cp scripts/runtime/tide_*.py /usr/local/bin/
 cp torrc-gateway /etc/tor/torrc
 cp config/torrc-hardened /etc/tor/ 2>/dev/null || true
 cp config/torrc-paranoid /etc/tor/ 2>/dev/null || true
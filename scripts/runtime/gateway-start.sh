@@ -11,6 +11,13 @@ TIDE_MODE="${TIDE_MODE:-router}"
 TIDE_SECURITY="${TIDE_SECURITY:-standard}"
 TIDE_GATEWAY_IP="${TIDE_GATEWAY_IP:-10.101.101.10}"
 TIDE_SUBNET="${TIDE_SUBNET:-10.101.101.0/24}"
+export TIDE_GATEWAY_IP TIDE_SUBNET  # tide-api.py: /status "ip" and the LAN beacon
+
+# Optional caching DNS front-end (tide-dns.py) in front of Tor's DNSPort
+DNS_PORT=5353
+if [ "${TIDE_DNS_CACHE:-0}" = "1" ]; then
+    DNS_PORT=5300
+fi
 
 echo "📋 Configuration:"
 echo "   Mode: $TIDE_MODE"
@@ -54,8 +61,8 @@ elif [ "$TIDE_MODE" = "router" ]; then
     # NAT rules for transparent proxy
     iptables -t nat -A PREROUTING -i eth0 -p tcp --dport 9051 -j ACCEPT
     iptables -t nat -A PREROUTING -i eth0 -p tcp -j REDIRECT --to-ports 9040
-    iptables -t nat -A PREROUTING -i eth0 -p udp --dport 53 -j REDIRECT --to-ports 5353
-    iptables -t nat -A PREROUTING -i eth0 -p tcp --dport 53 -j REDIRECT --to-ports 5353
+    iptables -t nat -A PREROUTING -i eth0 -p udp --dport 53 -j REDIRECT --to-ports $DNS_PORT
+    iptables -t nat -A PREROUTING -i eth0 -p tcp --dport 53 -j REDIRECT --to-ports $DNS_PORT
     iptables -t nat -A OUTPUT -m owner --uid-owner tor -j RETURN
     
     echo "✅ Transparent routing enabled"
@@ -66,7 +73,7 @@ interface=eth0
 dhcp-range=${TIDE_DHCP_START:-10.101.101.100},${TIDE_DHCP_END:-10.101.101.200},12h
 dhcp-option=3,$TIDE_GATEWAY_IP
 dhcp-option=6,$TIDE_GATEWAY_IP
-server=127.0.0.1#5353
+server=127.0.0.1#$DNS_PORT
 no-resolv
 log-queries
 log-dhcp
@@ -114,8 +121,8 @@ elif [ "$TIDE_MODE" = "killa-whale" ]; then
     # NAT: Intercept EVERYTHING
     iptables -t nat -A PREROUTING -i eth0 -p tcp --dport 9051 -j ACCEPT  # API access
     iptables -t nat -A PREROUTING -i eth0 -p tcp -j REDIRECT --to-ports 9040  # ALL TCP → Tor
-    iptables -t nat -A PREROUTING -i eth0 -p udp --dport 53 -j REDIRECT --to-ports 5353  # DNS → Tor
-    iptables -t nat -A PREROUTING -i eth0 -p tcp --dport 53 -j REDIRECT --to-ports 5353
+    iptables -t nat -A PREROUTING -i eth0 -p udp --dport 53 -j REDIRECT --to-ports $DNS_PORT  # DNS → Tor
+    iptables -t nat -A PREROUTING -i eth0 -p tcp --dport 53 -j REDIRECT --to-ports $DNS_PORT
     
     # MANGLE: Mark all packets for tracking
     iptables -t mangle -A PREROUTING -i eth0 -j MARK --set-mark 1
@@ -160,7 +167,7 @@ dhcp-option=6,$TIDE_GATEWAY_IP
 dhcp-option=15,tide.local
 dhcp-option=42,0.0.0.0
 dhcp-authoritative
-server=127.0.0.1#5353
+server=127.0.0.1#$DNS_PORT
 no-resolv
 no-hosts
 expand-hosts
@@ -319,7 +326,16 @@ echo "🌐 Starting Tide Web Dashboard (port 80)..."
 echo "   Access at: http://tide.bodegga.net or http://$TIDE_GATEWAY_IP"
 python3 /usr/local/bin/tide-web-dashboard.py &
 
-# Start Tor
+# Start DNS cache (opt-in, in front of Tor's DNSPort)
+if [ "$DNS_PORT" != "5353" ]; then
+    echo "🌐 Starting Tide DNS cache (port $DNS_PORT -> Tor DNSPort 5353)..."
+    python3 /usr/local/bin/tide-dns.py &
+fi
+
+# Start Tor - several balanced instances when TIDE_TOR_INSTANCES != 1
 echo "🔐 Starting Tor with config: $TORRC"
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+if [ "${TIDE_TOR_INSTANCES:-1}" != "1" ]; then
+    TIDE_TORRC="$TORRC" exec python3 /usr/local/bin/tide-balancer.py
+fi
 exec tor -f "$TORRC"
@@ -5,30 +5,53 @@ Tide API Server
 Simple HTTP API server for Tide Gateway discovery and control.
 Runs on port 9051.
 
+Routes: /status, /circuit, /newcircuit, /check, /discover, /snapshot,
+/events, /metrics. Serving, sampling and probing live in the helper
+modules (tide_http, tide_status, tide_record, tide_prefork, tide_circuit,
+tide_control, tide_beacon, tide_events, tide_metrics).
+
 Security:
 - Read-only endpoints (/status, /circuit, /check) are open
-- Write endpoints (/newcircuit) require Bearer token authentication
+- Write endpoints (/newcircuit) require Bearer token authentication and
+  answer HEAD with 405
+- /metrics and /status?fields=processes require a loopback client or the
+  Bearer token
 """
 
-import http.server
-import socketserver
+import asyncio
 import json
-import subprocess
+import math
 import os
 import secrets
-from urllib.parse import urlparse
+import time
+
+import tide_metrics
+from tide_http import (HTTPServer, Response, StreamResponse, conditional,
+                       json_response, make_etag, run_blocking)
+from tide_status import SnapshotFile, StatusSampler
+from tide_prefork import STATE_DIR, Supervisor, worker_count, worker_id
+from tide_config import TIDE_ROOT, TideConfig
+from tide_control import SOCKS_PORT, TorControl
+from tide_circuit import CircuitCache, CircuitRotator, CircuitService, RemoteCircuit
+from tide_balance import PoolControl, pool_instances
+from tide_leases import LeaseIndex
+from tide_procs import PROCS
+from tide_record import RECORD_FIELDS, StatusRecordWriter
+from tide_beacon import GATEWAY_IP, BeaconEmitter
+from tide_events import EventHub
 
-PORT = 9051
+PORT = int(os.getenv('TIDE_API_PORT', '9051'))
 
 # Generate or load API token
 # Set TIDE_API_TOKEN env var for custom token, otherwise auto-generate
-API_TOKEN = os.getenv('TIDE_API_TOKEN')
+ENV_TOKEN = os.getenv('TIDE_API_TOKEN')
+API_TOKEN = ENV_TOKEN
 if not API_TOKEN:
     # Generate a random token and save it
     API_TOKEN = secrets.token_urlsafe(32)
-    token_file = '/etc/tide/api_token'
+    token_file = TIDE_ROOT + '/etc/tide/api_token'
     try:
-        os.makedirs('/etc/tide', exist_ok=True)
+        os.makedirs(os.path.dirname(token_file), exist_ok=True)
         if not os.path.exists(token_file):
             with open(token_file, 'w') as f:
                 f.write(API_TOKEN)
@@ -43,39 +66,130 @@ if not API_TOKEN:
 
 # ZERO-LOG: Never print API tokens
 
+# /snapshot deadline (seconds) - default and the most a client may ask for
+SNAPSHOT_DEADLINE = 3.0
+SNAPSHOT_MAX_DEADLINE = 15.0
+
+# Read-only routes that also answer HEAD - anywhere else HEAD could act
+# (a probe's HEAD /newcircuit would send a NEWNYM)
+HEAD_ROUTES = frozenset(('/', '/status', '/circuit', '/check', '/discover',
+                         '/snapshot', '/metrics'))
+
+# Fields pushed over /events (kept warm while anyone is subscribed)
+EVENT_FIELDS = ("tor", "bootstrap", "mode", "security")
+
+# /status fields that never need a probe
+STATUS_STATIC = {
+    "gateway": "tide",
+    "ip": GATEWAY_IP,
+    "ports": {
+        "socks": SOCKS_PORT,
+        "dns": 5353,
+        "api": PORT
+    },
+}
+
+# Prefork: supervisor -> workers status hand-off, and the supervisor's
+# circuit cache + NEWNYM scheduler that workers call into
+STATUS_FILE = STATE_DIR + "/api-status.json"
+CIRCUIT_SOCKET = STATE_DIR + "/api-circuit.sock"
+
+# /status fields that move on every sample without a state change - left
+# out of the ETag so an unchanged gateway still answers pollers with 304
+STATUS_VOLATILE = ("snapshot_age", "uptime", "processes")
 
-class TideAPIHandler(http.server.BaseHTTPRequestHandler):
+# /status fields left out unless asked for with ?fields=, and only given
+# to loopback clients or the API token (per-service PIDs, CPU and RSS)
+STATUS_PRIVATE = ("processes",)
+
+# Every /status field in response order, with its fallback value
+STATUS_DEFAULTS = {
+    "gateway": "tide",
+    "version": "unknown",
+    "mode": "unknown",
+    "security": "standard",
+    "tor": "unknown",
+    "bootstrap": None,
+    "uptime": 0,
+    "ip": "10.101.101.10",
+    "ports": STATUS_STATIC["ports"],
+    "tor_instances": None,
+    "processes": {},
+}
+
+
+class TideAPIHandler:
     """Handle Tide API requests"""
     
-    def log_message(self, format, *args):
-        """ZERO-LOG POLICY: No request logging for privacy"""
-        # Tide Gateway is a privacy appliance - we NEVER log client IPs or requests
-        pass
+    # ZERO-LOG POLICY: No request logging for privacy
+    # Tide Gateway is a privacy appliance - we NEVER log client IPs or requests
     
-    def _send_json(self, code, data):
-        """Send JSON response"""
-        self.send_response(code)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Connection', 'close')
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+    def __init__(self, shared_status=None):
+        self.routes = {
+            '/status': self._route_status,
+            '/circuit': self._route_circuit,
+            '/newcircuit': self._route_newcircuit,
+            '/check': self._route_check,
+            '/discover': self._route_discover,
+            '/events': self._route_events,
+            '/snapshot': self._route_snapshot,
+            '/metrics': self._route_metrics,
+            '/': self._route_discover,
+        }
+        self.control = TorControl()
+        self.config = TideConfig()
+        self.events = EventHub()
+        
+        self.sampler = StatusSampler()
+        if shared_status is not None:
+            # Prefork worker: the supervisor probes, we read its snapshots
+            # and share its circuit cache and NEWNYM scheduler
+            self.sampler.mirror(*(f for f in STATUS_DEFAULTS if f not in STATUS_STATIC))
+            self.feed = SnapshotFile(shared_status)
+            self.circuit = self.rotator = RemoteCircuit(CIRCUIT_SOCKET)
+        else:
+            self.circuit = CircuitCache()
+            # With the Tor balancer running, NEWNYM reaches every instance
+            self.rotator = CircuitRotator(PoolControl(self.control), self.circuit)
+            # Each /status field is backed by a lazily evaluated provider
+            self.sampler.provide(self._get_version, "version")
+            self.sampler.provide(self._get_mode, "mode")
+            self.sampler.provide(self._get_security, "security")
+            self.sampler.provide(self._tor_status, "tor", "bootstrap")
+            self.sampler.provide(self._get_uptime, "uptime")
+            self.sampler.provide(pool_instances, "tor_instances")
+            self.sampler.provide(PROCS.usage, "processes")
+            # Record-only fields (not on /status) for the dashboard and CLI
+            leases = LeaseIndex()
+            self.sampler.provide(leases.active, "clients")
+            self.sampler.provide(lambda: PROCS.running('arp-poison'), "arp_active")
+            self.sampler.provide(lambda: PROCS.running('network-scanner'), "scanner_active")
+            # The shared record is always kept current, /events fields too
+            self.sampler.keep_warm(lambda: RECORD_FIELDS + (
+                EVENT_FIELDS if self.events.subscribers else ()))
+            self.record = StatusRecordWriter()
+            self.sampler.add_listener(self._write_record)
+            # LAN beacon: discovery and state changes without HTTP
+            self.beacon = BeaconEmitter(GATEWAY_IP, PORT)
+            self.sampler.add_listener(self.beacon.update)
+            self.feed = None
+        
+        # New exit IP -> resample now so /events subscribers see it at once
+        self.circuit.on_update = lambda _: self.sampler.poke()
+        self.rotator.on_rotate = self.sampler.poke
+        self.sampler.add_listener(self._publish_state)
+        
+        # State file edits (mode switch...) go straight to /status + /events
+        self.config.subscribe(self._on_config_change)
     
     def _tor_status(self):
-        """Check if Tor is running and connected"""
+        """Check if Tor is running and connected -> (state, bootstrap %)"""
         try:
-            # Check if Tor process is running
-            result = subprocess.run(['pgrep', '-x', 'tor'], 
-                                  capture_output=True, timeout=2)
-            if result.returncode != 0:
-                return "offline"
-            
-            # Check if SOCKS port is listening
-            result = subprocess.run(['nc', '-z', '127.0.0.1', '9050'],
-                                  capture_output=True, timeout=2)
-            return "connected" if result.returncode == 0 else "bootstrapping"
+            state, progress = self.control.tor_status()
         except:
-            return "unknown"
+            state, progress = "unknown", None
+        tide_metrics.record_tor(state, progress)
+        return state, progress
     
     def _get_uptime(self):
         """Get system uptime in seconds"""
@@ -86,121 +200,228 @@ class TideAPIHandler(http.server.BaseHTTPRequestHandler):
             return 0
     
     def _get_mode(self):
-        """Get Tide mode"""
-        try:
-            with open('/etc/tide/mode', 'r') as f:
-                return f.read().strip()
-        except:
-            return "unknown"
+        """Get Tide mode (watched /etc/tide/mode)"""
+        return self.config.get("mode")
     
     def _get_security(self):
-        """Get Tide security profile"""
-        try:
-            with open('/etc/tide/security', 'r') as f:
-                return f.read().strip()
-        except:
-            return "standard"
+        """Get Tide security profile (watched /etc/tide/security)"""
+        return self.config.get("security")
     
     def _get_version(self):
-        """Get Tide version"""
-        try:
-            with open('/opt/tide/VERSION', 'r') as f:
-                return f.read().strip()
-        except:
-            return "unknown"
+        """Get Tide version (watched /opt/tide/VERSION)"""
+        return self.config.get("version")
+    
+    def _on_config_change(self, name, value):
+        """Resample a changed state file now (config watcher thread)"""
+        if name in self.sampler.fields:
+            self.sampler.refresh([name])
     
     def _get_circuit_info(self):
-        """Get current Tor exit IP info"""
-        try:
-            result = subprocess.run([
-                'curl', '-s', '--socks5', '127.0.0.1:9050',
-                '--max-time', '10',
-                'https://check.torproject.org/api/ip'
-            ], capture_output=True, text=True, timeout=15)
-            
-            if result.returncode == 0 and result.stdout:
-                return json.loads(result.stdout)
-            return {"error": "timeout"}
-        except:
-            return {"error": "failed"}
+        """Get current Tor exit IP info (cached, single-flight)"""
+        return self.circuit.get()
     
-    def _new_circuit(self):
-        """Request new Tor circuit"""
-        try:
-            subprocess.run(['killall', '-HUP', 'tor'], timeout=2)
-            return True
-        except:
-            return False
+    def _new_circuit(self, wait=False):
+        """Request new Tor circuit (coalesced, rate-limited SIGNAL NEWNYM)"""
+        return self.rotator.rotate(wait=wait)
+    
+    async def _sampled(self, names):
+        """Snapshot holding `names` - from memory, probing only if stale"""
+        snap = self.sampler.cached(names)
+        if snap is None:
+            snap = await run_blocking(self.sampler.sample, names)
+        return snap
+    
+    def _publish_state(self, snap):
+        """Push watched fields to /events subscribers (sampler thread)"""
+        if self.events.subscribers:
+            # Someone is watching the exit IP - keep it warm
+            self.circuit.prefetch()
+        exit_info = self.circuit.peek() or {}
+        # Only fields that have been sampled - never push placeholders
+        state = {k: snap.fields[k] for k in EVENT_FIELDS if k in snap.fields}
+        state["exit_ip"] = exit_info.get("IP")
+        self.events.publish(state)
+    
+    def _write_record(self, snap):
+        """Publish the shared status record (sampler thread)"""
+        exit_info, age = self.circuit.peek(), self.circuit.age()
+        self.record.write(snap.fields, exit_info,
+                          time.time() - age if age is not None else 0.0)
     
-    def _check_auth(self):
+    def _check_auth(self, request):
         """Check if request has valid Bearer token"""
-        auth = self.headers.get('Authorization', '')
-        if auth == f'Bearer {API_TOKEN}':
+        auth = request.headers.get('authorization', '')
+        # A rotated /etc/tide/api_token takes effect without a restart
+        token = ENV_TOKEN or self.config.get("api_token") or API_TOKEN
+        if auth == f'Bearer {token}':
             return True
         return False
     
-    def do_GET(self):
-        """Handle GET requests"""
-        path = urlparse(self.path).path
+    async def handle(self, request):
+        """Dispatch a request to its route"""
+        if request.method not in ('GET', 'HEAD'):
+            return json_response(501, {"error": "unsupported method"})
         
-        if path == '/status':
-            self._send_json(200, {
-                "gateway": "tide",
-                "version": self._get_version(),
-                "mode": self._get_mode(),
-                "security": self._get_security(),
-                "tor": self._tor_status(),
-                "uptime": self._get_uptime(),
-                "ip": "10.101.101.10",
-                "ports": {
-                    "socks": 9050,
-                    "dns": 5353,
-                    "api": PORT
-                }
-            })
-        
-        elif path == '/circuit':
-            self._send_json(200, self._get_circuit_info())
+        route = self.routes.get(request.path)
+        if route is None:
+            return json_response(404, {"error": "not found"})
+        if request.method == 'HEAD' and request.path not in HEAD_ROUTES:
+            return json_response(405, {"error": "method not allowed"},
+                                 {"Allow": "GET"})
+        return await route(request)
+    
+    async def _route_status(self, request):
+        """GET /status[?fields=a,b] - gateway status, optionally projected"""
+        data = await self._status_data(request)
+        tagged = {k: v for k, v in data.items() if k not in STATUS_VOLATILE}
+        etag = make_etag(json.dumps(tagged, sort_keys=True).encode())
+        return conditional(request, json_response(200, data), etag)
+    
+    async def _status_data(self, request):
+        """/status body for the request's ?fields= (default: every field)"""
+        fields = request.query.get("fields")
+        if fields:
+            wanted = [f for f in ",".join(fields).split(",") if f]
+            if not (request.loopback or self._check_auth(request)):
+                wanted = [f for f in wanted if f not in STATUS_PRIVATE]
+        else:
+            wanted = [f for f in STATUS_DEFAULTS if f not in STATUS_PRIVATE]
         
-        elif path == '/newcircuit':
-            # Requires authentication
-            if not self._check_auth():
-                self._send_json(401, {
-                    "error": "unauthorized",
-                    "message": "Bearer token required for circuit control"
-                })
-                return
-            
-            success = self._new_circuit()
-            self._send_json(200, {"success": success})
+        sampled = [f for f in wanted if f in self.sampler.fields]
+        snap = await self._sampled(sampled) if sampled else None
         
-        elif path == '/check':
-            # Quick health check endpoint
-            self._send_json(200, {
-                "status": "ok",
-                "version": self._get_version()
+        data = {}
+        for name in wanted:
+            if name in STATUS_STATIC:
+                data[name] = STATUS_STATIC[name]
+            elif name in STATUS_DEFAULTS:
+                data[name] = snap.fields.get(name, STATUS_DEFAULTS[name])
+        if snap is not None:
+            data["snapshot_age"] = round(snap.age(sampled), 3)
+        return data
+    
+    async def _route_circuit(self, request):
+        """GET /circuit - current Tor exit info"""
+        return conditional(request, json_response(
+            200, await run_blocking(self._get_circuit_info)))
+    
+    async def _route_newcircuit(self, request):
+        """GET /newcircuit[?wait=1] - request new Tor circuit"""
+        # Requires authentication
+        if not self._check_auth(request):
+            return json_response(401, {
+                "error": "unauthorized",
+                "message": "Bearer token required for circuit control"
             })
         
-        elif path in ['/discover', '/']:
-            self._send_json(200, {
-                "service": "tide",
-                "version": self._get_version()
-            })
+        wait = request.query.get("wait", ["0"])[0] not in ("0", "false", "")
+        return json_response(200, await run_blocking(self._new_circuit, wait))
+    
+    async def _route_check(self, request):
+        """GET /check - quick health check"""
+        return conditional(request, json_response(200, await self._check_data()))
+    
+    async def _check_data(self):
+        snap = await self._sampled(["version"])
+        return {
+            "status": "ok",
+            "version": snap.fields.get("version", "unknown")
+        }
+    
+    async def _route_snapshot(self, request):
+        """GET /snapshot[?deadline=s&fields=a,b] - status + circuit + check"""
+        try:
+            deadline = float(request.query.get("deadline", [SNAPSHOT_DEADLINE])[0])
+        except ValueError:
+            deadline = SNAPSHOT_DEADLINE
+        if not math.isfinite(deadline):
+            deadline = SNAPSHOT_DEADLINE  # nan/inf slip through min/max
+        deadline = min(max(deadline, 0.0), SNAPSHOT_MAX_DEADLINE)
         
-        else:
-            self._send_json(404, {"error": "not found"})
+        parts = {
+            "status": asyncio.ensure_future(self._status_data(request)),
+            "circuit": asyncio.ensure_future(run_blocking(self._get_circuit_info)),
+            "check": asyncio.ensure_future(self._check_data()),
+        }
+        await asyncio.wait(parts.values(), timeout=deadline)
+        
+        data = {"partial": []}
+        for name, task in parts.items():
+            if task.done() and not task.cancelled() and task.exception() is None:
+                data[name] = task.result()
+            else:
+                # Late part: a circuit probe keeps filling the shared cache
+                task.cancel()
+                data[name] = None
+                data["partial"].append(name)
+        return json_response(200, data)
+    
+    async def _route_metrics(self, request):
+        """GET /metrics - Prometheus metrics (loopback or Bearer token)"""
+        if not (request.loopback or self._check_auth(request)):
+            return json_response(401, {
+                "error": "unauthorized",
+                "message": "Bearer token required for metrics"
+            })
+        await run_blocking(PROCS.refresh)
+        return Response(200, tide_metrics.render().encode(),
+                        content_type=tide_metrics.CONTENT_TYPE)
+    
+    async def _route_events(self, request):
+        """GET /events - Server-Sent Events stream of state deltas"""
+        self.events.bind(asyncio.get_running_loop())
+        return StreamResponse(200, self.events.stream(), headers={
+            'Cache-Control': 'no-cache',
+            'Access-Control-Allow-Origin': '*',
+        })
+    
+    async def _route_discover(self, request):
+        """GET /discover, / - service discovery"""
+        snap = await self._sampled(["version"])
+        return conditional(request, json_response(200, {
+            "service": "tide",
+            "version": snap.fields.get("version", "unknown")
+        }))
+
+
+def supervise(workers):
+    """Prefork supervisor: sample status once for all workers, serve nothing"""
+    handler = TideAPIHandler()
+    handler.config.start()
+    sampler = handler.sampler
+    sampler.keep_warm(lambda: sampler.fields)
+    sampler.add_listener(SnapshotFile(STATUS_FILE).write)
+    sampler.refresh()
+    sampler.start()
+    handler.beacon.start()
+    CircuitService(CIRCUIT_SOCKET, handler.circuit, handler.rotator).start()
+    print(f"🌊 Tide API server running on port {PORT} ({workers} workers)")
+    Supervisor(workers).run()
 
 
 def main():
     """Start the API server"""
-    # Allow port reuse
-    socketserver.TCPServer.allow_reuse_address = True
+    workers = worker_count()
+    worker = worker_id()
+    if workers > 1 and worker is None:
+        supervise(workers)
+        return
     
-    with socketserver.TCPServer(("", PORT), TideAPIHandler) as httpd:
+    handler = TideAPIHandler(shared_status=STATUS_FILE if worker is not None else None)
+    handler.config.start()
+    if handler.feed is not None:
+        handler.feed.follow(handler.sampler)
+    else:
+        handler.sampler.start()
+        handler.beacon.start()
+    server = HTTPServer(handler.handle, port=PORT, routes=handler.routes,
+                        reuse_port=worker is not None)
+    if worker is None:
         print(f"🌊 Tide API server running on port {PORT}")
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        if worker is None:
             print("\n✋ Stopping API server...")
 
 
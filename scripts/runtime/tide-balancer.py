@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tide Tor Balancer
+=================
+Optional replacement for a single `tor` process: runs a pool of Tor
+instances and spreads LAN streams across them (see tide_balance.py).
+
+Opt-in: gateway-start.sh runs this instead of `tor` when
+TIDE_TOR_INSTANCES is not 1. It owns the public SocksPort (9050) and
+TransPort (9040); the instances only listen on loopback.
+
+Environment:
+    TIDE_TOR_INSTANCES      instances to run: a number, or "auto" (one per CPU)
+    TIDE_TOR_MAX_INSTANCES  autoscaling ceiling (default: TIDE_TOR_INSTANCES)
+    TIDE_TORRC              profile torrc (default /etc/tor/torrc)
+    TIDE_TOR_BIN            tor command (default "tor")
+    TIDE_SOCKS_LISTEN       public SOCKS address (default 0.0.0.0:9050)
+    TIDE_TRANS_LISTEN       public TransPort address (default 0.0.0.0:9040,
+                            empty to disable)
+
+ZERO-LOG POLICY: nothing is logged; only pool-level counts are published.
+"""
+
+import asyncio
+import os
+import signal
+
+from tide_balance import Balancer, TorPool
+
+
+def _count(name, default):
+    value = os.getenv(name, '').strip().lower()
+    if value == 'auto':
+        return os.cpu_count() or 1
+    try:
+        return max(1, int(value))
+    except ValueError:
+        return default
+
+
+def _address(name, default):
+    value = os.getenv(name, default)
+    if not value:
+        return None
+    host, _, port = value.rpartition(':')
+    return host or '0.0.0.0', int(port)
+
+
+async def serve(pool):
+    balancer = Balancer(pool)
+    servers = [await asyncio.start_server(balancer.handle_socks,
+                                          *_address('TIDE_SOCKS_LISTEN', '0.0.0.0:9050'),
+                                          reuse_address=True)]
+    trans = _address('TIDE_TRANS_LISTEN', '0.0.0.0:9040')
+    if trans:
+        servers.append(await asyncio.start_server(balancer.handle_trans, *trans,
+                                                  reuse_address=True))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    health = loop.create_task(pool.run())
+    await stop.wait()
+    health.cancel()
+    for server in servers:
+        server.close()
+
+
+def main():
+    minimum = _count('TIDE_TOR_INSTANCES', 1)
+    pool = TorPool(os.getenv('TIDE_TORRC', '/etc/tor/torrc'), minimum,
+                   _count('TIDE_TOR_MAX_INSTANCES', minimum),
+                   os.getenv('TIDE_TOR_BIN', 'tor'))
+    print(f"🌊 Tide Tor balancer: {pool.minimum}-{pool.maximum} instances")
+    pool.start()
+    try:
+        asyncio.run(serve(pool))
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,14 @@ case "$CMD" in
         echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
         echo ""
         
+        # Tor state, clients and process checks from the status record the
+        # API publishes in /run/tide (tide_record.py); probe only without it
+        TIDE_TOR=""
+        RECORD_READER="$(dirname "$(readlink -f "$0")")/tide_record.py"
+        if [ -f "$RECORD_READER" ]; then
+            eval "$(python3 "$RECORD_READER" 2>/dev/null)"
+        fi
+        
         # Mode
         if [ -f /etc/tide/mode ]; then
             MODE=$(cat /etc/tide/mode)
@@ -49,7 +57,14 @@ case "$CMD" in
         fi
         
         # Tor Status
-        if pgrep -x tor >/dev/null 2>&1; then
+        if [ -n "$TIDE_TOR" ]; then
+            case "$TIDE_TOR" in
+                connected) echo -e "${GREEN}Tor:${NC} 🟢 connected" ;;
+                bootstrapping) echo -e "${YELLOW}Tor:${NC} 🟡 bootstrapping ${TIDE_BOOTSTRAP}%" ;;
+                *) echo -e "${RED}Tor:${NC} 🔴 $TIDE_TOR" ;;
+            esac
+            [ -n "$TIDE_EXIT_IP" ] && echo -e "${GREEN}Exit IP:${NC} $TIDE_EXIT_IP"
+        elif pgrep -x tor >/dev/null 2>&1; then
             if nc -z 127.0.0.1 9050 2>/dev/null; then
                 echo -e "${GREEN}Tor:${NC} 🟢 connected"
             else
@@ -71,18 +86,24 @@ case "$CMD" in
         echo -e "${PURPLE}Gateway IP:${NC} 10.101.101.10"
         
         # Connected Clients
-        if [ -f /var/lib/misc/dnsmasq.leases ]; then
+        if [ -n "$TIDE_TOR" ]; then
+            echo -e "${GREEN}Clients:${NC} $TIDE_CLIENTS connected"
+        elif [ -f /var/lib/misc/dnsmasq.leases ]; then
             CLIENTS=$(wc -l < /var/lib/misc/dnsmasq.leases)
             echo -e "${GREEN}Clients:${NC} $CLIENTS connected"
         fi
         
         # ARP Poisoning (Killa Whale mode)
-        if pgrep -f "arp-poison" >/dev/null 2>&1; then
+        if [ -n "$TIDE_TOR" ]; then
+            [ "$TIDE_ARP" = "1" ] && echo -e "${RED}ARP Poisoning:${NC} 🔥 ACTIVE"
+        elif pgrep -f "arp-poison" >/dev/null 2>&1; then
             echo -e "${RED}ARP Poisoning:${NC} 🔥 ACTIVE"
         fi
         
         # Network Scanner
-        if pgrep -f "network-scanner" >/dev/null 2>&1; then
+        if [ -n "$TIDE_TOR" ]; then
+            [ "$TIDE_SCANNER" = "1" ] && echo -e "${YELLOW}Network Scanner:${NC} 👁️  ACTIVE"
+        elif pgrep -f "network-scanner" >/dev/null 2>&1; then
             echo -e "${YELLOW}Network Scanner:${NC} 👁️  ACTIVE"
         fi
         
@@ -125,10 +146,22 @@ case "$CMD" in
     
     newcircuit|new)
         echo "🔄 Requesting new Tor circuit..."
-        killall -HUP tor
-        sleep 2
-        echo "✅ New circuit requested"
-        echo "   Run 'tide circuit' to verify new exit IP"
+        # Through the API: shares/rate-limits NEWNYM and waits for the new exit
+        TOKEN="${TIDE_API_TOKEN:-$(cat /etc/tide/api_token 2>/dev/null)}"
+        RESULT=$(curl -s --max-time 40 -H "Authorization: Bearer $TOKEN" \
+            "http://127.0.0.1:9051/newcircuit?wait=1")
+        
+        if echo "$RESULT" | grep -q '"success": true'; then
+            IP=$(echo "$RESULT" | grep -o '"IP": "[^"]*"' | cut -d'"' -f4)
+            echo "✅ New circuit ready"
+            [ -n "$IP" ] && echo "   Exit IP: $IP"
+        else
+            # API unavailable - signal Tor directly
+            killall -HUP tor
+            sleep 2
+            echo "✅ New circuit requested"
+            echo "   Run 'tide circuit' to verify new exit IP"
+        fi
         ;;
     
     web|dashboard)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tide DNS Front-End
+==================
+Optional caching DNS server between LAN clients and Tor's DNSPort.
+Listens on UDP 5300 and forwards misses to 127.0.0.1:5353 (see
+tide_dns.py for the cache, coalescing and prefetch behaviour).
+
+Opt-in: with TIDE_DNS_CACHE=1, gateway-start.sh starts it and points the
+port 53 redirect and dnsmasq at 5300 instead of Tor's DNSPort.
+
+Environment:
+    TIDE_DNS_PORT           listen port (default 5300)
+    TIDE_DNS_UPSTREAM       Tor DNSPort, host:port (default 127.0.0.1:5353)
+    TIDE_DNS_CACHE_SIZE     max cached answers (default 10000)
+    TIDE_DNS_MIN_TTL        minimum seconds an answer is cached (default 60)
+    TIDE_DNS_METRICS_PORT   loopback-only /metrics port (default 9055, 0 = off)
+
+SIGHUP flushes the cache.
+
+ZERO-LOG POLICY: no query, name or client is ever logged or written to
+disk; the cache is memory only and gone when the process exits.
+"""
+
+import asyncio
+import os
+import signal
+
+import tide_metrics
+from tide_dns import CACHE_SIZE, DEFAULT_UPSTREAM, MIN_TTL, DNSFrontEnd
+from tide_http import HTTPServer, Response
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _upstream():
+    host, _, port = os.getenv('TIDE_DNS_UPSTREAM', '').rpartition(':')
+    try:
+        return (host or DEFAULT_UPSTREAM[0], int(port))
+    except ValueError:
+        return DEFAULT_UPSTREAM
+
+
+PORT = _env_int('TIDE_DNS_PORT', 5300)
+METRICS_PORT = _env_int('TIDE_DNS_METRICS_PORT', 9055)
+
+
+async def _metrics(request):
+    """GET /metrics - served on 127.0.0.1 only"""
+    if request.path != '/metrics':
+        return Response(404, b'', content_type=None)
+    return Response(200, tide_metrics.render().encode(),
+                    content_type=tide_metrics.CONTENT_TYPE)
+
+
+async def serve():
+    dns = DNSFrontEnd(upstream=_upstream(),
+                      cache_size=_env_int('TIDE_DNS_CACHE_SIZE', CACHE_SIZE),
+                      min_ttl=_env_int('TIDE_DNS_MIN_TTL', MIN_TTL))
+    await dns.start(port=PORT)
+    asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, dns.flush)
+
+    if METRICS_PORT:
+        server = HTTPServer(_metrics, host='127.0.0.1', port=METRICS_PORT,
+                            routes={'/metrics'})
+        await server.serve_forever()
+    else:
+        await asyncio.Event().wait()
+
+
+def main():
+    print(f"🌊 Tide DNS cache on UDP port {PORT} -> {_upstream()[0]}:{_upstream()[1]}")
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\n✋ Stopping DNS cache...")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,68 +7,77 @@ Nginx reverse proxy serves port 80 (external).
 Accessible at http://tide.bodegga.net or http://10.101.101.10
 
 Aggressive Killa Whale mode: DNS hijacking forces tide.bodegga.net → 10.101.101.10
+
+Routes: /, /api/status, /health, /metrics. Status comes from the API's
+shared-memory record (tide_record), falling back to its own probes.
+
+Security: nginx makes every visitor look like loopback, so /metrics and
+per-service process data require the API token.
 """
 
-import http.server
-import socketserver
+import asyncio
 import json
-import subprocess
 import os
-import time
-from urllib.parse import urlparse
 
-PORT = 8080  # Internal port (nginx proxies 80 → 8080)
+import tide_metrics
+from tide_http import (HTTPServer, Response, conditional, html_response,
+                       json_response, make_etag, run_blocking)
+from tide_control import TorControl
+from tide_config import TideConfig
+from tide_circuit import CircuitCache
+from tide_balance import pool_instances
+from tide_leases import LeaseIndex
+from tide_procs import PROCS
+from tide_record import StatusRecord
+from tide_prefork import Supervisor, worker_count, worker_id
 
-def get_version():
-    """Get Tide version from VERSION file"""
-    try:
-        with open('/opt/tide/VERSION', 'r') as f:
-            return f.read().strip()
-    except:
-        return "unknown"
+PORT = int(os.getenv('TIDE_DASHBOARD_PORT', '8080'))  # Internal port (nginx proxies 80 → 8080)
+
+# /etc/tide state files + VERSION, loaded once and watched for changes
+CONFIG = TideConfig()
+
+# One persistent ControlPort connection shared by all requests
+CONTROL = TorControl()
+
+# Exit-IP lookups are cached and coalesced across concurrent viewers
+CIRCUIT = CircuitCache()
 
-VERSION = get_version()
+# DHCP leases, re-parsed only when dnsmasq rewrites the file
+LEASES = LeaseIndex()
 
+# Status published by the API in shared memory; the probes above are only
+# the fallback for when the API is not running
+RECORD = StatusRecord()
 
-class TideWebHandler(http.server.BaseHTTPRequestHandler):
+
+class TideWebHandler:
     """Handle web dashboard requests"""
     
-    def log_message(self, format, *args):
-        """ZERO-LOG POLICY: No request logging for privacy"""
-        # Tide Gateway is a privacy appliance - we NEVER log client IPs or requests
-        # This maintains user anonymity and security
-        pass
-    
-    def _send_html(self, code, html):
-        """Send HTML response"""
-        self.send_response(code)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
-        self.send_header('Connection', 'close')
-        self.end_headers()
-        self.wfile.write(html.encode())
+    # ZERO-LOG POLICY: No request logging for privacy
+    # Tide Gateway is a privacy appliance - we NEVER log client IPs or requests
+    # This maintains user anonymity and security
     
-    def _send_json(self, code, data):
-        """Send JSON response"""
-        self.send_response(code)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Connection', 'close')
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+    def __init__(self):
+        self.routes = {
+            '/': self._route_dashboard,
+            '/index.html': self._route_dashboard,
+            '/api/status': self._route_api_status,
+            '/health': self._route_health,
+            '/metrics': self._route_metrics,
+        }
     
     def _tor_status(self):
-        """Check if Tor is running and connected"""
-        try:
-            result = subprocess.run(['pgrep', '-x', 'tor'], 
-                                  capture_output=True, timeout=2)
-            if result.returncode != 0:
-                return "offline"
-            
-            result = subprocess.run(['nc', '-z', '127.0.0.1', '9050'],
-                                  capture_output=True, timeout=2)
-            return "connected" if result.returncode == 0 else "bootstrapping"
-        except:
-            return "unknown"
+        """Check if Tor is running and connected -> (state, bootstrap %)"""
+        record = RECORD.read()
+        if record is not None:
+            state, progress = record['tor'], record['bootstrap']
+        else:
+            try:
+                state, progress = CONTROL.tor_status()
+            except:
+                state, progress = "unknown", None
+        tide_metrics.record_tor(state, progress)
+        return state, progress
     
     def _get_uptime(self):
         """Get system uptime"""
@@ -82,71 +91,85 @@ class TideWebHandler(http.server.BaseHTTPRequestHandler):
             return "unknown"
     
     def _get_mode(self):
-        """Get Tide mode"""
-        try:
-            with open('/etc/tide/mode', 'r') as f:
-                return f.read().strip()
-        except:
-            return "unknown"
+        """Get Tide mode (watched /etc/tide/mode)"""
+        return CONFIG.get('mode')
     
     def _get_security(self):
-        """Get Tide security profile"""
-        try:
-            with open('/etc/tide/security', 'r') as f:
-                return f.read().strip()
-        except:
-            return "standard"
+        """Get Tide security profile (watched /etc/tide/security)"""
+        return CONFIG.get('security')
     
     def _get_circuit_info(self):
-        """Get current Tor exit IP info"""
-        try:
-            result = subprocess.run([
-                'curl', '-s', '--socks5', '127.0.0.1:9050',
-                '--max-time', '5',
-                'https://check.torproject.org/api/ip'
-            ], capture_output=True, text=True, timeout=8)
-            
-            if result.returncode == 0 and result.stdout:
-                data = json.loads(result.stdout)
-                return data
-            return None
-        except:
+        """Get current Tor exit IP info (API's, else cached single-flight probe)"""
+        record = RECORD.read()
+        if record is not None and record['exit'] and record['exit_age'] < CIRCUIT.ttl:
+            return record['exit']
+        data = CIRCUIT.get()
+        if not data or 'error' in data:
             return None
+        return data
     
     def _get_network_stats(self):
         """Get network interface stats"""
+        with tide_metrics.PROBE_SECONDS.time('network_stats'):
+            return self._collect_network_stats()
+    
+    def _collect_network_stats(self):
+        record = RECORD.read()
+        if record is not None:
+            return {k: record[k] for k in ('clients', 'arp_active', 'scanner_active')}
+        
         stats = {}
         try:
-            # Get connected clients (DHCP leases)
-            clients = 0
-            if os.path.exists('/var/lib/misc/dnsmasq.leases'):
-                with open('/var/lib/misc/dnsmasq.leases', 'r') as f:
-                    clients = len(f.readlines())
-            stats['clients'] = clients
+            # Connected clients: unexpired DHCP leases
+            stats['clients'] = LEASES.active()
             
-            # Get ARP poisoning status (if running)
-            result = subprocess.run(['pgrep', '-f', 'arp-poison'], 
-                                  capture_output=True, timeout=1)
-            stats['arp_active'] = (result.returncode == 0)
-            
-            # Check if network scanner is running
-            result = subprocess.run(['pgrep', '-f', 'network-scanner'], 
-                                  capture_output=True, timeout=1)
-            stats['scanner_active'] = (result.returncode == 0)
+            # ARP poisoning / network scanner running? (cached /proc scan)
+            stats['arp_active'] = PROCS.running('arp-poison')
+            stats['scanner_active'] = PROCS.running('network-scanner')
             
         except:
             pass
         
         return stats
     
-    def _get_dashboard_html(self):
-        """Generate dashboard HTML"""
-        tor_status = self._tor_status()
+    def _get_instance_rows(self):
+        """Network Status rows for each balanced Tor instance (none without a pool)"""
+        rows = ""
+        for inst in pool_instances() or ():
+            state = inst['state'].upper()
+            if inst['state'] == 'bootstrapping':
+                state += f" {inst['bootstrap']}%"
+            rows += f"""
+            <div class="stat-row">
+                <span class="stat-label">Tor Instance {inst['id']}</span>
+                <span class="stat-value">{state} • {inst['streams']} streams • {inst['clients']} clients</span>
+            </div>"""
+        return rows
+    
+    def _get_process_rows(self):
+        """Network Status rows with CPU and memory of Tor and the Tide services"""
+        rows = ""
+        for name, usage in sorted(PROCS.usage().items()):
+            count = len(usage['pids'])
+            label = f"{name} ×{count}" if count > 1 else name
+            rows += f"""
+            <div class="stat-row">
+                <span class="stat-label">Process {label}</span>
+                <span class="stat-value">{usage['cpu_percent']}% CPU • {usage['rss_bytes'] // 1048576} MB</span>
+            </div>"""
+        return rows
+    
+    def _get_dashboard_html(self, private=False):
+        """Generate dashboard HTML (process rows only when private)"""
+        tor_status, bootstrap = self._tor_status()
         mode = self._get_mode()
         security = self._get_security()
         uptime = self._get_uptime()
         circuit = self._get_circuit_info()
         net_stats = self._get_network_stats()
+        instance_rows = self._get_instance_rows()
+        if private:
+            instance_rows += self._get_process_rows()
         
         # Status emoji and color
         if tor_status == "connected":
@@ -157,6 +180,8 @@ class TideWebHandler(http.server.BaseHTTPRequestHandler):
             status_emoji = "🟡"
             status_color = "#ffff00"
             status_text = "BOOTSTRAPPING"
+            if bootstrap is not None:
+                status_text += f" {bootstrap}%"
         else:
             status_emoji = "🔴"
             status_color = "#ff0000"
@@ -424,7 +449,7 @@ class TideWebHandler(http.server.BaseHTTPRequestHandler):
             <div class="stat-row">
                 <span class="stat-label">Network Scanner</span>
                 <span class="stat-value">{'ACTIVE 👁️' if net_stats.get('scanner_active') else 'Inactive'}</span>
-            </div>
+            </div>{instance_rows}
         </div>
         
         <div style="text-align: center;">
@@ -432,63 +457,112 @@ class TideWebHandler(http.server.BaseHTTPRequestHandler):
         </div>
         
         <div class="footer">
-            <p>Tide Gateway v{VERSION} • <a href="https://github.com/bodegga/tide" style="color: #666;">github.com/bodegga/tide</a></p>
+            <p>Tide Gateway v{CONFIG.get('version')} • <a href="https://github.com/bodegga/tide" style="color: #666;">github.com/bodegga/tide</a></p>
             <p style="margin-top: 5px;">Access this dashboard at <strong>http://tide.bodegga.net</strong> or <strong>http://10.101.101.10</strong></p>
         </div>
     </div>
     
     <script>
-        // Auto-refresh every 30 seconds
-        setTimeout(() => location.reload(), 30000);
+        // Live updates: reload only when gateway state changes (API /events).
+        // Fall back to refreshing every 30 seconds if the stream is unavailable.
+        let fallback = setTimeout(() => location.reload(), 30000);
+        if (window.EventSource) {{
+            const events = new EventSource(`http://${{location.hostname}}:9051/events`);
+            events.addEventListener('snapshot', () => clearTimeout(fallback));
+            events.addEventListener('delta', () => location.reload());
+            events.onerror = () => {{
+                events.close();
+                clearTimeout(fallback);
+                fallback = setTimeout(() => location.reload(), 30000);
+            }};
+        }}
     </script>
 </body>
 </html>
 """
         return html
     
-    def do_GET(self):
-        """Handle GET requests"""
-        path = urlparse(self.path).path
-        
-        if path == '/' or path == '/index.html':
-            # Serve dashboard
-            html = self._get_dashboard_html()
-            self._send_html(200, html)
-        
-        elif path == '/api/status':
-            # JSON API endpoint
-            tor_status = self._tor_status()
-            circuit = self._get_circuit_info()
-            
-            self._send_json(200, {
-                "gateway": "tide",
-                "version": VERSION,
-                "mode": self._get_mode(),
-                "security": self._get_security(),
-                "tor": tor_status,
-                "uptime": self._get_uptime(),
-                "circuit": circuit,
-                "network": self._get_network_stats()
-            })
-        
-        elif path == '/health':
-            # Simple health check
-            self._send_json(200, {"status": "ok"})
+    def _get_api_status(self, private=False):
+        """Build the /api/status payload (processes only when private)"""
+        tor_status, bootstrap = self._tor_status()
+        circuit = self._get_circuit_info()
         
-        else:
-            self._send_html(404, "<h1>404 Not Found</h1>")
+        data = {
+            "gateway": "tide",
+            "version": CONFIG.get('version'),
+            "mode": self._get_mode(),
+            "security": self._get_security(),
+            "tor": tor_status,
+            "bootstrap": bootstrap,
+            "uptime": self._get_uptime(),
+            "circuit": circuit,
+            "network": self._get_network_stats(),
+            "tor_instances": pool_instances(),
+        }
+        if private:
+            data["processes"] = PROCS.usage()
+        return data
+    
+    async def handle(self, request):
+        """Dispatch a request to its route"""
+        if request.method not in ('GET', 'HEAD'):
+            return html_response(501, "<h1>501 Not Implemented</h1>")
+        
+        route = self.routes.get(request.path)
+        if route is None:
+            return html_response(404, "<h1>404 Not Found</h1>")
+        return await route(request)
+    
+    def _check_auth(self, request):
+        """Bearer API token present (nginx hides the real client address)"""
+        token = os.getenv('TIDE_API_TOKEN') or CONFIG.get('api_token')
+        auth = request.headers.get('authorization', '')
+        return bool(token) and auth == f'Bearer {token}'
+    
+    async def _route_dashboard(self, request):
+        """GET /, /index.html - dashboard page"""
+        return conditional(request, html_response(
+            200, await run_blocking(self._get_dashboard_html,
+                                    self._check_auth(request))))
+    
+    async def _route_api_status(self, request):
+        """GET /api/status - JSON API endpoint"""
+        data = await run_blocking(self._get_api_status, self._check_auth(request))
+        # uptime and CPU move every poll - tag only the state that matters
+        tagged = {k: v for k, v in data.items() if k not in ("uptime", "processes")}
+        etag = make_etag(json.dumps(tagged, sort_keys=True).encode())
+        return conditional(request, json_response(200, data), etag)
+    
+    async def _route_health(self, request):
+        """GET /health - simple health check"""
+        return conditional(request, json_response(200, {"status": "ok"}))
+    
+    async def _route_metrics(self, request):
+        """GET /metrics - Prometheus metrics (Bearer token required)"""
+        if not self._check_auth(request):
+            return json_response(401, {"error": "unauthorized"})
+        await run_blocking(PROCS.refresh)
+        return Response(200, tide_metrics.render().encode(),
+                        content_type=tide_metrics.CONTENT_TYPE)
 
 
 def main():
     """Start the web dashboard server"""
-    socketserver.TCPServer.allow_reuse_address = True
+    workers = worker_count()
+    worker = worker_id()
+    if workers > 1 and worker is None:
+        Supervisor(workers).run()
+        return
     
-    with socketserver.TCPServer(("", PORT), TideWebHandler) as httpd:
-        # ZERO-LOG: No startup messages
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            pass  # ZERO-LOG: No shutdown messages
+    CONFIG.start()
+    handler = TideWebHandler()
+    server = HTTPServer(handler.handle, port=PORT, routes=handler.routes,
+                        reuse_port=worker is not None)
+    # ZERO-LOG: No startup messages
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass  # ZERO-LOG: No shutdown messages
 
 
 if __name__ == "__main__":
@@ -0,0 +1,637 @@
+"""
+Tide Tor Balancer
+=================
+Spreads LAN traffic over several Tor processes. Tor does almost all of
+its work on one thread, so a single SocksPort/TransPort caps the whole
+gateway at one core.
+
+TorPool supervises N tor processes built from the active torrc profile.
+Listener lines are replaced per instance:
+
+    instance 0     profile DataDirectory, DNSPort and ControlPort (9052),
+                   so DNS, the API and the dashboard see no difference
+    instance i>0   DataDirectory /var/lib/tor-tide/<i>,
+                   ControlPort 127.0.0.1:19150+i
+    every instance SocksPort 127.0.0.1:19050+i (profile SocksPort flags)
+                   SocksPort 127.0.0.1:19250+i (profile TransPort flags)
+
+Balancer owns the public ports instead of Tor: SOCKS (9050) and the
+transparent port (9040, original destination from SO_ORIGINAL_DST).
+Each new stream goes to the instance with the fewest open streams. A
+client stays on the instance it was given (stickiness, so its exit does
+not change between streams) until it has been idle for STICKY_IDLE.
+Tor only sees 127.0.0.1, so every stream is tagged upstream with a SOCKS
+username derived from the client. That way IsolateSOCKSAuth keeps
+clients on separate circuits, as IsolateClientAddr did before.
+
+Every HEALTH_INTERVAL the pool checks each instance over its ControlPort
+(bootstrap progress) and restarts dead ones with backoff. It adds an
+instance when the average load stays above SCALE_UP_STREAMS, and drains
+the newest one when load stays below SCALE_DOWN_STREAMS. Per-instance
+state goes to /run/tide/tor-instances.json for /status and the dashboard.
+
+ZERO-LOG POLICY: client addresses are only used as salted, per-process
+hashes held in memory; no stream, destination or client is logged.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import pwd
+import secrets
+import shlex
+import socket
+import struct
+import subprocess
+import time
+
+from tide_config import TIDE_ROOT
+from tide_control import CONTROL_PORT, ControlError, TorControl
+from tide_http import run_blocking
+from tide_prefork import STATE_DIR
+
+INSTANCE_ROOT = TIDE_ROOT + '/var/lib/tor-tide'
+STATE_FILE = STATE_DIR + '/tor-instances.json'
+
+SOCKS_BASE = 19050          # Instance i: SOCKS for LAN SOCKS clients
+CONTROL_BASE = 19150
+TRANS_BASE = 19250          # Instance i: SOCKS for transparent traffic
+MAX_INSTANCES = 32
+
+HEALTH_INTERVAL = 5.0
+START_GRACE = 60.0          # Seconds an instance may take to open its ControlPort
+MIN_UPTIME = 10.0           # Dying sooner than this counts as a crash
+MAX_BACKOFF = 60.0
+STICKY_IDLE = 600.0         # Seconds before an idle client may move instance
+SCALE_UP_STREAMS = 200      # Streams per ready instance that adds one...
+SCALE_UP_AFTER = 30.0       # ...once sustained this long
+SCALE_DOWN_STREAMS = 40     # Streams per instance below which one is drained...
+SCALE_DOWN_AFTER = 300.0    # ...once sustained this long
+DRAIN_TIMEOUT = 600.0       # Draining instances are stopped after this at most
+HANDSHAKE_TIMEOUT = 10.0
+SPLICE_CHUNK = 65536
+
+SO_ORIGINAL_DST = 80        # <linux/netfilter_ipv4.h>
+
+# Lines each instance gets its own version of
+LISTENER_KEYS = {'socksport', 'transport', 'dnsport', 'controlport',
+                 'datadirectory', 'pidfile', 'cookieauthentication',
+                 'cookieauthfile', 'natdport', 'httptunnelport'}
+
+
+def load_profile(path):
+    """torrc -> (shared lines, {listener keyword: [args, ...]})"""
+    shared, listeners = [], {}
+    with open(path) as f:
+        for line in f:
+            words = line.split()
+            key = words[0].lower() if words and not words[0].startswith('#') else ''
+            if key in LISTENER_KEYS:
+                listeners.setdefault(key, []).append(words[1:])
+            else:
+                shared.append(line.rstrip('\n'))
+    return shared, listeners
+
+
+def _port_of(address, default):
+    try:
+        return int(address.rsplit(':', 1)[-1])
+    except (ValueError, AttributeError):
+        return default
+
+
+def read_state(max_age=HEALTH_INTERVAL * 3):
+    """Pool state written by a running balancer, or None if there is none"""
+    try:
+        with open(STATE_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - state.get("updated", 0) > max_age:
+        return None  # Balancer gone - Tor is back to a single process
+    return state
+
+
+def pool_instances():
+    """Per-instance rows for /status and the dashboard, or None without a pool"""
+    state = read_state()
+    return state["instances"] if state else None
+
+
+class PoolControl:
+    """
+    TorControl stand-in for CircuitRotator: NEWNYM goes to every pool
+    instance, or just to `control` (the main ControlPort) without a pool
+    """
+
+    def __init__(self, control):
+        self.control = control
+        self._others = {}   # control port -> TorControl
+
+    def newnym(self):
+        ok = self.control.newnym()
+        for row in pool_instances() or ():
+            port = row["control_port"]
+            if port == self.control.port or row["state"] != 'ready':
+                continue
+            other = self._others.get(port)
+            if other is None:
+                other = self._others[port] = TorControl(port=port)
+            try:
+                other.newnym()
+            except ControlError:
+                pass  # Restarting - it comes back with fresh circuits anyway
+        return ok
+
+    def __getattr__(self, name):
+        return getattr(self.control, name)
+
+
+class TorInstance:
+    """One supervised tor process"""
+
+    def __init__(self, index, data_dir, control_port):
+        self.index = index
+        self.data_dir = data_dir
+        self.socks_port = SOCKS_BASE + index
+        self.trans_port = TRANS_BASE + index
+        self.control_port = control_port
+        self.control = TorControl(port=control_port)
+        self.proc = None
+        self.state = 'stopped'
+        self.bootstrap = 0
+        self.streams = 0
+        self.started = 0.0
+        self.backoff = 0.0
+        self.restart_at = 0.0
+        self.draining = None    # monotonic time draining began
+
+    @property
+    def usable(self):
+        return self.proc is not None and self.draining is None
+
+    def describe(self, clients):
+        return {
+            "id": self.index,
+            "state": 'draining' if self.draining is not None else self.state,
+            "bootstrap": self.bootstrap,
+            "streams": self.streams,
+            "clients": clients,
+            "control_port": self.control_port,
+        }
+
+
+class TorPool:
+    """Supervise, health-check and scale a set of tor processes"""
+
+    def __init__(self, torrc, minimum, maximum=None, tor_cmd='tor'):
+        self.torrc = torrc
+        self.minimum = max(1, min(minimum, MAX_INSTANCES))
+        self.maximum = max(self.minimum, min(maximum or self.minimum, MAX_INSTANCES))
+        self.tor_cmd = shlex.split(tor_cmd)
+        self.shared, self.listeners = load_profile(torrc)
+        self.instances = []
+        self._sticky = {}       # client tag -> [instance, last used]
+        self._retired = []      # (process, kill deadline) of stopped instances
+        self._hot_since = None
+        self._cold_since = None
+
+    # ─────────────────────────────────────────────────────────────
+    # Processes
+    # ─────────────────────────────────────────────────────────────
+
+    def _first(self, key, default=None):
+        values = self.listeners.get(key)
+        return values[0] if values else default
+
+    def _torrc_for(self, inst):
+        socks_flags = (self._first('socksport') or [''])[1:]
+        trans_flags = (self._first('transport') or [''])[1:]
+        lines = list(self.shared) + [
+            '',
+            f'# Tide balancer instance {inst.index} (generated)',
+            f'DataDirectory {inst.data_dir}',
+            ' '.join([f'SocksPort 127.0.0.1:{inst.socks_port}'] + socks_flags),
+            ' '.join([f'SocksPort 127.0.0.1:{inst.trans_port}'] + trans_flags),
+            f'ControlPort 127.0.0.1:{inst.control_port}',
+            'CookieAuthentication 1',
+        ]
+        if inst.index == 0:
+            for args in self.listeners.get('dnsport', []):
+                lines.append('DNSPort ' + ' '.join(args))
+        return '\n'.join(lines) + '\n'
+
+    def _prepare_data_dir(self, path):
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        user = next((l.split()[1] for l in self.shared
+                     if l.split()[:1] == ['User'] and len(l.split()) > 1), None)
+        if user and os.geteuid() == 0:
+            try:
+                entry = pwd.getpwnam(user)
+                os.chown(path, entry.pw_uid, entry.pw_gid)
+            except (KeyError, OSError):
+                pass  # tor will refuse the directory and be restarted
+
+    def _new_instance(self):
+        taken = {i.index for i in self.instances}
+        index = next(i for i in range(MAX_INSTANCES) if i not in taken)
+        if index == 0:
+            data_dir = (self._first('datadirectory') or
+                        [TIDE_ROOT + '/var/lib/tor'])[0]
+            control = _port_of((self._first('controlport') or [''])[0], CONTROL_PORT)
+        else:
+            data_dir = f'{INSTANCE_ROOT}/{index}'
+            control = CONTROL_BASE + index
+        inst = TorInstance(index, data_dir, control)
+        self.instances.append(inst)
+        self.instances.sort(key=lambda i: i.index)
+        self._spawn(inst)
+        return inst
+
+    def _spawn(self, inst):
+        path = f'{STATE_DIR}/tor-{inst.index}.torrc'
+        os.makedirs(STATE_DIR, exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(self._torrc_for(inst))
+        self._prepare_data_dir(inst.data_dir)
+        inst.proc = subprocess.Popen(self.tor_cmd + ['-f', path],
+                                     stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.DEVNULL)
+        inst.started = time.monotonic()
+        inst.state = 'starting'
+        inst.bootstrap = 0
+
+    def _reap(self, inst, now):
+        """Schedule a restart for an instance whose process exited"""
+        if now - inst.started < MIN_UPTIME:
+            inst.backoff = min(MAX_BACKOFF, max(1.0, inst.backoff * 2))
+        else:
+            inst.backoff = 0.0
+        inst.proc = None
+        inst.state = 'down'
+        inst.bootstrap = 0
+        inst.restart_at = now + inst.backoff
+        inst.control.close()
+
+    def _terminate(self, inst):
+        """Remove an instance; its process is reaped by later checks"""
+        if inst.proc is not None:
+            try:
+                inst.proc.terminate()
+            except OSError:
+                pass
+            self._retired.append((inst.proc, time.monotonic() + 10))
+        inst.control.close()
+        inst.proc = None
+        self.instances.remove(inst)
+        for tag, entry in list(self._sticky.items()):
+            if entry[0] is inst:
+                del self._sticky[tag]
+
+    def start(self):
+        while len(self.instances) < self.minimum:
+            self._new_instance()
+        return self
+
+    def _reap_retired(self, now):
+        for proc, deadline in list(self._retired):
+            if proc.poll() is None and now < deadline:
+                continue
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            self._retired.remove((proc, deadline))
+
+    def stop(self):
+        for inst in list(self.instances):
+            self._terminate(inst)
+        for proc, _ in self._retired:
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        self._retired = []
+        try:
+            os.unlink(STATE_FILE)
+        except OSError:
+            pass
+
+    # ─────────────────────────────────────────────────────────────
+    # Stream placement
+    # ─────────────────────────────────────────────────────────────
+
+    def pick(self, tag):
+        """
+        Instance for a new stream from client `tag`, counted as open until
+        release() (None if no instance is running)
+        """
+        now = time.monotonic()
+        ready = [i for i in self.instances if i.usable and i.state == 'ready']
+        candidates = ready or [i for i in self.instances if i.usable]
+        if not candidates:
+            return None
+
+        entry = self._sticky.get(tag)
+        if entry is not None and entry[0] in candidates:
+            entry[1] = now
+            inst = entry[0]
+        else:
+            inst = min(candidates, key=lambda i: (i.streams, i.index))
+            self._sticky[tag] = [inst, now]
+        inst.streams += 1
+        return inst
+
+    def release(self, inst):
+        """A stream placed by pick() has ended"""
+        inst.streams -= 1
+
+    # ─────────────────────────────────────────────────────────────
+    # Health and scaling
+    # ─────────────────────────────────────────────────────────────
+
+    def _probe(self, inst):
+        """Bootstrap % over the instance's ControlPort (blocking)"""
+        try:
+            return inst.control.bootstrap_phase()["progress"]
+        except (ControlError, OSError):
+            return None
+
+    async def check(self):
+        """One health/scaling pass"""
+        now = time.monotonic()
+        for inst in list(self.instances):
+            if inst.proc is None:
+                if inst.draining is None and now >= inst.restart_at:
+                    self._spawn(inst)
+                continue
+            if inst.proc.poll() is not None:
+                self._reap(inst, now)
+                continue
+
+            progress = await run_blocking(self._probe, inst)
+            if progress is None:
+                inst.state = ('starting' if now - inst.started < START_GRACE
+                              else 'unhealthy')
+            else:
+                inst.bootstrap = progress
+                inst.state = 'ready' if progress >= 100 else 'bootstrapping'
+
+        for tag, (inst, last) in list(self._sticky.items()):
+            if now - last >= STICKY_IDLE:
+                del self._sticky[tag]
+        self._scale(now)
+        self._reap_retired(now)
+        self._write_state()
+
+    def _scale(self, now):
+        active = [i for i in self.instances if i.draining is None]
+        ready = [i for i in active if i.state == 'ready']
+        load = sum(i.streams for i in active) / max(1, len(ready))
+
+        # Only grow once every active instance has finished bootstrapping
+        if (load > SCALE_UP_STREAMS and len(active) < self.maximum and
+                len(ready) == len(active)):
+            self._hot_since = self._hot_since or now
+            if now - self._hot_since >= SCALE_UP_AFTER:
+                self._new_instance()
+                self._hot_since = None
+        else:
+            self._hot_since = None
+
+        if load < SCALE_DOWN_STREAMS and len(active) > self.minimum:
+            self._cold_since = self._cold_since or now
+            if now - self._cold_since >= SCALE_DOWN_AFTER:
+                # Never instance 0 - it carries DNSPort and the main ControlPort
+                max(active, key=lambda i: i.index).draining = now
+                self._cold_since = None
+        else:
+            self._cold_since = None
+
+        for inst in [i for i in self.instances if i.draining is not None]:
+            if not inst.streams or now - inst.draining >= DRAIN_TIMEOUT:
+                self._terminate(inst)
+
+    def _write_state(self):
+        clients = {}
+        for inst, _ in self._sticky.values():
+            clients[inst.index] = clients.get(inst.index, 0) + 1
+        data = json.dumps({
+            "instances": [i.describe(clients.get(i.index, 0)) for i in self.instances],
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "updated": time.time(),
+        })
+        tmp = f'{STATE_FILE}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.replace(tmp, STATE_FILE)
+        except OSError:
+            pass  # ZERO-LOG: /status just omits the pool
+
+    async def run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+
+class _Refused(Exception):
+    """Client handshake rejected or no upstream available"""
+
+
+class Balancer:
+    """SOCKS and transparent-port front-end placing streams on a TorPool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._salt = secrets.token_bytes(16)
+
+    def _digest(self, data, size=8):
+        return hashlib.blake2b(data, key=self._salt, digest_size=size).hexdigest()
+
+    def _tag(self, writer):
+        """Per-process opaque id for the client's address"""
+        peer = writer.get_extra_info('peername') or ('',)
+        return self._digest(str(peer[0]).encode())
+
+    # ─────────────────────────────────────────────────────────────
+    # Client side
+    # ─────────────────────────────────────────────────────────────
+
+    async def _read_socks(self, reader, writer, tag):
+        """
+        Read the client's SOCKS request -> (version, request, user) where
+        `user` is the upstream identity: the client tag, refined by any
+        credentials the client sent so they still isolate within it
+        """
+        version, count = await reader.readexactly(2)
+        if version == 4:
+            head = await reader.readexactly(6)     # DSTPORT + DSTIP
+            userid = (await reader.readuntil(b'\0'))[:-1]
+            domain = b''
+            if head[2:5] == b'\0\0\0' and head[5]:
+                domain = await reader.readuntil(b'\0')  # SOCKS4a hostname
+            user = tag + (':' + self._digest(userid) if userid else '')
+            # Rebuilt with the tag as user id when the instance is known
+            return 4, (bytes([4, count]) + head, domain), user
+        if version != 5:
+            raise _Refused()
+
+        methods = await reader.readexactly(count)
+        secret = b''
+        if 2 in methods:
+            writer.write(b'\x05\x02')
+            _ver, ulen = await reader.readexactly(2)
+            user = await reader.readexactly(ulen)
+            plen = (await reader.readexactly(1))[0]
+            secret = user + b'\0' + await reader.readexactly(plen)
+            writer.write(b'\x01\x00')  # Tor accepts any credentials too
+        elif 0 in methods:
+            writer.write(b'\x05\x00')
+        else:
+            writer.write(b'\x05\xff')
+            raise _Refused()
+
+        request = await reader.readexactly(4)
+        atyp = request[3]
+        if atyp == 1:
+            request += await reader.readexactly(6)
+        elif atyp == 3:
+            length = await reader.readexactly(1)
+            request += length + await reader.readexactly(length[0] + 2)
+        elif atyp == 4:
+            request += await reader.readexactly(18)
+        else:
+            raise _Refused()
+        return 5, request, tag + (':' + self._digest(secret) if secret else '')
+
+    def _original_dst(self, writer):
+        """Destination of a connection iptables redirected to us"""
+        sock = writer.get_extra_info('socket')
+        dst = sock.getsockopt(socket.SOL_IP, SO_ORIGINAL_DST, 16)
+        port, address = struct.unpack_from('!2xH4s', dst)
+        if (socket.inet_ntoa(address), port) == sock.getsockname()[:2]:
+            raise _Refused()  # Not redirected - nothing to connect to
+        return b'\x05\x01\x00\x01' + address + struct.pack('!H', port)
+
+    # ─────────────────────────────────────────────────────────────
+    # Upstream (an instance's SocksPort)
+    # ─────────────────────────────────────────────────────────────
+
+    async def _socks5_upstream(self, port, user, request):
+        """Authenticate as `user` (IsolateSOCKSAuth) and send the request"""
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            writer.write(b'\x05\x01\x02')
+            if await reader.readexactly(2) != b'\x05\x02':
+                raise _Refused()
+            name = user.encode()
+            writer.write(b'\x01' + bytes([len(name)]) + name + b'\x01-')
+            if await reader.readexactly(2) != b'\x01\x00':
+                raise _Refused()
+            writer.write(request)
+            return reader, writer
+        except BaseException:
+            writer.close()
+            raise
+
+    async def _socks4_upstream(self, port, user, request):
+        head, domain = request
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(head + user.encode() + b'\0' + domain)
+        return reader, writer
+
+    async def _trans_upstream(self, port, user, request):
+        reader, writer = await self._socks5_upstream(port, user, request)
+        try:
+            reply = await reader.readexactly(4)
+            if reply[1] != 0:
+                raise _Refused()
+            # Skip the bound address - the client never sees this reply
+            await reader.readexactly({1: 6, 4: 18}.get(reply[3], 6))
+            return reader, writer
+        except BaseException:
+            writer.close()
+            raise
+
+    # ─────────────────────────────────────────────────────────────
+    # Connections
+    # ─────────────────────────────────────────────────────────────
+
+    async def handle_socks(self, reader, writer):
+        """Connection on the public SocksPort"""
+        tag = self._tag(writer)
+        try:
+            version, request, user = await asyncio.wait_for(
+                self._read_socks(reader, writer, tag), HANDSHAKE_TIMEOUT)
+        except (_Refused, OSError, ValueError, asyncio.TimeoutError,
+                asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        if version == 5:
+            # Tor's reply to the request flows back through the splice
+            await self._place(tag, reader, writer, self._socks5_upstream,
+                              'socks_port', user, request,
+                              refusal=b'\x05\x01\x00\x01' + bytes(6))
+        else:
+            await self._place(tag, reader, writer, self._socks4_upstream,
+                              'socks_port', user, request,
+                              refusal=b'\x00\x5b' + bytes(6))
+
+    async def handle_trans(self, reader, writer):
+        """Connection redirected to the public TransPort by iptables"""
+        tag = self._tag(writer)
+        try:
+            request = self._original_dst(writer)
+        except (_Refused, OSError):
+            writer.close()
+            return
+        await self._place(tag, reader, writer, self._trans_upstream,
+                          'trans_port', tag, request)
+
+    async def _place(self, tag, reader, writer, connect, port, user, request,
+                     refusal=b''):
+        """Pick an instance, open the upstream stream and relay"""
+        inst = self.pool.pick(tag)
+        if inst is None:
+            writer.write(refusal)
+            writer.close()
+            return
+        try:
+            try:
+                ureader, uwriter = await asyncio.wait_for(
+                    connect(getattr(inst, port), user, request), HANDSHAKE_TIMEOUT)
+            except (_Refused, OSError, asyncio.TimeoutError,
+                    asyncio.IncompleteReadError):
+                writer.write(refusal)
+                writer.close()
+                return
+            await self._splice(reader, writer, ureader, uwriter)
+        finally:
+            self.pool.release(inst)
+
+    # ─────────────────────────────────────────────────────────────
+    # Relay
+    # ─────────────────────────────────────────────────────────────
+
+    async def _pipe(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(SPLICE_CHUNK)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+            if writer.can_write_eof():
+                writer.write_eof()
+        except (OSError, RuntimeError):
+            writer.close()
+
+    async def _splice(self, creader, cwriter, ureader, uwriter):
+        try:
+            await asyncio.gather(self._pipe(creader, uwriter),
+                                 self._pipe(ureader, cwriter))
+        finally:
+            for writer in (cwriter, uwriter):
+                writer.close()
@@ -0,0 +1,158 @@
+"""
+Tide Beacon
+===========
+UDP broadcast that lets LAN clients find the gateway, and follow its
+state, without a single HTTP request.
+
+Each beacon is one short ASCII datagram to the LAN broadcast address
+(TIDE_SUBNET, default 10.101.101.0/24) on UDP port 19050 (TIDE_BEACON_PORT):
+
+    TIDE:<ip>:<api port>:<protocol>:<seq>:<tor>:<bootstrap>:<version>
+
+    TIDE:10.101.101.10:9051:1:1760812345:connected:100:1.2.0
+
+- The gateway IP stays the first field, so "TIDE:<ip>" listeners that
+  only read parts[1] keep working
+- protocol is PROTOCOL; later protocols only append fields, which older
+  readers ignore
+- seq moves whenever Tor state, bootstrap % or version changes. A client
+  re-fetches /status only when seq moves. It starts at the startup time
+  in seconds, so it keeps moving forward across API restarts
+- bootstrap is empty while unknown
+
+The API's status collector (the single API process, or the prefork
+supervisor) feeds every sampler snapshot to BeaconEmitter.update. A
+change is broadcast at once; otherwise the last beacon is repeated
+every TIDE_BEACON_INTERVAL seconds (default 10, 0 disables beacons).
+
+ZERO-LOG POLICY: beacons carry aggregate gateway state only (a subset
+of /status); no client is identified and nothing is logged.
+"""
+
+import ipaddress
+import os
+import socket
+import threading
+import time
+
+import tide_metrics
+
+BEACON_PORT = int(os.getenv('TIDE_BEACON_PORT', '19050'))
+PROTOCOL = 1
+DEFAULT_INTERVAL = 10.0
+
+GATEWAY_IP = os.getenv('TIDE_GATEWAY_IP', '10.101.101.10')
+SUBNET = os.getenv('TIDE_SUBNET', '10.101.101.0/24')
+
+# Snapshot fields a beacon carries (all kept warm for the shared record)
+BEACON_FIELDS = ('tor', 'bootstrap', 'version')
+
+
+def _interval_from_env():
+    try:
+        return max(0.0, float(os.getenv('TIDE_BEACON_INTERVAL', DEFAULT_INTERVAL)))
+    except ValueError:
+        return DEFAULT_INTERVAL
+
+
+def _broadcast_address():
+    """TIDE_BEACON_TARGET, else the broadcast address of TIDE_SUBNET"""
+    target = os.getenv('TIDE_BEACON_TARGET')
+    if target:
+        return target
+    try:
+        return str(ipaddress.ip_network(SUBNET, strict=False).broadcast_address)
+    except ValueError:
+        return '255.255.255.255'
+
+
+def encode(ip, api_port, seq, tor, bootstrap, version):
+    """Beacon datagram for one gateway state"""
+    return (f'TIDE:{ip}:{api_port}:{PROTOCOL}:{seq}:{tor or "unknown"}:'
+            f'{"" if bootstrap is None else bootstrap}:{version or ""}').encode()
+
+
+def decode(data):
+    """Beacon datagram -> dict, or None if it is not a Tide beacon"""
+    try:
+        parts = data.decode('ascii').split(':')
+    except UnicodeDecodeError:
+        return None
+    if parts[0] != 'TIDE' or len(parts) < 2 or not parts[1]:
+        return None
+    beacon = {"ip": parts[1]}
+    if len(parts) >= 8:
+        try:
+            beacon.update(api_port=int(parts[2]), protocol=int(parts[3]),
+                          seq=int(parts[4]), tor=parts[5],
+                          bootstrap=int(parts[6]) if parts[6] else None,
+                          version=parts[7])
+        except ValueError:
+            pass  # Newer layout we cannot read - the IP is still good
+    return beacon
+
+
+class BeaconEmitter:
+    """Broadcasts the gateway's beacon on change and every interval"""
+
+    def __init__(self, ip=GATEWAY_IP, api_port=9051, target=None,
+                 port=BEACON_PORT, interval=None):
+        self.ip = ip
+        self.api_port = api_port
+        self.address = (target or _broadcast_address(), port)
+        self.interval = _interval_from_env() if interval is None else interval
+        self.seq = int(time.time())
+        self._state = None
+        self._payload = None
+        self._sock = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def update(self, snap):
+        """Sampler listener: broadcast at once if the carried state changed"""
+        if not self.enabled:
+            return
+        fields = snap.fields
+        if not all(name in fields for name in BEACON_FIELDS):
+            return  # Partial refresh before the first full sample
+        state = tuple(fields[name] for name in BEACON_FIELDS)
+        with self._lock:
+            if state == self._state:
+                return
+            if self._state is not None:
+                self.seq += 1
+            self._state = state
+            self._payload = encode(self.ip, self.api_port, self.seq, *state)
+        self._send()
+
+    def _send(self):
+        try:
+            with self._lock:
+                payload = self._payload
+                if payload is None:
+                    return
+                if self._sock is None:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                    self._sock = sock
+                sock = self._sock
+            sock.sendto(payload, self.address)
+            tide_metrics.BEACONS.inc()
+        except OSError:
+            pass  # ZERO-LOG: no LAN yet (or no route) - try again next time
+
+    def start(self):
+        """Repeat the last beacon every interval (daemon thread)"""
+        if self.enabled:
+            threading.Thread(target=self._run, name='tide-beacon', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._send()
@@ -0,0 +1,401 @@
+"""
+Tide Circuit Info Cache
+=======================
+Shared exit-IP lookup (check.torproject.org through the local SOCKS port)
+with single-flight coalescing, a TTL and stale-while-revalidate:
+
+- fresh (younger than ttl): returned from memory
+- stale (younger than stale_ttl): returned immediately, one background
+  refresh is started
+- missing/expired: callers wait on ONE in-flight probe, however many
+  arrive concurrently
+
+invalidate() drops the cached exit as soon as a NEWNYM is issued so the
+old exit IP is never served for the new circuit.
+
+CircuitRotator turns "new circuit" requests into NEWNYM signals:
+- every request made before the pending NEWNYM is sent shares it; once
+  it goes out, later requests schedule the next one
+- without a reachable ControlPort the signal falls back to SIGHUP
+  (`killall -HUP tor`), as before the ControlPort client
+- NEWNYMs are spaced NEWNYM_INTERVAL apart (Tor ignores faster ones), so a
+  burst of clicks becomes at most one signal now and one at the next slot
+- rotate(wait=True) returns only once a lookup has gone over a fresh
+  circuit, with the new exit info and whether the exit IP changed
+
+In prefork mode only the supervisor owns a cache and a rotator. It
+serves them to its workers over a Unix socket (CircuitService), and each
+worker's RemoteCircuit forwards /circuit lookups and /newcircuit requests
+there, so lookups, NEWNYM coalescing and spacing are shared by every
+worker and a rotation invalidates the one cache the record is written
+from. Workers read the cached exit itself from the shared status record.
+
+TTL: TIDE_CIRCUIT_TTL env var (seconds, default 60).
+"""
+
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+
+import tide_metrics
+from tide_control import SOCKS_PORT, ControlError, hup_tor
+from tide_record import StatusRecord
+
+CHECK_URL = os.getenv('TIDE_CHECK_URL', 'https://check.torproject.org/api/ip')
+DEFAULT_TTL = 60.0
+STALE_TTL = 600.0
+ERROR_TTL = 5.0
+NEWNYM_INTERVAL = 10.0  # Tor rate-limits NEWNYM to one per 10 seconds
+SIGNAL_TIMEOUT = 15.0   # Longest a caller waits for its NEWNYM to be sent
+REMOTE_TIMEOUT = 60.0   # Worker -> supervisor: spacing + signal + lookup
+
+
+def fetch_exit_info(timeout=10):
+    """Ask check.torproject.org for the current exit IP via Tor"""
+    try:
+        result = subprocess.run([
+            'curl', '-s', '--socks5', f'127.0.0.1:{SOCKS_PORT}',
+            '--max-time', str(timeout),
+            CHECK_URL
+        ], capture_output=True, text=True, timeout=timeout + 5)
+
+        if result.returncode == 0 and result.stdout:
+            return json.loads(result.stdout)
+        return {"error": "timeout"}
+    except:
+        return {"error": "failed"}
+
+
+def _ttl_from_env():
+    try:
+        return float(os.getenv('TIDE_CIRCUIT_TTL', DEFAULT_TTL))
+    except ValueError:
+        return DEFAULT_TTL
+
+
+class _Flight:
+    """One in-progress probe that any number of callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class CircuitCache:
+    """Single-flight, TTL + stale-while-revalidate cache around fetch()"""
+
+    def __init__(self, fetch=fetch_exit_info, ttl=None, stale_ttl=STALE_TTL,
+                 error_ttl=ERROR_TTL):
+        self._fetch = fetch
+        self.ttl = ttl if ttl is not None else _ttl_from_env()
+        self.stale_ttl = max(stale_ttl, self.ttl)
+        self.error_ttl = error_ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._fetched_at = 0.0
+        self._flight = None
+        self._generation = 0
+        self.on_update = None   # Optional callback(value) after each probe
+
+    def _max_age(self, value, stale=False):
+        if value is None:
+            return -1
+        if 'error' in value:
+            return self.error_ttl
+        return self.stale_ttl if stale else self.ttl
+
+    def _start_flight(self):
+        """Join or start the in-flight probe (caller holds the lock)"""
+        flight = self._flight
+        if flight is None:
+            flight = self._flight = _Flight()
+            threading.Thread(target=self._run,
+                             args=(flight, self._generation),
+                             name='tide-circuit', daemon=True).start()
+        return flight
+
+    def get(self):
+        """Current exit info (see module docstring for freshness rules)"""
+        with self._lock:
+            age = time.monotonic() - self._fetched_at
+            value = self._value
+            if age < self._max_age(value):
+                tide_metrics.CACHE.inc('circuit', 'hit')
+                return value
+
+            flight = self._start_flight()
+            if age < self._max_age(value, stale=True):
+                tide_metrics.CACHE.inc('circuit', 'stale')
+                return value  # Stale-while-revalidate
+
+        tide_metrics.CACHE.inc('circuit', 'miss')
+        flight.done.wait()
+        return flight.result
+
+    def prefetch(self):
+        """Start a background probe if the cached value is not fresh"""
+        with self._lock:
+            age = time.monotonic() - self._fetched_at
+            if age >= self._max_age(self._value):
+                self._start_flight()
+
+    def peek(self):
+        """Cached value (even stale) without ever triggering a probe"""
+        return self._value
+
+    def age(self):
+        """Seconds since the cached value was fetched (None if there is none)"""
+        if self._value is None:
+            return None
+        return time.monotonic() - self._fetched_at
+
+    def invalidate(self):
+        """Forget the cached exit (call after NEWNYM)"""
+        with self._lock:
+            self._generation += 1
+            self._value = None
+            self._fetched_at = 0.0
+            self._flight = None
+
+    def _run(self, flight, generation):
+        try:
+            with tide_metrics.PROBE_SECONDS.time('circuit'):
+                result = self._fetch()
+        except Exception:
+            result = {"error": "failed"}
+
+        with self._lock:
+            if generation == self._generation:
+                self._value = result
+                self._fetched_at = time.monotonic()
+            if self._flight is flight:
+                self._flight = None
+
+        flight.result = result
+        flight.done.set()
+
+        if self.on_update is not None and generation == self._generation:
+            try:
+                self.on_update(result)
+            except Exception:
+                pass
+
+
+class _Rotation:
+    """One scheduled NEWNYM shared by every request that joined it"""
+
+    def __init__(self, at, previous_ip):
+        self.at = at                    # monotonic send time
+        self.previous_ip = previous_ip  # exit IP before the signal
+        self.sent = threading.Event()
+        self.success = False
+
+
+class CircuitRotator:
+    """Coalesced, rate-limited NEWNYM with optional wait for the new exit"""
+
+    def __init__(self, control, cache, interval=NEWNYM_INTERVAL):
+        self.control = control
+        self.cache = cache
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = None
+        self._last_sent = None
+        self.on_rotate = None   # Optional callback() after each NEWNYM
+
+    def request(self):
+        """Join the pending rotation, or schedule one at the next free slot"""
+        with self._lock:
+            rotation = self._pending
+            if rotation is None:
+                now = time.monotonic()
+                at = now if self._last_sent is None else \
+                    max(now, self._last_sent + self.interval)
+                previous = (self.cache.peek() or {}).get('IP')
+                rotation = self._pending = _Rotation(at, previous)
+                threading.Thread(target=self._run, args=(rotation,),
+                                 name='tide-newnym', daemon=True).start()
+            return rotation
+
+    def rotate(self, wait=False):
+        """
+        Request a new circuit.
+
+        wait=False: {"success"} once the NEWNYM is sent, or
+        {"success", "scheduled_in"} right away if it is rate-limited.
+        wait=True:  blocks until the exit has been looked up over the new
+        circuit and adds "ready", "changed" and "exit". "changed" is None
+        when the exit before the signal was never looked up.
+        """
+        rotation = self.request()
+        delay = rotation.at - time.monotonic()
+        if not wait and delay > 0:
+            return {"success": True, "scheduled_in": round(delay, 1)}
+
+        if not rotation.sent.wait(max(delay, 0) + SIGNAL_TIMEOUT):
+            return {"success": False}
+        if not rotation.success or not wait:
+            return {"success": rotation.success}
+
+        # The cache was invalidated after the signal, so this lookup (shared
+        # by every waiter) goes over a circuit built after the NEWNYM
+        info = self.cache.get()
+        if not info or 'error' in info:
+            return {"success": True, "ready": False}
+        previous = rotation.previous_ip
+        return {
+            "success": True,
+            "ready": True,
+            "changed": None if previous is None else info.get('IP') != previous,
+            "exit": info,
+        }
+
+    def _run(self, rotation):
+        delay = rotation.at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        # From here the signal is on its way - a request arriving now must
+        # schedule the next NEWNYM instead of joining one already issued
+        with self._lock:
+            if self._pending is rotation:
+                self._pending = None
+            last_sent = self._last_sent
+            sent_at = self._last_sent = time.monotonic()
+
+        try:
+            rotation.success = self.control.newnym()
+        except ControlError:
+            # No ControlPort in this torrc - SIGHUP also rebuilds circuits
+            rotation.success = hup_tor()
+
+        if not rotation.success:
+            with self._lock:
+                if self._last_sent == sent_at:
+                    self._last_sent = last_sent
+
+        if rotation.success:
+            # The cached exit IP belongs to the old circuit
+            self.cache.invalidate()
+            if self.on_rotate is not None:
+                try:
+                    self.on_rotate()
+                except Exception:
+                    pass
+        rotation.sent.set()
+
+
+class CircuitService:
+    """Serves a CircuitCache and CircuitRotator to prefork workers"""
+
+    def __init__(self, path, cache, rotator):
+        self.path = path
+        self.cache = cache
+        self.rotator = rotator
+
+    def start(self):
+        """Listen on the Unix socket (daemon thread); False if it cannot bind"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if os.path.exists(self.path):
+                os.unlink(self.path)  # Left over from a previous supervisor
+            sock.bind(self.path)
+            os.chmod(self.path, 0o600)
+            sock.listen(64)
+        except OSError:
+            sock.close()
+            return False
+        threading.Thread(target=self._accept, args=(sock,),
+                         name='tide-circuit-service', daemon=True).start()
+        return True
+
+    def _accept(self, sock):
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,),
+                             name='tide-circuit-call', daemon=True).start()
+
+    def _serve(self, conn):
+        """One request line in, one JSON reply line out"""
+        try:
+            with conn, conn.makefile('rwb') as stream:
+                request = json.loads(stream.readline())
+                op = request.get('op')
+                if op == 'get':
+                    reply = self.cache.get()
+                elif op == 'prefetch':
+                    self.cache.prefetch()
+                    reply = {}
+                elif op == 'rotate':
+                    reply = self.rotator.rotate(wait=bool(request.get('wait')))
+                else:
+                    reply = {"error": "unknown op"}
+                stream.write(json.dumps(reply).encode() + b'\n')
+        except (OSError, ValueError, AttributeError):
+            pass  # ZERO-LOG: the worker gave up or went away
+
+
+class RemoteCircuit:
+    """
+    Prefork worker's stand-in for CircuitCache and CircuitRotator: calls
+    go to the supervisor's CircuitService, the cached exit comes from the
+    shared status record the supervisor writes (and /circuit is answered
+    from it while that exit is fresh).
+    """
+
+    def __init__(self, path, record=None, timeout=REMOTE_TIMEOUT, ttl=None):
+        self.path = path
+        self.record = record or StatusRecord()
+        self.timeout = timeout
+        self.ttl = ttl if ttl is not None else _ttl_from_env()
+        # The supervisor's sampler is poked instead; its snapshots reach
+        # this worker through the snapshot file
+        self.on_update = None
+        self.on_rotate = None
+
+    def _call(self, request):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            with sock.makefile('rwb') as stream:
+                stream.write(json.dumps(request).encode() + b'\n')
+                stream.flush()
+                return json.loads(stream.readline())
+
+    def get(self):
+        # A fresh exit in the record needs no round-trip to the supervisor
+        record = self.record.read()
+        if record is not None and record["exit"] and record["exit_age"] < self.ttl:
+            tide_metrics.CACHE.inc('circuit', 'hit')
+            return record["exit"]
+        try:
+            return self._call({"op": "get"})
+        except (OSError, ValueError):
+            return {"error": "failed"}
+
+    def prefetch(self):
+        try:
+            self._call({"op": "prefetch"})
+        except (OSError, ValueError):
+            pass
+
+    def peek(self):
+        record = self.record.read()
+        return record["exit"] if record else None
+
+    def age(self):
+        record = self.record.read()
+        return record["exit_age"] if record else None
+
+    def rotate(self, wait=False):
+        try:
+            return self._call({"op": "rotate", "wait": wait})
+        except (OSError, ValueError):
+            return {"success": False}
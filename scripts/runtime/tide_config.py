@@ -0,0 +1,255 @@
+"""
+Tide Config State
+=================
+In-memory copy of the small state files the gateway services used to
+re-read on every request:
+
+    mode        /etc/tide/mode
+    security    /etc/tide/security
+    api_token   /etc/tide/api_token
+    version     /opt/tide/VERSION
+
+Each file is read once. After that its directory is watched with inotify
+(through ctypes - no extra dependency). If inotify is unavailable, because
+the platform is not Linux, watches are exhausted or the directory does not
+exist yet, the file's mtime is polled every POLL_INTERVAL seconds instead.
+Subscribers get (name, value) whenever a value changes, so a mode switch
+reaches /status and /events at once.
+
+TIDE_ROOT (env, default empty) prefixes every path - the offline test
+harness uses it to point the services at a scratch tree.
+
+ZERO-LOG POLICY: file contents (notably the API token) are never logged.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+TIDE_ROOT = os.getenv('TIDE_ROOT', '').rstrip('/')
+
+DEFAULT_FILES = {
+    'mode': (TIDE_ROOT + '/etc/tide/mode', 'unknown'),
+    'security': (TIDE_ROOT + '/etc/tide/security', 'standard'),
+    'api_token': (TIDE_ROOT + '/etc/tide/api_token', None),
+    'version': (TIDE_ROOT + '/opt/tide/VERSION', 'unknown'),
+}
+
+POLL_INTERVAL = 2.0     # mtime polling period (and inotify re-watch period)
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class _Inotify:
+    """Thin ctypes wrapper around the Linux inotify syscalls"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        self._libc = libc
+        self.fd = fd
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch')
+        return wd
+
+    def read(self):
+        """Drain queued events -> [(wd, mask, name)]"""
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _open_inotify():
+    try:
+        return _Inotify()
+    except (OSError, AttributeError):
+        # Not Linux (no inotify_init1 in libc) or out of instances
+        return None
+
+
+class TideConfig:
+    """Watched, in-memory view of the Tide state files"""
+
+    def __init__(self, files=None, poll_interval=POLL_INTERVAL):
+        self._files = dict(files or DEFAULT_FILES)
+        self.poll_interval = poll_interval
+        self._values = {}
+        self._stats = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+        self._watches = {}      # wd -> directory
+
+        for name in self._files:
+            self._load(name)
+
+    # ─────────────────────────────────────────────────────────────
+    # Reading
+    # ─────────────────────────────────────────────────────────────
+
+    def get(self, name):
+        """Current value of a state file (its default if missing)"""
+        return self._values.get(name, self._files[name][1])
+
+    def subscribe(self, callback):
+        """Call callback(name, value) on every change (watcher thread)"""
+        self._listeners.append(callback)
+
+    @property
+    def mode(self):
+        """'inotify' while every directory is watched, else 'polling'"""
+        dirs = {os.path.dirname(path) for path, _ in self._files.values()}
+        if self._inotify is not None and dirs <= set(self._watches.values()):
+            return 'inotify'
+        return 'polling'
+
+    def _read(self, name):
+        path, default = self._files[name]
+        try:
+            st = os.stat(path)
+            with open(path, 'r') as f:
+                value = f.read().strip()
+            return value, (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            return default, None
+
+    def _load(self, name):
+        """Re-read one file; True if its value changed"""
+        value, stat = self._read(name)
+        with self._lock:
+            changed = name in self._values and self._values[name] != value
+            self._values[name] = value
+            self._stats[name] = stat
+        return changed
+
+    def reload(self, name):
+        """Re-read one file now and notify subscribers if it changed"""
+        if not self._load(name):
+            return
+        value = self._values[name]
+        for callback in self._listeners:
+            try:
+                callback(name, value)
+            except Exception:
+                pass
+
+    # ─────────────────────────────────────────────────────────────
+    # Watching
+    # ─────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start the watcher thread"""
+        if self._thread is None:
+            self._inotify = _open_inotify()
+            self._thread = threading.Thread(target=self._run,
+                                            name='tide-config', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _names_in(self, directory):
+        return [name for name, (path, _) in self._files.items()
+                if os.path.dirname(path) == directory]
+
+    def _watch_dirs(self):
+        """Watch every directory that is not watched yet (if it exists)"""
+        if self._inotify is None:
+            return
+        watched = set(self._watches.values())
+        for directory in {os.path.dirname(p) for p, _ in self._files.values()}:
+            if directory in watched:
+                continue
+            try:
+                wd = self._inotify.add_watch(directory)
+            except OSError:
+                continue  # Missing directory or no watches left - poll it
+            self._watches[wd] = directory
+            # Files may have changed before the watch existed
+            for name in self._names_in(directory):
+                self.reload(name)
+
+    def _on_events(self):
+        for wd, mask, filename in self._inotify.read():
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                # Directory gone - fall back to polling until it returns
+                self._watches.pop(wd, None)
+                for name in self._names_in(directory):
+                    self.reload(name)
+                continue
+            path = os.path.join(directory, filename)
+            for name, (file_path, _) in self._files.items():
+                if file_path == path:
+                    self.reload(name)
+
+    def _poll(self):
+        """mtime-poll the files whose directory has no inotify watch"""
+        watched = set(self._watches.values())
+        for name, (path, _) in self._files.items():
+            if os.path.dirname(path) in watched:
+                continue
+            try:
+                st = os.stat(path)
+                stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+            except OSError:
+                stat = None
+            if stat != self._stats.get(name):
+                self.reload(name)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._watch_dirs()
+            if self._inotify is not None:
+                ready, _, _ = select.select([self._inotify.fd], [], [],
+                                            self.poll_interval)
+                if ready:
+                    self._on_events()
+            else:
+                self._stop.wait(self.poll_interval)
+            self._poll()
+
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
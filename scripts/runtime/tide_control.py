@@ -0,0 +1,266 @@
+"""
+Tide Tor ControlPort Client
+===========================
+Small in-process client for Tor's control protocol. Keeps one persistent,
+authenticated connection and reconnects on its own, so status and circuit
+control never fork pgrep/nc/killall. hup_tor() is the one exception: the
+NEWNYM fallback for a torrc without a ControlPort.
+
+Authentication (first that applies):
+- TIDE_CONTROL_PASSWORD env var (HashedControlPassword)
+- Cookie file advertised by PROTOCOLINFO (CookieAuthentication 1)
+- Null authentication
+
+ControlPort: TIDE_CONTROL_HOST / TIDE_CONTROL_PORT (default 127.0.0.1:9052).
+Port 9051 is taken by the Tide API, so Tide's torrc profiles use 9052.
+"""
+
+import os
+import re
+import socket
+import subprocess
+import threading
+
+import tide_metrics
+
+CONTROL_HOST = os.getenv('TIDE_CONTROL_HOST', '127.0.0.1')
+CONTROL_PORT = int(os.getenv('TIDE_CONTROL_PORT', '9052'))
+SOCKS_PORT = int(os.getenv('TIDE_SOCKS_PORT', '9050'))
+
+_KV_RE = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|\S+)')
+
+
+class ControlError(Exception):
+    """ControlPort unreachable, authentication failed or command rejected"""
+
+
+class _ConnectionLost(ControlError):
+    """Control connection dropped mid-exchange (retryable)"""
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+def _parse_kv(text):
+    """Parse KEY=VALUE / KEY="quoted value" pairs"""
+    return {k: _unquote(v) for k, v in _KV_RE.findall(text)}
+
+
+def _quote(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def socks_listening(port=SOCKS_PORT, host='127.0.0.1', timeout=1):
+    """In-process replacement for `nc -z 127.0.0.1 9050`"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def hup_tor():
+    """`killall -HUP tor` - new circuits when the ControlPort is unreachable"""
+    try:
+        return subprocess.run(['killall', '-HUP', 'tor'], timeout=2,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL).returncode == 0
+    except:
+        # ZERO-LOG: No error logging
+        return False
+
+
+class TorControl:
+    """Persistent, auto-reconnecting Tor ControlPort connection"""
+
+    def __init__(self, host=CONTROL_HOST, port=CONTROL_PORT, password=None,
+                 cookie_path=None, timeout=3):
+        self.host = host
+        self.port = port
+        self.password = password if password is not None else \
+            os.getenv('TIDE_CONTROL_PASSWORD')
+        self.cookie_path = cookie_path
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    # ─────────────────────────────────────────────────────────────
+    # Connection
+    # ─────────────────────────────────────────────────────────────
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        for obj in (self._file, self._sock):
+            try:
+                if obj is not None:
+                    obj.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        try:
+            self._sock = socket.create_connection((self.host, self.port),
+                                                  timeout=self.timeout)
+            self._file = self._sock.makefile('rb')
+            self._authenticate()
+        except (OSError, ControlError) as e:
+            self._close()
+            raise ControlError(str(e) or 'connect failed')
+
+    def _authenticate(self):
+        if self.password:
+            self._exchange(f'AUTHENTICATE {_quote(self.password)}')
+            return
+
+        info = self._exchange('PROTOCOLINFO 1')
+        methods, cookie_file = set(), self.cookie_path
+        for line in info:
+            if line.startswith('AUTH '):
+                kv = _parse_kv(line)
+                methods = set(kv.get('METHODS', '').split(','))
+                cookie_file = cookie_file or kv.get('COOKIEFILE')
+
+        if 'COOKIE' in methods and cookie_file:
+            with open(cookie_file, 'rb') as f:
+                cookie = f.read()
+            self._exchange(f'AUTHENTICATE {cookie.hex()}')
+        else:
+            self._exchange('AUTHENTICATE')
+
+    def _exchange(self, command):
+        """Send one command and read its reply; raise on non-2xx"""
+        self._sock.sendall(command.encode() + b'\r\n')
+
+        lines = []
+        while True:
+            raw = self._file.readline()
+            if not raw:
+                raise _ConnectionLost('connection closed')
+            line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            code, sep, text = line[:3], line[3:4], line[4:]
+
+            if code == '650':
+                # Asynchronous event (we never SETEVENTS, but be safe)
+                if sep == '+':
+                    self._read_data()
+                continue
+
+            if not code.startswith('2'):
+                raise ControlError(line)
+
+            if sep == '+':
+                data = self._read_data()
+                lines.append(text + ('\n' + data if data else ''))
+            else:
+                lines.append(text)
+
+            if sep == ' ':
+                return lines
+
+    def _read_data(self):
+        data = []
+        while True:
+            raw = self._file.readline()
+            if not raw:
+                raise _ConnectionLost('connection closed')
+            line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            if line == '.':
+                return '\n'.join(data)
+            data.append(line[1:] if line.startswith('..') else line)
+
+    def request(self, command):
+        """Run a command, reconnecting once if the connection went stale"""
+        with self._lock, tide_metrics.PROBE_SECONDS.time('control'):
+            for attempt in (1, 2):
+                if self._sock is None:
+                    self._connect()
+                try:
+                    return self._exchange(command)
+                except (_ConnectionLost, OSError) as e:
+                    self._close()
+                    if attempt == 2:
+                        raise ControlError(str(e) or 'connection lost')
+
+    # ─────────────────────────────────────────────────────────────
+    # Commands
+    # ─────────────────────────────────────────────────────────────
+
+    def getinfo(self, *keys):
+        """GETINFO - returns {key: value}"""
+        result = {}
+        for line in self.request('GETINFO ' + ' '.join(keys)):
+            if '=' in line:
+                key, value = line.split('=', 1)
+                result[key] = value.lstrip('\n')
+        return result
+
+    def bootstrap_phase(self):
+        """GETINFO status/bootstrap-phase -> {progress, tag, summary}"""
+        value = self.getinfo('status/bootstrap-phase').get(
+            'status/bootstrap-phase', '')
+        kv = _parse_kv(value)
+        try:
+            progress = int(kv.get('PROGRESS', 0))
+        except ValueError:
+            progress = 0
+        return {
+            "progress": progress,
+            "tag": kv.get('TAG', ''),
+            "summary": kv.get('SUMMARY', ''),
+        }
+
+    def circuit_status(self):
+        """GETINFO circuit-status -> list of {id, status, path, purpose}"""
+        value = self.getinfo('circuit-status').get('circuit-status', '')
+        circuits = []
+        for line in value.splitlines():
+            parts = line.split()
+            if len(parts) < 2:
+                continue
+            path = []
+            if len(parts) > 2 and '=' not in parts[2]:
+                path = [hop.split('~')[-1] for hop in parts[2].split(',')]
+            kv = _parse_kv(line)
+            circuits.append({
+                "id": parts[0],
+                "status": parts[1],
+                "path": path,
+                "purpose": kv.get('PURPOSE', ''),
+            })
+        return circuits
+
+    def signal(self, name):
+        """SIGNAL <name>"""
+        self.request(f'SIGNAL {name}')
+        return True
+
+    def newnym(self):
+        """SIGNAL NEWNYM - switch to clean circuits (no torrc reload)"""
+        return self.signal('NEWNYM')
+
+    def tor_status(self):
+        """
+        Returns (state, bootstrap %) with state one of
+        connected / bootstrapping / offline.
+        Falls back to an in-process SOCKS port probe when the
+        ControlPort is not configured.
+        """
+        try:
+            phase = self.bootstrap_phase()
+        except ControlError:
+            if socks_listening():
+                return "connected", None
+            return "offline", 0
+
+        if phase["progress"] >= 100:
+            return "connected", 100
+        return "bootstrapping", phase["progress"]
@@ -0,0 +1,363 @@
+"""
+Tide DNS Cache
+==============
+Caching, coalescing DNS front-end for Tor's DNSPort.
+
+Every LAN lookup used to cost a full Tor round-trip. DNSFrontEnd sits
+between clients and the DNSPort (UDP) and:
+
+- Answers repeated questions from a bounded LRU cache. Entries live for
+  the answer's TTL, raised to min_ttl and capped at MAX_TTL. Negative
+  answers (NXDOMAIN/NODATA) are kept for at most NEGATIVE_TTL, and
+  SERVFAIL, truncated or malformed replies are never cached
+- Coalesces identical in-flight questions into one upstream query
+- Prefetches popular names (PREFETCH_MIN_HITS hits) once they are in the
+  last PREFETCH_WINDOW of their TTL, so busy names never go cold
+- Counts hits, misses, coalesced and prefetched lookups in tide_metrics
+
+Answers are replayed with the client's query ID and question bytes (0x20
+case randomisation survives) and TTLs lowered to the entry's remaining
+lifetime. Entries are kept per advertised UDP payload size (512 without
+EDNS0), so an answer fetched for a 4096-byte client is never replayed
+to one limited to 512.
+
+ZERO-LOG POLICY: the cache lives in memory only and is never written to
+disk or logged; flush() drops it. Metrics are aggregate counters only -
+no names, types or client addresses.
+"""
+
+import asyncio
+import math
+import secrets
+import struct
+import time
+from collections import OrderedDict
+
+import tide_metrics
+
+DEFAULT_UPSTREAM = ('127.0.0.1', 5353)    # Tor DNSPort
+CACHE_SIZE = 10000          # Entries (answers are small - ~1-2 MB at most)
+MIN_TTL = 60                # Seconds; Tor answers often carry tiny TTLs
+MAX_TTL = 3600
+NEGATIVE_TTL = 30           # NXDOMAIN / empty answers
+PREFETCH_WINDOW = 0.1       # Refresh during the last 10% of an entry's TTL...
+PREFETCH_MIN_HITS = 2       # ...if it was asked for at least this often
+UPSTREAM_TIMEOUT = 8.0      # Tor may take several seconds for a new name
+MAX_INFLIGHT = 512          # Concurrent upstream queries; beyond this we drop
+
+_HEADER = struct.Struct('!HHHHHH')  # id, flags, qd, an, ns, ar
+_RR = struct.Struct('!HHIH')        # type, class, ttl, rdlength
+
+FLAG_QR = 0x8000
+FLAG_TC = 0x0200
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+TYPE_OPT = 41
+CLASSIC_UDP_SIZE = 512      # Largest UDP reply a client without EDNS0 accepts
+
+
+class _Malformed(Exception):
+    """Message that cannot be parsed"""
+
+
+def _skip_name(msg, off):
+    """Offset just past the (possibly compressed) name at off"""
+    while True:
+        if off >= len(msg):
+            raise _Malformed()
+        length = msg[off]
+        if length == 0:
+            return off + 1
+        if length & 0xC0 == 0xC0:
+            return off + 2
+        if length & 0xC0:
+            raise _Malformed()
+        off += 1 + length
+
+
+def _question_end(msg, off):
+    """Offset past the question at off (its name may not be compressed)"""
+    while True:
+        if off >= len(msg):
+            raise _Malformed()
+        length = msg[off]
+        if length == 0:
+            off += 5    # Root label + QTYPE + QCLASS
+            if off > len(msg):
+                raise _Malformed()
+            return off
+        if length & 0xC0:
+            raise _Malformed()
+        off += 1 + length
+
+
+def _records(msg, off, count):
+    """Walk `count` resource records -> ([(type, ttl offset, ttl)], end offset)"""
+    records = []
+    for _ in range(count):
+        off = _skip_name(msg, off)
+        if off + _RR.size > len(msg):
+            raise _Malformed()
+        rtype, _rclass, ttl, rdlength = _RR.unpack_from(msg, off)
+        records.append((rtype, off + 4, ttl))
+        off += _RR.size + rdlength
+    if off > len(msg):
+        raise _Malformed()
+    return records, off
+
+
+def parse_query(msg):
+    """
+    Cache key and question end offset of a client query; key is None for
+    queries that must be forwarded as-is (opcode != QUERY, several
+    questions). Raises _Malformed for garbage.
+    """
+    if len(msg) < _HEADER.size:
+        raise _Malformed()
+    _id, flags, qdcount, ancount, nscount, arcount = _HEADER.unpack_from(msg)
+    if flags & FLAG_QR:
+        raise _Malformed()
+    if qdcount != 1 or (flags >> 11) & 0xF:
+        return None, None
+
+    qend = _question_end(msg, _HEADER.size)
+    _, off = _records(msg, qend, ancount + nscount)
+    extra, _ = _records(msg, off, arcount)
+    # An OPT record's CLASS is the UDP payload size the client accepts
+    sizes = [struct.unpack_from('!H', msg, ttl_off - 2)[0]
+             for rtype, ttl_off, _ in extra if rtype == TYPE_OPT]
+    edns = bool(sizes)
+    udp_size = max(CLASSIC_UDP_SIZE, sizes[0]) if edns else CLASSIC_UDP_SIZE
+    # Names compare case-insensitively; EDNS and its payload size change
+    # what the answer may contain and how large it may be
+    return (msg[_HEADER.size:qend].lower(), edns, udp_size), qend
+
+
+def answer_ttl(msg, qend, min_ttl):
+    """(cache seconds or None if uncacheable, TTL offsets to rewrite)"""
+    _id, flags, _qd, ancount, nscount, arcount = _HEADER.unpack_from(msg)
+    if flags & FLAG_TC:
+        return None, ()
+    answers, off = _records(msg, qend, ancount)
+    authority, off = _records(msg, off, nscount)
+    additional, _ = _records(msg, off, arcount)
+    offsets = tuple(o for rtype, o, _ in answers + authority + additional
+                    if rtype != TYPE_OPT)
+
+    rcode = flags & 0xF
+    if rcode == RCODE_NOERROR and answers:
+        ttl = min(t for _, _, t in answers)
+        return min(MAX_TTL, max(min_ttl, ttl)), offsets
+    if rcode in (RCODE_NOERROR, RCODE_NXDOMAIN):
+        ttls = [t for _, _, t in authority]
+        return min([NEGATIVE_TTL] + ttls), offsets
+    return None, ()  # SERVFAIL, REFUSED... - ask again next time
+
+
+class _Entry:
+    __slots__ = ('reply', 'qend', 'offsets', 'expires', 'ttl', 'hits')
+
+    def __init__(self, reply, qend, offsets, ttl):
+        self.reply = reply
+        self.qend = qend
+        self.offsets = offsets
+        self.ttl = ttl
+        self.expires = time.monotonic() + ttl
+        self.hits = 0
+
+    def render(self, query, qend):
+        """The cached reply addressed to `query` with TTLs counted down"""
+        out = bytearray(self.reply)
+        out[0:2] = query[0:2]
+        out[_HEADER.size:qend] = query[_HEADER.size:qend]
+        remaining = max(0, math.ceil(self.expires - time.monotonic()))
+        for off in self.offsets:
+            struct.pack_into('!I', out, off, remaining)
+        return bytes(out)
+
+
+class DNSCache:
+    """Bounded LRU of upstream replies, keyed by parse_query()"""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Live entry for key (marked recently used), or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            del self._entries[key]
+            tide_metrics.DNS_CACHE_ENTRIES.set(len(self._entries))
+            return None
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        if key in self._entries:
+            entry.hits = self._entries[key].hits
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        tide_metrics.DNS_CACHE_ENTRIES.set(len(self._entries))
+
+    def flush(self):
+        self._entries.clear()
+        tide_metrics.DNS_CACHE_ENTRIES.set(0)
+
+
+class _Upstream(asyncio.DatagramProtocol):
+    """Connected UDP socket to the DNSPort, multiplexed by query ID"""
+
+    def __init__(self):
+        self.transport = None
+        self.pending = {}   # query id -> future
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < _HEADER.size:
+            return
+        future = self.pending.get(struct.unpack_from('!H', data)[0])
+        if future is not None and not future.done():
+            future.set_result(data)
+
+    def error_received(self, exc):
+        pass  # ICMP unreachable while Tor restarts - queries just time out
+
+
+class DNSFrontEnd(asyncio.DatagramProtocol):
+    """UDP DNS server answering from DNSCache, forwarding misses upstream"""
+
+    def __init__(self, upstream=DEFAULT_UPSTREAM, cache_size=CACHE_SIZE,
+                 min_ttl=MIN_TTL, timeout=UPSTREAM_TIMEOUT):
+        self.upstream_addr = upstream
+        self.cache = DNSCache(cache_size)
+        self.min_ttl = min_ttl
+        self.timeout = timeout
+        self.transport = None
+        self._upstream = None
+        self._inflight = {}     # cache key -> task fetching it
+
+    async def start(self, host='0.0.0.0', port=5300):
+        """Bind the listening socket and connect to the upstream"""
+        loop = asyncio.get_running_loop()
+        _, self._upstream = await loop.create_datagram_endpoint(
+            _Upstream, remote_addr=self.upstream_addr)
+        await loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        return self
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def error_received(self, exc):
+        pass
+
+    def flush(self):
+        """Drop every cached answer"""
+        self.cache.flush()
+
+    # ─────────────────────────────────────────────────────────────
+    # Client side
+    # ─────────────────────────────────────────────────────────────
+
+    def datagram_received(self, data, addr):
+        try:
+            key, qend = parse_query(data)
+        except _Malformed:
+            return  # Not worth an answer
+        if key is None:
+            self._spawn(self._forward(data, addr))
+            return
+
+        entry = self.cache.get(key)
+        if entry is None:
+            tide_metrics.CACHE.inc('dns', 'miss')
+            self._spawn(self._answer(key, data, qend, addr))
+            return
+
+        # Hit: answered without leaving this callback
+        tide_metrics.CACHE.inc('dns', 'hit')
+        self.transport.sendto(entry.render(data, qend), addr)
+        if (entry.hits >= PREFETCH_MIN_HITS and key not in self._inflight and
+                entry.expires - time.monotonic() < entry.ttl * PREFETCH_WINDOW):
+            tide_metrics.CACHE.inc('dns', 'prefetch')
+            self._fetch(key, data, qend)
+
+    def _spawn(self, coro):
+        asyncio.get_running_loop().create_task(coro)
+
+    async def _answer(self, key, query, qend, addr):
+        task = self._inflight.get(key)
+        if task is not None:
+            tide_metrics.CACHE.inc('dns', 'coalesced')
+        else:
+            task = self._fetch(key, query, qend)
+        try:
+            entry = await asyncio.shield(task)
+        except Exception:
+            return  # Upstream timeout or garbage - the client will retry
+        if entry is not None:
+            self.transport.sendto(entry.render(query, qend), addr)
+
+    async def _forward(self, query, addr):
+        """Relay an uncacheable query unchanged (except its ID)"""
+        try:
+            reply = await self._query(query)
+        except Exception:
+            return
+        self.transport.sendto(query[0:2] + reply[2:], addr)
+
+    # ─────────────────────────────────────────────────────────────
+    # Upstream side
+    # ─────────────────────────────────────────────────────────────
+
+    def _fetch(self, key, query, qend):
+        """Start (once per key) the upstream lookup that refills the cache"""
+        task = asyncio.get_running_loop().create_task(
+            self._resolve(key, query, qend))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _done(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieved: timeouts are expected, not errors
+
+    async def _resolve(self, key, query, qend):
+        reply = await self._query(query)
+        if reply[_HEADER.size:qend].lower() != key[0]:
+            return None  # Answer to a different question - drop it
+        ttl, offsets = answer_ttl(reply, qend, self.min_ttl)
+        entry = _Entry(reply, qend, offsets, ttl or 0)
+        if ttl:
+            self.cache.put(key, entry)
+        return entry
+
+    async def _query(self, query):
+        """One upstream round-trip -> reply bytes (raises on timeout)"""
+        pending = self._upstream.pending
+        if len(pending) >= MAX_INFLIGHT:
+            tide_metrics.CACHE.inc('dns', 'dropped')
+            raise OSError('too many upstream queries')
+        qid = secrets.randbits(16)
+        while qid in pending:
+            qid = secrets.randbits(16)
+
+        future = asyncio.get_running_loop().create_future()
+        pending[qid] = future
+        try:
+            with tide_metrics.PROBE_SECONDS.time('dns-upstream'):
+                self._upstream.transport.sendto(struct.pack('!H', qid) + query[2:])
+                return await asyncio.wait_for(future, self.timeout)
+        finally:
+            pending.pop(qid, None)
@@ -0,0 +1,94 @@
+"""
+Tide Event Hub
+==============
+Fans gateway state changes out to Server-Sent Events subscribers.
+
+publish() may be called from any thread (the status sampler runs in its
+own). It diffs the new state against the last one and, only if a watched
+field changed, queues a delta for every subscriber on the event loop.
+
+Stream format (text/event-stream):
+    event: snapshot   full state, sent once on connect
+    event: delta      changed fields only
+    : ping            keep-alive comment every KEEPALIVE seconds
+
+ZERO-LOG POLICY: subscribers are anonymous queues - no client addresses.
+"""
+
+import asyncio
+import json
+import threading
+
+KEEPALIVE = 15.0        # Seconds between keep-alive comments
+QUEUE_DEPTH = 32        # Per-subscriber backlog before it is dropped
+
+
+def sse_event(event, data, event_id=None):
+    """Encode one SSE message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, separators=(',', ':')))
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+class EventHub:
+    """Diff published state and push deltas to SSE subscribers"""
+
+    def __init__(self):
+        self.loop = None
+        self.seq = 0
+        self._state = {}
+        self._lock = threading.Lock()
+        self._queues = set()
+
+    @property
+    def subscribers(self):
+        return len(self._queues)
+
+    def bind(self, loop):
+        """Attach to the event loop subscribers live on"""
+        self.loop = loop
+
+    def publish(self, state):
+        """Record new state; push a delta if anything changed (thread-safe)"""
+        with self._lock:
+            delta = {k: v for k, v in state.items() if self._state.get(k, object()) != v}
+            if not delta:
+                return
+            self._state = dict(self._state, **delta)
+            self.seq += 1
+            message = sse_event('delta', delta, self.seq)
+
+        if self.loop is not None and self._queues:
+            self.loop.call_soon_threadsafe(self._fan_out, message)
+
+    def _fan_out(self, message):
+        for queue in list(self._queues):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow consumer: end its stream, it will reconnect and resync
+                self._queues.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def stream(self):
+        """Async iterator of SSE chunks for one subscriber"""
+        queue = asyncio.Queue(QUEUE_DEPTH)
+        with self._lock:
+            first = sse_event('snapshot', self._state, self.seq)
+            self._queues.add(queue)
+        try:
+            yield b'retry: 5000\n' + first
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), KEEPALIVE)
+                except asyncio.TimeoutError:
+                    message = b': ping\n\n'
+                if message is None:
+                    return
+                yield message
+        finally:
+            self._queues.discard(queue)
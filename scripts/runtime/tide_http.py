@@ -0,0 +1,474 @@
+"""
+Tide HTTP Engine
+================
+Minimal asyncio HTTP/1.1 server shared by the Tide gateway services.
+
+A single event loop multiplexes every client connection. Route handlers
+are coroutines; anything that blocks (subprocess probes, Tor round-trips)
+is pushed onto a thread pool with run_blocking() so one slow request
+never holds up the cheap ones.
+
+Connections are persistent (HTTP/1.1 keep-alive) up to max_requests per
+connection, and idle connections are closed after idle_timeout seconds.
+
+conditional() tags a response with a weak ETag and answers
+304 Not Modified when the client's If-None-Match already has it, so
+polling clients skip the body (and the JSON decode) when nothing changed.
+
+With reuse_port=True several processes can bind the same port
+(SO_REUSEPORT) and the kernel balances connections between them - used
+by prefork workers (see tide_prefork.py).
+
+Admission control keeps the server responsive when every host on the
+subnet can reach it (killa-whale/takeover mode):
+- Deadlines: a request head must arrive within header_timeout and every
+  write must drain within write_timeout, so slowloris-style clients and
+  stalled readers are dropped instead of pinning a connection forever
+- At most max_connections open connections; beyond that new ones get an
+  immediate 503 and are closed, before any request is read
+- Per source address: at most per_source_connections connections and a
+  token bucket of `rate` requests/s (bursts up to `burst`); excess
+  requests get 429. Loopback (tide-cli, local tools) is exempt.
+
+Request counts, latencies, open connections and shed requests are
+recorded in tide_metrics, labelled by the server's fixed route table only.
+
+ZERO-LOG POLICY: nothing in this module logs requests, clients or errors.
+Rate-limit state is keyed by a salted hash of the source address, held in
+memory only; entries for quiet sources are pruned within a minute.
+"""
+
+import asyncio
+import functools
+import hashlib
+import ipaddress
+import json
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlparse, parse_qs
+
+import tide_metrics
+
+MAX_HEADER_BYTES = 16384    # Request line + headers
+MAX_BODY_BYTES = 65536      # Bodies are drained and ignored (GET-only API)
+LISTEN_BACKLOG = 128        # Kernel accept queue; the rest is shed with 503
+BLOCKING_WORKERS = 16       # Threads for subprocess/network probes
+KEEPALIVE_TIMEOUT = 5.0     # Seconds an idle persistent connection is kept
+KEEPALIVE_MAX_REQUESTS = 100
+HEADER_TIMEOUT = 10.0       # Seconds to receive a complete request head
+WRITE_TIMEOUT = 10.0        # Seconds for one response write to drain
+MAX_CONNECTIONS = 256       # Open connections per process
+PER_SOURCE_CONNECTIONS = 16
+SOURCE_RATE = 20.0          # Requests/s per source address...
+SOURCE_BURST = 60           # ...with bursts up to this many
+SHED_LINGER = 1.0           # Seconds a refused connection waits for its request
+PRUNE_INTERVAL = 60.0       # Seconds between sweeps of idle rate-limit entries
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS,
+                                       thread_name_prefix='tide-probe')
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable on the probe pool without stalling the loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), functools.partial(func, *args, **kwargs))
+
+
+class Request:
+    """Parsed HTTP request (headers only - the API is GET-only)"""
+
+    def __init__(self, method, target, version, headers):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        parsed = urlparse(target)
+        self.path = parsed.path
+        self.query = parse_qs(parsed.query)
+        self.loopback = False   # Set by the server - the address itself is never kept
+
+
+class Response:
+    """HTTP response ready to be serialized"""
+
+    def __init__(self, status, body=b'', content_type='application/json',
+                 headers=None):
+        self.status = status
+        self.body = body
+        self.headers = {'Content-Type': content_type} if content_type else {}
+        if headers:
+            self.headers.update(headers)
+
+
+class StreamResponse(Response):
+    """Response whose body is an async iterator of byte chunks (e.g. SSE)"""
+
+    def __init__(self, status, chunks, content_type='text/event-stream',
+                 headers=None):
+        super().__init__(status, b'', content_type, headers)
+        self.chunks = chunks
+
+
+def json_response(code, data, headers=None):
+    """Build a JSON response with the CORS header every Tide client expects"""
+    extra = {'Access-Control-Allow-Origin': '*'}
+    if headers:
+        extra.update(headers)
+    return Response(code, json.dumps(data).encode(), headers=extra)
+
+
+def html_response(code, html):
+    """Build an HTML response"""
+    return Response(code, html.encode(),
+                    content_type='text/html; charset=utf-8')
+
+
+def make_etag(payload):
+    """Weak validator for a bytes payload (64-bit BLAKE2b digest)"""
+    return 'W/"%s"' % hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+def _etag_matches(header, etag):
+    """Weak comparison of an If-None-Match header against etag"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for tag in header.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == opaque:
+            return True
+    return False
+
+
+def conditional(request, response, etag=None):
+    """
+    Tag a 200 response with an ETag (default: digest of its body) and
+    turn it into a bodyless 304 if the client already holds that version.
+    """
+    if response.status != 200 or isinstance(response, StreamResponse):
+        return response
+    etag = etag or make_etag(response.body)
+    response.headers['ETag'] = etag
+    response.headers.setdefault('Cache-Control', 'no-cache')
+    if not _etag_matches(request.headers.get('if-none-match'), etag):
+        tide_metrics.CACHE.inc('etag', 'miss')
+        return response
+
+    tide_metrics.CACHE.inc('etag', 'hit')
+    keep = ('ETag', 'Cache-Control', 'Access-Control-Allow-Origin')
+    return Response(304, content_type=None, headers={
+        name: response.headers[name] for name in keep if name in response.headers
+    })
+
+
+def _is_loopback(peer):
+    try:
+        return ipaddress.ip_address(peer[0].split('%')[0]).is_loopback
+    except (TypeError, ValueError, IndexError):
+        return False
+
+
+def _reason(code):
+    try:
+        return HTTPStatus(code).phrase
+    except ValueError:
+        return ''
+
+
+class _BadRequest(Exception):
+    """Malformed or oversized request head"""
+
+
+class _Admission:
+    """Connection caps and per-source token buckets (memory only)"""
+
+    def __init__(self, max_connections, per_source, rate, burst):
+        self.max_connections = max_connections
+        self.per_source = per_source
+        self.rate = rate
+        self.burst = burst
+        self.open = 0
+        self._salt = secrets.token_bytes(16)
+        self._sources = {}      # source id -> [tokens, last refill, connections]
+        self._pruned = time.monotonic()
+
+    def source(self, peer):
+        """Opaque per-process id for a peer address (None = exempt)"""
+        if _is_loopback(peer):
+            return None
+        try:
+            host = peer[0].split('%')[0]
+        except (TypeError, IndexError):
+            host = ''
+        return hashlib.blake2b(host.encode(), key=self._salt,
+                               digest_size=8).digest()
+
+    def enter(self, source):
+        """Admit a new connection -> None, or the reason it is shed"""
+        if self.open >= self.max_connections:
+            return 'capacity'
+        if source is not None:
+            state = self._sources.get(source)
+            if state is None:
+                self._prune()
+                state = self._sources[source] = [float(self.burst),
+                                                 time.monotonic(), 0]
+            if state[2] >= self.per_source:
+                return 'source'
+            state[2] += 1
+        self.open += 1
+        return None
+
+    def leave(self, source):
+        self.open -= 1
+        state = self._sources.get(source)
+        if state is not None:
+            state[2] -= 1
+
+    def take(self, source):
+        """Spend one request token -> 0, or seconds until one is available"""
+        state = self._sources.get(source)
+        if state is None:
+            return 0
+        now = time.monotonic()
+        state[0] = min(self.burst, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+        if state[0] >= 1:
+            state[0] -= 1
+            return 0
+        return (1 - state[0]) / self.rate
+
+    def _prune(self):
+        """Forget sources with no connections whose bucket has refilled"""
+        now = time.monotonic()
+        if now - self._pruned < PRUNE_INTERVAL:
+            return
+        self._pruned = now
+        refill = self.burst / self.rate
+        for key, (_tokens, last, conns) in list(self._sources.items()):
+            if not conns and now - last >= refill:
+                del self._sources[key]
+
+
+class HTTPServer:
+    """asyncio HTTP/1.1 server dispatching every request to one coroutine"""
+
+    def __init__(self, handler, host='', port=80,
+                 idle_timeout=KEEPALIVE_TIMEOUT,
+                 max_requests=KEEPALIVE_MAX_REQUESTS, routes=(),
+                 reuse_port=False, header_timeout=HEADER_TIMEOUT,
+                 write_timeout=WRITE_TIMEOUT, max_connections=MAX_CONNECTIONS,
+                 per_source_connections=PER_SOURCE_CONNECTIONS,
+                 rate=SOURCE_RATE, burst=SOURCE_BURST):
+        self.handler = handler
+        self.reuse_port = reuse_port
+        self.routes = frozenset(routes)  # Metric labels; anything else is 'other'
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.max_requests = max_requests
+        self.header_timeout = header_timeout
+        self.write_timeout = write_timeout
+        self._admission = _Admission(max_connections, per_source_connections,
+                                     rate, burst)
+        # Shedding must stay cheap under flood: serialize the refusals once
+        retry = {'Retry-After': '1'}
+        self._refusals = {
+            'capacity': self._serialize(None, json_response(
+                503, {"error": "overloaded"}, retry)),
+            'source': self._serialize(None, json_response(
+                429, {"error": "too many connections"}, retry)),
+        }
+        self._server = None
+
+    async def start(self):
+        """Bind the listening socket"""
+        self._server = await asyncio.start_server(
+            self._on_connection, self.host or None, self.port,
+            limit=MAX_HEADER_BYTES, backlog=LISTEN_BACKLOG,
+            reuse_address=True, reuse_port=self.reuse_port or None)
+        return self._server
+
+    async def serve_forever(self):
+        """Bind (if needed) and serve until cancelled"""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _read_request(self, reader):
+        """Read and parse one request head; None on a clean EOF"""
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise _BadRequest()
+            return None
+        except asyncio.LimitOverrunError:
+            raise _BadRequest()
+
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split()
+        if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+            raise _BadRequest()
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        # Drain (and ignore) any request body
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise _BadRequest()
+        if length > MAX_BODY_BYTES:
+            raise _BadRequest()
+        if length:
+            try:
+                await reader.readexactly(length)
+            except asyncio.IncompleteReadError:
+                return None
+
+        return Request(parts[0].upper(), parts[1], parts[2], headers)
+
+    def _wants_keep_alive(self, request):
+        """HTTP/1.1 defaults to persistent; HTTP/1.0 must ask for it"""
+        connection = request.headers.get('connection', '').lower()
+        if request.version == 'HTTP/1.1':
+            return 'close' not in connection
+        return 'keep-alive' in connection
+
+    def _serialize(self, request, response, keep_alive=False, remaining=0):
+        lines = [f'HTTP/1.1 {response.status} {_reason(response.status)}']
+        for name, value in response.headers.items():
+            lines.append(f'{name}: {value}')
+        if not isinstance(response, StreamResponse) and response.status != 304:
+            lines.append(f'Content-Length: {len(response.body)}')
+        if keep_alive:
+            lines.append('Connection: keep-alive')
+            lines.append(f'Keep-Alive: timeout={int(self.idle_timeout)}, '
+                         f'max={remaining}')
+        else:
+            lines.append('Connection: close')
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        if request is not None and request.method == 'HEAD':
+            return head
+        return head + response.body
+
+    async def _stream(self, response, writer):
+        """Write chunks until the producer ends or the client goes away"""
+        try:
+            async for chunk in response.chunks:
+                writer.write(chunk)
+                await self._drain(writer)
+        finally:
+            close = getattr(response.chunks, 'aclose', None)
+            if close is not None:
+                await close()
+
+    async def _drain(self, writer):
+        """Flush the write buffer; a client that stops reading is dropped"""
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    async def _shed(self, reader, writer, reason):
+        """Refuse a connection without parsing anything it sends"""
+        tide_metrics.SHED.inc(reason)
+        try:
+            writer.write(self._refusals[reason])
+            writer.write_eof()
+            # Linger briefly: closing with unread input resets the
+            # connection and the client may never see the refusal
+            await asyncio.wait_for(reader.read(MAX_HEADER_BYTES), SHED_LINGER)
+        except (OSError, asyncio.TimeoutError):
+            pass
+        writer.close()
+
+    async def _on_connection(self, reader, writer):
+        """Serve one connection: up to max_requests keep-alive requests"""
+        peer = writer.get_extra_info('peername')
+        source = self._admission.source(peer)
+        refused = self._admission.enter(source)
+        if refused is not None:
+            await self._shed(reader, writer, refused)
+            return
+
+        served = 0
+        loopback = source is None
+        tide_metrics.CONNECTIONS.inc()
+        try:
+            while True:
+                try:
+                    # Whole head within the deadline (slowloris); idle
+                    # keep-alive connections are reaped after idle_timeout
+                    request = await asyncio.wait_for(
+                        self._read_request(reader),
+                        self.idle_timeout if served else self.header_timeout)
+                except asyncio.TimeoutError:
+                    if not served:
+                        tide_metrics.SHED.inc('timeout')
+                    return
+                except _BadRequest:
+                    writer.write(self._serialize(
+                        None, json_response(400, {"error": "bad request"})))
+                    await self._drain(writer)
+                    return
+                if request is None:
+                    return
+
+                served += 1
+                request.loopback = loopback
+                route = request.path if request.path in self.routes else 'other'
+                started = time.perf_counter()
+                retry_after = self._admission.take(source)
+                if retry_after:
+                    tide_metrics.SHED.inc('rate')
+                    response = json_response(
+                        429, {"error": "rate limited"},
+                        {'Retry-After': str(max(1, round(retry_after)))})
+                else:
+                    try:
+                        response = await self.handler(request)
+                    except Exception:
+                        # ZERO-LOG: swallow the traceback, report a generic error
+                        response = json_response(500, {"error": "internal"})
+                tide_metrics.REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, route)
+                tide_metrics.REQUESTS.inc(route, response.status)
+
+                streaming = isinstance(response, StreamResponse)
+                keep_alive = (not streaming and served < self.max_requests
+                              and self._wants_keep_alive(request))
+                writer.write(self._serialize(request, response, keep_alive,
+                                             self.max_requests - served))
+                await self._drain(writer)
+
+                if streaming:
+                    if request.method != 'HEAD':
+                        await self._stream(response, writer)
+                    return
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._admission.leave(source)
+            tide_metrics.CONNECTIONS.dec()
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
@@ -0,0 +1,88 @@
+"""
+Tide DHCP Lease Index
+=====================
+Active-lease count for dnsmasq.leases without re-reading the file on
+every request.
+
+dnsmasq rewrites its lease file whenever a lease changes. It has one
+line per lease:
+
+    <expiry epoch> <mac> <ip> <hostname> <client-id>
+
+where an expiry of 0 means the lease never expires. Expired leases stay
+in the file until dnsmasq next rewrites it, so counting lines
+over-reports clients.
+
+LeaseIndex stats the file on each call and parses it only when its
+inode, size or mtime changed. It keeps only a sorted array of expiry
+times, so the active count is one bisect against the current time.
+This stays cheap at tens of thousands of leases (see
+testing/local/bench-leases.py).
+
+ZERO-LOG POLICY: MACs, IPs and hostnames are never kept, only expiry
+times.
+"""
+
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+from tide_config import TIDE_ROOT
+
+LEASES_FILE = TIDE_ROOT + '/var/lib/misc/dnsmasq.leases'
+
+
+def parse_expiries(data):
+    """Lease file bytes -> (sorted expiry array, never-expiring count)"""
+    # First field of each line; non-numeric ones are blank lines or the
+    # DHCPv6 "duid" line
+    heads = [line.partition(b' ')[0] for line in data.splitlines()]
+    expiries = sorted(map(int, filter(bytes.isdigit, heads)))
+    forever = bisect_right(expiries, 0)
+    return array('q', expiries[forever:]), forever
+
+
+class LeaseIndex:
+    """In-memory expiry table for one dnsmasq lease file"""
+
+    def __init__(self, path=LEASES_FILE):
+        self.path = path
+        self._key = None            # (inode, size, mtime) of the parsed file
+        self._expiries = array('q')
+        self._forever = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            st = None
+        key = st and (st.st_ino, st.st_size, st.st_mtime_ns)
+        if key == self._key:
+            return
+        with self._lock:
+            if key == self._key:
+                return  # Another thread just parsed it
+            if st is None:
+                expiries, forever = array('q'), 0
+            else:
+                try:
+                    with open(self.path, 'rb') as f:
+                        expiries, forever = parse_expiries(f.read())
+                except OSError:
+                    return  # Replaced under us - try again next call
+            self._expiries, self._forever, self._key = expiries, forever, key
+
+    def active(self, now=None):
+        """Leases that have not expired yet"""
+        self._refresh()
+        now = time.time() if now is None else now
+        expiries = self._expiries
+        return self._forever + len(expiries) - bisect_right(expiries, now)
+
+    def total(self):
+        """Every lease in the file, expired or not"""
+        self._refresh()
+        return self._forever + len(self._expiries)
@@ -0,0 +1,223 @@
+"""
+Tide Metrics
+============
+In-memory, aggregate-only metrics in the Prometheus text format.
+
+Only totals and histograms are kept: request counts and latencies per
+route, probe durations, cache hit rates, open connections and Tor state.
+
+ZERO-LOG POLICY: nothing here may identify a client or a request.
+- No client addresses, ever
+- Routes are labelled from the fixed route table; anything else is 'other'
+- No per-request timestamps - histograms only keep bucket counts and sums
+
+Served by the API and dashboard on /metrics, to loopback or with the
+API token only.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds - spans a memory hit (~50us) to a Tor round-trip (~10s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    """Set of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition of every registered metric"""
+        out = []
+        for metric in self._metrics:
+            out.append(f'# HELP {metric.name} {metric.help}')
+            out.append(f'# TYPE {metric.name} {metric.kind}')
+            out.extend(metric.samples())
+        return '\n'.join(out) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, values):
+        if len(values) != len(self.labels):
+            raise ValueError(f'{self.name} expects labels {self.labels}')
+        return tuple(str(v) for v in values)
+
+    def _labelstr(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{self._labelstr(k)} {_format(v)}' for k, v in items]
+
+
+class Counter(_Metric):
+    """Monotonic total"""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Bucketed distribution (counts + sum, never individual samples)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS,
+                 registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(name, help, labels, registry)
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the duration of a with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        out = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                out.append(f'{self.name}_bucket'
+                           f'{self._labelstr(key, [("le", _format(bound))])} {cumulative}')
+            out.append(f'{self.name}_sum{self._labelstr(key)} {total!r}')
+            out.append(f'{self.name}_count{self._labelstr(key)} {count}')
+        return out
+
+
+# ─────────────────────────────────────────────────────────────
+# Tide metrics (one set per process)
+# ─────────────────────────────────────────────────────────────
+
+REQUESTS = Counter('tide_http_requests_total',
+                   'HTTP requests served, by route and status code',
+                   ('route', 'code'))
+REQUEST_SECONDS = Histogram('tide_http_request_duration_seconds',
+                            'Time to produce a response, by route',
+                            ('route',))
+CONNECTIONS = Gauge('tide_http_open_connections',
+                    'Client connections currently open')
+SHED = Counter('tide_http_shed_total',
+               'Connections and requests refused by admission control, by '
+               'reason (capacity, source, rate, timeout)',
+               ('reason',))
+PROBE_SECONDS = Histogram('tide_probe_duration_seconds',
+                          'Duration of subprocess, file and Tor probes',
+                          ('probe',))
+CACHE = Counter('tide_cache_lookups_total',
+                'Cache lookups by cache and result (hit, stale, miss)',
+                ('cache', 'result'))
+DNS_CACHE_ENTRIES = Gauge('tide_dns_cache_entries',
+                          'Answers held by the DNS front-end cache')
+PROCESS_COUNT = Gauge('tide_process_count',
+                      'Running processes of Tor and each Tide service',
+                      ('process',))
+PROCESS_CPU = Gauge('tide_process_cpu_seconds',
+                    'CPU time used by running processes, by service',
+                    ('process',))
+PROCESS_RSS = Gauge('tide_process_resident_bytes',
+                    'Resident memory of running processes, by service',
+                    ('process',))
+BEACONS = Counter('tide_beacons_sent_total',
+                  'UDP discovery beacons broadcast to the LAN')
+TOR_BOOTSTRAP = Gauge('tide_tor_bootstrap_percent',
+                      'Last sampled Tor bootstrap progress')
+TOR_STATE = Gauge('tide_tor_state',
+                  'Last sampled Tor state (1 for the current state)',
+                  ('state',))
+
+_TOR_STATES = ('connected', 'bootstrapping', 'offline', 'unknown')
+
+
+def record_tor(state, progress):
+    """Update the Tor gauges from a (state, bootstrap %) sample"""
+    for name in _TOR_STATES:
+        TOR_STATE.set(1 if name == state else 0, name)
+    if progress is not None:
+        TOR_BOOTSTRAP.set(progress)
+
+
+def render():
+    """Prometheus text for this process"""
+    return REGISTRY.render()
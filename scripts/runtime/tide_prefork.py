@@ -0,0 +1,117 @@
+"""
+Tide Prefork Supervisor
+=======================
+Optional multi-process serving for the gateway HTTP services.
+
+With TIDE_WORKERS > 1 (or "auto" = one per CPU) the service process
+becomes a supervisor: it starts that many copies of itself as workers,
+each binding the same port with SO_REUSEPORT so the kernel spreads
+connections across them, and restarts any worker that exits (with
+backoff if one keeps crashing).
+
+Workers are fresh interpreters (not forks of a threaded parent), marked
+with TIDE_WORKER_ID. The supervisor keeps the shared background work -
+for the API, sampling status once into STATE_DIR for every worker.
+
+ZERO-LOG POLICY: worker exits and restarts are not logged.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from tide_config import TIDE_ROOT
+
+STATE_DIR = TIDE_ROOT + '/run/tide'  # Shared snapshots (tmpfs)
+
+MIN_UPTIME = 5.0        # A worker dying sooner than this counts as a crash
+MAX_BACKOFF = 30.0
+
+
+def worker_count():
+    """Workers from TIDE_WORKERS: a number, or "auto" for one per CPU"""
+    value = os.getenv('TIDE_WORKERS', '1').strip().lower()
+    if value == 'auto':
+        return os.cpu_count() or 1
+    try:
+        return max(1, int(value))
+    except ValueError:
+        return 1
+
+
+def worker_id():
+    """This process's worker index, or None outside prefork mode"""
+    value = os.getenv('TIDE_WORKER_ID')
+    return int(value) if value is not None else None
+
+
+class _Worker:
+    def __init__(self, index):
+        self.index = index
+        self.proc = None
+        self.started = 0.0
+        self.backoff = 0.0
+        self.restart_at = 0.0
+
+
+class Supervisor:
+    """Start N copies of the running script as workers and keep them up"""
+
+    def __init__(self, workers, argv=None):
+        self.argv = argv or [sys.executable, os.path.abspath(sys.argv[0])] + sys.argv[1:]
+        self.workers = [_Worker(i) for i in range(workers)]
+        self._stopping = False
+
+    def _spawn(self, worker):
+        env = dict(os.environ, TIDE_WORKER_ID=str(worker.index))
+        worker.proc = subprocess.Popen(self.argv, env=env)
+        worker.started = time.monotonic()
+
+    def _reap(self, worker, now):
+        """Schedule a restart for a worker that exited"""
+        lived = now - worker.started
+        if lived < MIN_UPTIME:
+            worker.backoff = min(MAX_BACKOFF, max(1.0, worker.backoff * 2))
+        else:
+            worker.backoff = 0.0
+        worker.proc = None
+        worker.restart_at = now + worker.backoff
+
+    def _on_signal(self, signum, frame):
+        self._stopping = True
+
+    def run(self):
+        """Supervise until SIGTERM/SIGINT, then stop every worker"""
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        for worker in self.workers:
+            self._spawn(worker)
+
+        try:
+            while not self._stopping:
+                now = time.monotonic()
+                for worker in self.workers:
+                    if worker.proc is None:
+                        if now >= worker.restart_at:
+                            self._spawn(worker)
+                    elif worker.proc.poll() is not None:
+                        self._reap(worker, now)
+                time.sleep(0.5)
+        finally:
+            self.stop()
+
+    def stop(self, timeout=5.0):
+        procs = [w.proc for w in self.workers if w.proc is not None]
+        for proc in procs:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+        deadline = time.monotonic() + timeout
+        for proc in procs:
+            try:
+                proc.wait(max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.kill()
@@ -0,0 +1,173 @@
+"""
+Tide Process Table
+==================
+Fork-free process lookups from /proc, replacing `pgrep` probes.
+
+ProcessTable scans /proc at most once per interval and answers from
+memory in between:
+
+- running(pattern) / find(pattern): like `pgrep -f` (substring of the
+  command line); name= matches the exact process name like `pgrep -x`
+- usage(): PID, CPU % and RSS of Tor and the Tide services (WATCHED),
+  summed over every process of a service (prefork workers, balanced Tor
+  instances). Also published as tide_process_* gauges for /metrics.
+
+A scan lists /proc once. Command lines are read only for PIDs not seen
+before (a PID's command line is cached until it exits); stat/statm are
+read only for watched processes. Concurrent callers share one scan.
+
+Interval: TIDE_PROCS_INTERVAL env var (seconds, default 2).
+
+ZERO-LOG POLICY: only process names and resource totals are kept; no
+command line is ever logged or exposed.
+"""
+
+import os
+import threading
+import time
+
+import tide_metrics
+
+DEFAULT_INTERVAL = 2.0
+PROC = '/proc'
+
+# Service -> how to recognise its processes: comm name, or script in argv
+WATCHED = {
+    'tor': ('comm', 'tor'),
+    'tide-api': ('script', 'tide-api.py'),
+    'tide-web': ('script', 'tide-web-dashboard.py'),
+    'tide-dns': ('script', 'tide-dns.py'),
+    'tide-balancer': ('script', 'tide-balancer.py'),
+}
+
+_TICKS = os.sysconf('SC_CLK_TCK')
+_PAGE = os.sysconf('SC_PAGE_SIZE')
+
+
+def _interval_from_env():
+    try:
+        return max(0.1, float(os.getenv('TIDE_PROCS_INTERVAL', DEFAULT_INTERVAL)))
+    except ValueError:
+        return DEFAULT_INTERVAL
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class _Proc:
+    __slots__ = ('pid', 'comm', 'cmdline', 'argv', 'service', 'cpu', 'rss')
+
+    def __init__(self, pid, comm, cmdline):
+        self.pid = pid
+        self.comm = comm
+        self.cmdline = cmdline
+        self.argv = cmdline.split(' ')
+        self.service = None
+        for name, (kind, value) in WATCHED.items():
+            if (comm == value if kind == 'comm' else
+                    any(os.path.basename(arg) == value for arg in self.argv[:3])):
+                self.service = name
+                break
+        self.cpu = None     # Seconds of CPU (utime + stime)
+        self.rss = 0        # Bytes
+
+
+class ProcessTable:
+    """Interval-cached view of /proc"""
+
+    def __init__(self, interval=None, root=PROC):
+        self.interval = _interval_from_env() if interval is None else interval
+        self.root = root
+        self._procs = {}        # pid -> _Proc
+        self._usage = {}
+        self._scanned = None    # monotonic time of the last scan
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Rescan /proc if the last scan is older than the interval"""
+        with self._lock:
+            now = time.monotonic()
+            if self._scanned is None or now - self._scanned >= self.interval:
+                with tide_metrics.PROBE_SECONDS.time('procs'):
+                    self._scan(now)
+            return self._procs
+
+    def _scan(self, now):
+        previous, procs, before = self._procs, {}, {}
+        try:
+            entries = os.listdir(self.root)
+        except OSError:
+            entries = ()
+        for entry in entries:
+            if not entry.isdigit():
+                continue
+            pid = int(entry)
+            proc = previous.get(pid)
+            try:
+                if proc is None:
+                    base = f'{self.root}/{entry}'
+                    comm = _read(f'{base}/comm').decode(errors='replace').strip()
+                    argv = _read(f'{base}/cmdline').rstrip(b'\0').split(b'\0')
+                    proc = _Proc(pid, comm, b' '.join(argv).decode(errors='replace'))
+                if proc.service is not None:
+                    before[pid] = proc.cpu
+                    proc.cpu, proc.rss = self._sample(pid)
+            except OSError:
+                continue  # Exited mid-scan
+            procs[pid] = proc
+
+        elapsed = now - self._scanned if self._scanned is not None else None
+        usage = {}
+        for proc in procs.values():
+            if proc.service is None:
+                continue
+            entry = usage.setdefault(proc.service, {
+                "pids": [], "cpu_percent": 0.0, "cpu_seconds": 0.0, "rss_bytes": 0})
+            entry["pids"].append(proc.pid)
+            entry["cpu_seconds"] += proc.cpu
+            entry["rss_bytes"] += proc.rss
+            if elapsed and before.get(proc.pid) is not None:
+                entry["cpu_percent"] += (proc.cpu - before[proc.pid]) / elapsed * 100
+        for entry in usage.values():
+            entry["pids"].sort()
+            entry["cpu_percent"] = round(entry["cpu_percent"], 1)
+            entry["cpu_seconds"] = round(entry["cpu_seconds"], 2)
+
+        self._procs, self._usage, self._scanned = procs, usage, now
+        for name in WATCHED:
+            entry = usage.get(name)
+            tide_metrics.PROCESS_COUNT.set(len(entry["pids"]) if entry else 0, name)
+            tide_metrics.PROCESS_CPU.set(entry["cpu_seconds"] if entry else 0, name)
+            tide_metrics.PROCESS_RSS.set(entry["rss_bytes"] if entry else 0, name)
+
+    def _sample(self, pid):
+        """(CPU seconds, RSS bytes) of a watched process"""
+        base = f'{self.root}/{pid}'
+        stat = _read(f'{base}/stat')
+        # utime/stime are stat fields 14/15, counted after "(comm)" which
+        # may itself contain spaces
+        fields = stat[stat.rindex(b')') + 2:].split()
+        cpu = (int(fields[11]) + int(fields[12])) / _TICKS
+        return cpu, int(_read(f'{base}/statm').split()[1]) * _PAGE
+
+    def find(self, pattern=None, name=None):
+        """PIDs whose command line contains pattern / whose name is name"""
+        procs = self.refresh()
+        return sorted(pid for pid, proc in procs.items()
+                      if (pattern is None or pattern in proc.cmdline) and
+                      (name is None or proc.comm == name) and pid != os.getpid())
+
+    def running(self, pattern=None, name=None):
+        """True if a process matches (see find)"""
+        return bool(self.find(pattern, name))
+
+    def usage(self):
+        """{service: {pids, cpu_percent, cpu_seconds, rss_bytes}} for running WATCHED services"""
+        self.refresh()
+        return self._usage
+
+
+# One table per process, shared by every request
+PROCS = ProcessTable()
@@ -0,0 +1,270 @@
+"""
+Tide Status Record
+==================
+Fixed-layout gateway status published in shared memory, so that only
+one process probes and every frontend reads the result.
+
+The API (the prefork supervisor, or the single API process) is the only
+writer. It rewrites the record after every status sample. The dashboard
+and `tide status` map the same file (/run/tide is tmpfs) and read it in
+place, with no syscall per read and no round-trip to the API.
+
+Layout v1 (little-endian), RECORD_SIZE bytes:
+
+    0   4s  magic "TIDE"
+    4   H   layout version (LAYOUT)
+    6   H   body size
+    8   Q   sequence - odd while the writer is mid-update
+    16  I   CRC32 of the body
+    20  ... body (_BODY): updated, Tor state, bootstrap, clients, flags,
+            mode/security/version, exit IP/country and when it was fetched
+
+Consistency is a seqlock. The writer makes the sequence odd, writes the
+body and CRC, then makes it even again. A reader retries until it sees
+the same even sequence before and after unpacking. Python cannot issue a
+memory barrier, and aarch64 does not keep plain stores in order, so the
+reader also checks the CRC. A torn read is retried, never returned.
+
+Readers treat a record older than MAX_AGE as absent (API stopped) and
+fall back to probing themselves. A bumped LAYOUT is also "absent", so
+old and new processes never misread each other during an upgrade.
+
+ZERO-LOG POLICY: the record holds aggregate gateway state only (the same
+fields as /status); no client is identified.
+"""
+
+import mmap
+import os
+import shlex
+import struct
+import sys
+import time
+import zlib
+
+from tide_prefork import STATE_DIR
+
+RECORD_FILE = STATE_DIR + '/status.map'
+MAGIC = b'TIDE'
+LAYOUT = 1
+MAX_AGE = 15.0          # Seconds (at least 3 status intervals, see _max_age)
+READ_RETRIES = 100
+
+_HEADER = struct.Struct('<4sHHQI')
+_SEQ = struct.Struct('<Q')
+_SEQ_OFFSET = 8
+_CRC = struct.Struct('<I')
+_CRC_OFFSET = 16
+# updated, tor, bootstrap, is_tor, flags, clients, mode, security, version,
+# exit IP, exit country, exit fetched at
+_BODY = struct.Struct('<dBbBBI16s16s16s46s8sd')
+RECORD_SIZE = _HEADER.size + _BODY.size
+
+TOR_STATES = ('unknown', 'connected', 'bootstrapping', 'offline')
+FLAG_ARP = 0x01
+FLAG_SCANNER = 0x02
+
+# Sampler fields the writer needs kept warm
+RECORD_FIELDS = ('tor', 'bootstrap', 'mode', 'security', 'version',
+                 'clients', 'arp_active', 'scanner_active')
+
+
+def _max_age():
+    """Oldest record still treated as live - three missed writes"""
+    try:
+        interval = float(os.getenv('TIDE_STATUS_INTERVAL', '5'))
+    except ValueError:
+        interval = 5.0
+    return max(MAX_AGE, interval * 3)
+
+
+def _text(value, size):
+    return str(value if value is not None else '').encode()[:size]
+
+
+def _untext(raw):
+    return raw.rstrip(b'\0').decode(errors='replace')
+
+
+def pack_body(fields, exit_info=None, exit_at=0.0):
+    """Body bytes for a status snapshot's fields and cached exit info"""
+    tor = fields.get('tor', 'unknown')
+    bootstrap = fields.get('bootstrap')
+    exit_info = exit_info if exit_info and 'error' not in exit_info else {}
+    flags = ((FLAG_ARP if fields.get('arp_active') else 0) |
+             (FLAG_SCANNER if fields.get('scanner_active') else 0))
+    return _BODY.pack(
+        time.time(),
+        TOR_STATES.index(tor) if tor in TOR_STATES else 0,
+        -1 if bootstrap is None else bootstrap,
+        1 if exit_info.get('IsTor') else 0,
+        flags,
+        fields.get('clients') or 0,
+        _text(fields.get('mode'), 16),
+        _text(fields.get('security'), 16),
+        _text(fields.get('version'), 16),
+        _text(exit_info.get('IP'), 46),
+        _text(exit_info.get('Country'), 8),
+        exit_at if exit_info else 0.0)
+
+
+def unpack_body(body):
+    (updated, tor, bootstrap, is_tor, flags, clients, mode, security,
+     version, exit_ip, exit_country, exit_at) = _BODY.unpack(body)
+    now = time.time()
+    exit_info = None
+    if exit_at:
+        exit_info = {"IsTor": bool(is_tor), "IP": _untext(exit_ip)}
+        if exit_country.strip(b'\0'):
+            exit_info["Country"] = _untext(exit_country)
+    return {
+        "age": max(0.0, now - updated),
+        "tor": TOR_STATES[tor] if tor < len(TOR_STATES) else 'unknown',
+        "bootstrap": None if bootstrap < 0 else bootstrap,
+        "mode": _untext(mode),
+        "security": _untext(security),
+        "version": _untext(version),
+        "clients": clients,
+        "arp_active": bool(flags & FLAG_ARP),
+        "scanner_active": bool(flags & FLAG_SCANNER),
+        "exit": exit_info,
+        "exit_age": max(0.0, now - exit_at) if exit_at else None,
+    }
+
+
+class StatusRecordWriter:
+    """Single writer of the shared record"""
+
+    def __init__(self, path=RECORD_FILE):
+        self.path = path
+        self._map = None
+        self._seq = 0
+
+    def _open(self):
+        """Map the record, creating (or replacing a foreign) file first"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+            if os.fstat(fd).st_size != RECORD_SIZE:
+                os.close(fd)
+                raise FileNotFoundError()
+        except FileNotFoundError:
+            # Build the new file aside so readers never map a short one
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.ftruncate(fd, RECORD_SIZE)
+            os.replace(tmp, self.path)
+        try:
+            self._map = mmap.mmap(fd, RECORD_SIZE)
+        finally:
+            os.close(fd)
+        magic, layout, size, seq, _crc = _HEADER.unpack_from(self._map)
+        if (magic, layout, size) != (MAGIC, LAYOUT, _BODY.size):
+            # New or foreign file: sequence 0 reads as "never written"
+            _HEADER.pack_into(self._map, 0, MAGIC, LAYOUT, _BODY.size, 0, 0)
+            seq = 0
+        self._seq = seq + (seq & 1)   # Resume past a half-finished update
+
+    def write(self, fields, exit_info=None, exit_at=0.0):
+        """Publish a new record (see pack_body)"""
+        try:
+            if self._map is None:
+                self._open()
+            body = pack_body(fields, exit_info, exit_at)
+            m = self._map
+            _SEQ.pack_into(m, _SEQ_OFFSET, self._seq + 1)
+            m[_HEADER.size:RECORD_SIZE] = body
+            _CRC.pack_into(m, _CRC_OFFSET, zlib.crc32(body))
+            self._seq += 2
+            _SEQ.pack_into(m, _SEQ_OFFSET, self._seq)
+        except (OSError, ValueError):
+            self._map = None  # ZERO-LOG: readers fall back to probing
+
+
+class StatusRecord:
+    """Reader of the shared record"""
+
+    def __init__(self, path=RECORD_FILE, max_age=None):
+        self.path = path
+        self.max_age = _max_age() if max_age is None else max_age
+        self._map = None
+        self._inode = None
+
+    def _open(self):
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return False
+        try:
+            st = os.fstat(fd)
+            if st.st_size != RECORD_SIZE:
+                return False
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(fd, RECORD_SIZE, prot=mmap.PROT_READ)
+            self._inode = st.st_ino
+            return True
+        finally:
+            os.close(fd)
+
+    def _snapshot(self):
+        """Consistent body bytes, or None if the writer kept interfering"""
+        m = self._map
+        magic, layout, size, _seq, _crc = _HEADER.unpack_from(m)
+        if (magic, layout, size) != (MAGIC, LAYOUT, _BODY.size):
+            return None
+        for _ in range(READ_RETRIES):
+            seq = _SEQ.unpack_from(m, _SEQ_OFFSET)[0]
+            if seq == 0:
+                return None  # Created but never written
+            if seq & 1 == 0:
+                body = m[_HEADER.size:RECORD_SIZE]
+                crc = _CRC.unpack_from(m, _CRC_OFFSET)[0]
+                if (_SEQ.unpack_from(m, _SEQ_OFFSET)[0] == seq and
+                        zlib.crc32(body) == crc):
+                    return body
+            time.sleep(0)  # Let the writer finish
+        return None
+
+    def read(self):
+        """Status dict (see unpack_body), or None if there is no live record"""
+        for attempt in (0, 1):
+            if self._map is None and not self._open():
+                return None
+            body = self._snapshot()
+            data = unpack_body(body) if body is not None else None
+            if data is not None and data["age"] <= self.max_age:
+                return data
+            # Stale or foreign: the writer may have recreated the file
+            try:
+                if attempt or os.stat(self.path).st_ino == self._inode:
+                    return None
+            except OSError:
+                return None
+            self._map.close()
+            self._map = None
+        return None
+
+
+def _shell():
+    """`tide status` helper: print the record as shell assignments"""
+    data = StatusRecord().read()
+    if data is None:
+        return 1
+    exit_info = data["exit"] or {}
+    for name, value in (("TIDE_TOR", data["tor"]),
+                        ("TIDE_BOOTSTRAP", data["bootstrap"]),
+                        ("TIDE_MODE", data["mode"]),
+                        ("TIDE_SECURITY", data["security"]),
+                        ("TIDE_VERSION", data["version"]),
+                        ("TIDE_CLIENTS", data["clients"]),
+                        ("TIDE_ARP", int(data["arp_active"])),
+                        ("TIDE_SCANNER", int(data["scanner_active"])),
+                        ("TIDE_EXIT_IP", exit_info.get("IP", "")),
+                        ("TIDE_EXIT_COUNTRY", exit_info.get("Country", "")),
+                        ("TIDE_RECORD_AGE", int(data["age"]))):
+        print(f"{name}={shlex.quote('' if value is None else str(value))}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_shell())
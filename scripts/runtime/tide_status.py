@@ -0,0 +1,279 @@
+"""
+Tide Status Sampler
+===================
+Keeps one immutable gateway status snapshot in memory, built from lazily
+evaluated field providers (Tor state, /etc/tide state files, uptime...).
+
+- A provider only runs when one of its fields is requested (or kept warm)
+- Values younger than two intervals are served straight from memory
+- A daemon thread re-samples fields that were requested recently, so
+  polled fields stay warm and are never probed on the request path;
+  fields nobody asks for go cold and never touch subprocesses or files
+
+In prefork mode (tide_prefork.py) only the supervisor runs providers.
+It writes every snapshot to a SnapshotFile; workers mirror() the same
+fields and adopt() each snapshot the file watcher delivers, so N workers
+cost one set of probes.
+
+Interval: TIDE_STATUS_INTERVAL env var (seconds, default 5).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+import tide_metrics
+from tide_config import TideConfig
+
+DEFAULT_INTERVAL = 5.0
+HOT_INTERVALS = 12      # Fields requested within this many intervals stay warm
+
+
+def _interval_from_env():
+    try:
+        return max(0.5, float(os.getenv('TIDE_STATUS_INTERVAL', DEFAULT_INTERVAL)))
+    except ValueError:
+        return DEFAULT_INTERVAL
+
+
+class StatusSnapshot(namedtuple('StatusSnapshot', 'fields stamps')):
+    """Read-only field mapping + per-field monotonic capture times"""
+
+    __slots__ = ()
+
+    def age(self, names=None):
+        """Seconds since the oldest of `names` (default: all) was sampled"""
+        stamps = [self.stamps[n] for n in (names or self.stamps) if n in self.stamps]
+        if not stamps:
+            return 0.0
+        return max(0.0, time.monotonic() - min(stamps))
+
+
+_EMPTY = StatusSnapshot(MappingProxyType({}), MappingProxyType({}))
+
+
+class StatusSampler:
+    """Lazily evaluated, interval-cached status fields"""
+
+    def __init__(self, interval=None):
+        self.interval = interval if interval is not None else _interval_from_env()
+        self._providers = {}    # field -> (func, names)
+        self._mirrored = set()  # fields fed by adopt() instead of providers
+        self._demand = {}       # field -> last time it was requested
+        self._warm = None       # Optional callable -> fields to keep warm
+        self._snapshot = _EMPTY
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+
+    # ─────────────────────────────────────────────────────────────
+    # Registration
+    # ─────────────────────────────────────────────────────────────
+
+    def provide(self, func, *names):
+        """
+        Register func as the provider of `names`. With one name func returns
+        the value; with several it returns a tuple in the same order.
+        """
+        for name in names:
+            self._providers[name] = (func, names)
+
+    def mirror(self, *names):
+        """Serve `names` from snapshots pushed with adopt() (prefork workers)"""
+        self._mirrored.update(names)
+
+    @property
+    def fields(self):
+        return tuple(self._providers) + tuple(
+            n for n in sorted(self._mirrored) if n not in self._providers)
+
+    def keep_warm(self, callback):
+        """callback() -> field names the background thread must refresh"""
+        self._warm = callback
+
+    def add_listener(self, callback):
+        """Call callback(snapshot) after every refresh (caller's thread)"""
+        self._listeners.append(callback)
+
+    # ─────────────────────────────────────────────────────────────
+    # Reading
+    # ─────────────────────────────────────────────────────────────
+
+    @property
+    def snapshot(self):
+        """Latest published snapshot (never probes)"""
+        return self._snapshot
+
+    def cached(self, names=None):
+        """Snapshot if `names` are all fresh in memory, else None (never probes)"""
+        names = self._known(names)
+        now = time.monotonic()
+        for name in names:
+            self._demand[name] = now
+
+        snap = self._snapshot
+        if self._stale(snap, names, now):
+            tide_metrics.CACHE.inc('status', 'miss')
+            return None
+        tide_metrics.CACHE.inc('status', 'hit')
+        return snap
+
+    def sample(self, names=None):
+        """
+        Snapshot guaranteed to hold `names` (default: every field), each
+        younger than two intervals. Only stale/missing providers are run.
+        """
+        snap = self.cached(names)
+        if snap is None:
+            snap = self.refresh(names, force=False)
+        return snap
+
+    def _known(self, names):
+        if names is None:
+            return list(self.fields)
+        return [n for n in names if n in self._providers or n in self._mirrored]
+
+    def _stale(self, snap, names, now):
+        # Mirrored fields are as fresh as the supervisor keeps them
+        max_age = self.interval * 2
+        return [n for n in names if n not in self._mirrored and
+                now - snap.stamps.get(n, now - max_age) >= max_age]
+
+    def refresh(self, names=None, force=True):
+        """Run the providers behind `names` now and publish the result"""
+        names = [n for n in self._known(names) if n in self._providers]
+        with self._lock:
+            snap = self._snapshot
+            stale = names if force else self._stale(snap, names, time.monotonic())
+            if not stale:
+                return snap  # Another caller refreshed while we waited
+
+            fields, stamps = dict(snap.fields), dict(snap.stamps)
+            done = set()
+            for name in stale:
+                func, group = self._providers[name]
+                if group in done:
+                    continue
+                done.add(group)
+                started = time.perf_counter()
+                try:
+                    value = func()
+                except Exception:
+                    # ZERO-LOG: keep serving the previous value
+                    continue
+                finally:
+                    tide_metrics.PROBE_SECONDS.observe(
+                        time.perf_counter() - started, '+'.join(group))
+                values = value if len(group) > 1 else (value,)
+                taken_at = time.monotonic()
+                for field, val in zip(group, values):
+                    fields[field] = val
+                    stamps[field] = taken_at
+
+            snap = StatusSnapshot(MappingProxyType(fields), MappingProxyType(stamps))
+            self._snapshot = snap
+
+        self._publish(snap)
+        return snap
+
+    def adopt(self, fields, stamps):
+        """Merge an externally sampled snapshot (see mirror()) and publish it"""
+        with self._lock:
+            snap = self._snapshot
+            snap = StatusSnapshot(MappingProxyType(dict(snap.fields, **fields)),
+                                  MappingProxyType(dict(snap.stamps, **stamps)))
+            self._snapshot = snap
+        self._publish(snap)
+        return snap
+
+    def _publish(self, snap):
+        for callback in self._listeners:
+            try:
+                callback(snap)
+            except Exception:
+                pass
+
+    # ─────────────────────────────────────────────────────────────
+    # Background refresh
+    # ─────────────────────────────────────────────────────────────
+
+    def _hot_fields(self):
+        cutoff = time.monotonic() - self.interval * HOT_INTERVALS
+        hot = {n for n, t in self._demand.items() if t >= cutoff}
+        if self._warm is not None:
+            try:
+                hot.update(self._warm())
+            except Exception:
+                pass
+        return [n for n in self._providers if n in hot]
+
+    def poke(self):
+        """Ask the background thread to resample immediately"""
+        self._wake.set()
+
+    def start(self):
+        """Start the background sampling thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='tide-status', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            hot = self._hot_fields()
+            if hot:
+                self.refresh(hot)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+class SnapshotFile:
+    """
+    Snapshot hand-off between a prefork supervisor and its workers.
+    Stamps are CLOCK_MONOTONIC, which every process on the host shares.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._watcher = None
+
+    def write(self, snap):
+        """Sampler listener: replace the file atomically with `snap`"""
+        data = json.dumps({"fields": dict(snap.fields), "stamps": dict(snap.stamps)})
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # ZERO-LOG: workers keep the previous snapshot
+
+    def follow(self, sampler):
+        """Mirror every snapshot written to the file into `sampler`"""
+        def adopt(_name, value):
+            try:
+                data = json.loads(value)
+            except (TypeError, ValueError):
+                return
+            sampler.adopt(data.get("fields", {}), data.get("stamps", {}))
+
+        self._watcher = TideConfig({'snapshot': (self.path, None)})
+        self._watcher.subscribe(adopt)
+        adopt('snapshot', self._watcher.get('snapshot'))
+        self._watcher.start()
+        return self
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.stop()
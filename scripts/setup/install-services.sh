@@ -65,6 +65,14 @@ echo "  ✓ tide-web.service"
 cp /opt/tide/config/systemd/tide-api.service /etc/systemd/system/
 echo "  ✓ tide-api.service"
 
+# Install DNS cache service (opt-in - not enabled here)
+cp /opt/tide/config/systemd/tide-dns.service /etc/systemd/system/
+echo "  ✓ tide-dns.service (opt-in: systemctl enable --now tide-dns)"
+
+# Install multi-instance Tor balancer (opt-in - replaces tor.service)
+cp /opt/tide/config/systemd/tide-balancer.service /etc/systemd/system/
+echo "  ✓ tide-balancer.service (opt-in: systemctl disable --now tor && systemctl enable --now tide-balancer)"
+
 echo ""
 echo -e "${CYAN}[4/6] Reloading systemd...${NC}"
 systemctl daemon-reload
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Tide DNS cache benchmark
+========================
+Measures what tide-dns.py saves over querying Tor's DNSPort directly.
+A stub upstream (fake_tor.FakeDNS) answers every query after --delay
+seconds, standing in for a Tor round-trip. The same skewed workload, where
+a few names are very popular, is sent straight to the stub and then
+through tide-dns.py.
+
+Reports latency percentiles, upstream queries and the front-end's
+hit/miss/coalesced counters from its /metrics.
+
+Usage:
+    python3 testing/local/bench-dns.py
+    python3 testing/local/bench-dns.py --queries 5000 --names 500 --delay 0.4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+REPO = HERE.parent.parent
+RUNTIME = REPO / "scripts" / "runtime"
+sys.path.insert(0, str(HERE))
+
+from fake_tor import FakeDNS
+
+
+def free_port(kind=socket.SOCK_DGRAM):
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def build_query(qid, name):
+    labels = b"".join(bytes([len(p)]) + p.encode() for p in name.split("."))
+    return struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 0) + labels + b"\0\0\1\0\1"
+
+
+def workload(queries, names, seed=7):
+    """Zipf-like mix: name i is picked with weight 1/(i+1)"""
+    rng = random.Random(seed)
+    pool = [f"host{i}.example.com" for i in range(names)]
+    weights = [1 / (i + 1) for i in range(names)]
+    return rng.choices(pool, weights, k=queries)
+
+
+class _Client(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.waiting = {}
+
+    def datagram_received(self, data, addr):
+        future = self.waiting.pop(struct.unpack_from("!H", data)[0], None)
+        if future is not None and not future.done():
+            future.set_result(data)
+
+
+async def run(port, names, clients, timeout=5.0):
+    """Send every name in `names` over `clients` concurrent sockets"""
+    loop = asyncio.get_running_loop()
+    queue = list(reversed(names))
+    latencies, errors = [], [0]
+
+    async def worker():
+        transport, proto = await loop.create_datagram_endpoint(
+            _Client, remote_addr=("127.0.0.1", port))
+        try:
+            while queue:
+                name = queue.pop()
+                qid = random.getrandbits(16)
+                future = proto.waiting[qid] = loop.create_future()
+                started = time.perf_counter()
+                transport.sendto(build_query(qid, name))
+                try:
+                    await asyncio.wait_for(future, timeout)
+                    latencies.append(time.perf_counter() - started)
+                except asyncio.TimeoutError:
+                    proto.waiting.pop(qid, None)
+                    errors[0] += 1
+        finally:
+            transport.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return sorted(latencies), errors[0], time.perf_counter() - started
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1,
+                       int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return round(sorted_values[index] * 1000, 3)
+
+
+def cache_counters(metrics_port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{metrics_port}/metrics",
+                                timeout=2) as r:
+        text = r.read().decode()
+    counters = {}
+    for line in text.splitlines():
+        if line.startswith('tide_cache_lookups_total{cache="dns"'):
+            result = line.split('result="', 1)[1].split('"', 1)[0]
+            counters[result] = int(float(line.rsplit(" ", 1)[1]))
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Tide DNS cache")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--names", type=int, default=200,
+                        help="distinct names in the workload (default 200)")
+    parser.add_argument("--clients", type=int, default=50,
+                        help="concurrent resolvers (default 50)")
+    parser.add_argument("--delay", type=float, default=0.2,
+                        help="stub upstream round-trip in seconds (default 0.2)")
+    parser.add_argument("--output", help="results JSON "
+                        "(default testing/results/bench-dns-<timestamp>.json)")
+    args = parser.parse_args()
+
+    print("🌊 Tide DNS cache benchmark")
+    print("=" * 40)
+
+    upstream = FakeDNS(delay=args.delay).start()
+    port, metrics_port = free_port(), free_port(socket.SOCK_STREAM)
+    env = dict(os.environ,
+               TIDE_DNS_PORT=str(port),
+               TIDE_DNS_UPSTREAM=f"127.0.0.1:{upstream.port}",
+               TIDE_DNS_METRICS_PORT=str(metrics_port))
+    proc = subprocess.Popen([sys.executable, str(RUNTIME / "tide-dns.py")], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    names = workload(args.queries, args.names)
+    results = {}
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                cache_counters(metrics_port)
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            print("✗ tide-dns.py did not start")
+            return 1
+
+        print(f"{args.queries} queries over {args.names} names, "
+              f"{args.clients} clients, upstream delay {args.delay * 1000:.0f} ms")
+        print()
+        for label, target in (("direct", upstream.port), ("tide-dns", port)):
+            before = upstream.queries
+            latencies, errors, elapsed = asyncio.run(run(target, names, args.clients))
+            results[label] = {
+                "answered": len(latencies),
+                "errors": errors,
+                "qps": round(len(latencies) / elapsed, 1),
+                "upstream_queries": upstream.queries - before,
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+            }
+        results["tide-dns"]["cache"] = cache_counters(metrics_port)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        upstream.stop()
+
+    print(f"{'path':<12}{'q/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'upstream':>10}{'errors':>8}")
+    for label, r in results.items():
+        print(f"{label:<12}{r['qps']:>10.0f}{r['p50_ms'] or 0:>10.2f}"
+              f"{r['p95_ms'] or 0:>10.2f}{r['p99_ms'] or 0:>10.2f}"
+              f"{r['upstream_queries']:>10}{r['errors']:>8}")
+    counters = results["tide-dns"]["cache"]
+    lookups = counters.get("hit", 0) + counters.get("miss", 0)
+    if lookups:
+        print()
+        print(f"Cache: {counters.get('hit', 0)} hits, {counters.get('miss', 0)} misses "
+              f"({counters.get('coalesced', 0)} coalesced), "
+              f"hit rate {counters.get('hit', 0) / lookups:.1%}")
+
+    output = args.output or str(REPO / "testing" / "results" / datetime.now()
+                                .strftime("bench-dns-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "queries": args.queries,
+                "names": args.names,
+                "clients": args.clients,
+                "delay": args.delay,
+            },
+            "results": results,
+        }, f, indent=2)
+    print()
+    print(f"Saved {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Tide gateway HTTP benchmark
+===========================
+Starts tide-api.py and tide-web-dashboard.py against fake Tor (fake_tor:
+ControlPort, SOCKS5 relay, check endpoint) and a scratch /etc/tide +
+dnsmasq lease tree, then drives N concurrent keep-alive clients at each
+endpoint. No Tor, VM, root or network needed.
+
+Reports req/s, p50/p95/p99 latency and server RSS per endpoint and saves
+the run as JSON for release-to-release comparison.
+
+Usage:
+    python3 testing/local/bench-gateway.py
+    python3 testing/local/bench-gateway.py --clients 64 --duration 10
+    python3 testing/local/bench-gateway.py --compare testing/results/bench-OLD.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+REPO = HERE.parent.parent
+RUNTIME = REPO / "scripts" / "runtime"
+sys.path.insert(0, str(HERE))
+
+from fake_tor import FakeCheck, FakeControlPort, FakeSocks
+
+TOKEN = "tide-bench"
+
+DEFAULT_ENDPOINTS = [
+    "api:/status",
+    "api:/status?fields=tor",
+    "api:/snapshot",
+    "api:/circuit",
+    "api:/check",
+    "dashboard:/api/status",
+    "dashboard:/",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_root(leases):
+    """Scratch TIDE_ROOT with state files and a dnsmasq lease file"""
+    root = Path(tempfile.mkdtemp(prefix="tide-bench-"))
+    for rel, value in (("etc/tide/mode", "router"),
+                       ("etc/tide/security", "hardened"),
+                       ("etc/tide/api_token", TOKEN),
+                       ("opt/tide/VERSION", "bench")):
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(value + "\n")
+
+    lease_file = root / "var/lib/misc/dnsmasq.leases"
+    lease_file.parent.mkdir(parents=True, exist_ok=True)
+    expiry = int(time.time()) + 3600
+    lease_file.write_text("".join(
+        f"{expiry} 02:00:00:00:{i // 256:02x}:{i % 256:02x} "
+        f"10.101.101.{100 + i % 150} client-{i} *\n" for i in range(leases)))
+    return root
+
+
+def rss_kb(pid):
+    """(current, peak) resident set size in kB, summed over prefork workers"""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+
+    totals = {}
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith(("VmRSS:", "VmHWM:")):
+                        key, value = line.split(":", 1)
+                        totals[key] = totals.get(key, 0) + int(value.split()[0])
+        except OSError:
+            pass
+    return totals.get("VmRSS"), totals.get("VmHWM")
+
+
+def wait_ready(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+# ─────────────────────────────────────────────────────────────
+# Load generator
+# ─────────────────────────────────────────────────────────────
+
+async def client(port, path, deadline, latencies, errors, keep_alive):
+    extra = "" if keep_alive else "Connection: close\r\n"
+    request = f"GET {path} HTTP/1.1\r\nHost: bench\r\n{extra}\r\n".encode()
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            lower = head.lower()
+            length = 0
+            for line in lower.split(b"\r\n"):
+                if line.startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+
+            if int(head.split(b" ", 2)[1]) >= 400:
+                errors[0] += 1
+            if b"connection: close" in lower:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ValueError, IndexError):
+            errors[0] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def drive(port, path, clients, duration, keep_alive):
+    latencies, errors = [], [0]
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, path, deadline, latencies, errors, keep_alive)
+                           for _ in range(clients)))
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1,
+                       int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return round(sorted_values[index] * 1000, 3)
+
+
+# ─────────────────────────────────────────────────────────────
+# Reporting
+# ─────────────────────────────────────────────────────────────
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_table(results):
+    print(f"{'endpoint':<28}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'errors':>8}{'RSS kB':>10}")
+    for name, r in results.items():
+        print(f"{name:<28}{r['rps']:>10.0f}{r['p50_ms'] or 0:>10.2f}"
+              f"{r['p95_ms'] or 0:>10.2f}{r['p99_ms'] or 0:>10.2f}"
+              f"{r['errors']:>8}{r['rss_kb'] or 0:>10}")
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print()
+    print(f"Compared to {baseline_path} ({baseline['meta'].get('commit')}):")
+    print(f"{'endpoint':<28}{'req/s':>12}{'p99':>12}")
+    for name, r in results.items():
+        old = baseline["results"].get(name)
+        if not old:
+            print(f"{name:<28}{'new':>12}")
+            continue
+
+        def delta(new, prev):
+            if not new or not prev:
+                return "n/a"
+            return f"{(new - prev) / prev * 100:+.1f}%"
+
+        print(f"{name:<28}{delta(r['rps'], old['rps']):>12}"
+              f"{delta(r['p99_ms'], old['p99_ms']):>12}")
+
+
+# ─────────────────────────────────────────────────────────────
+# Main
+# ─────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Tide HTTP services")
+    parser.add_argument("--clients", type=int, default=32,
+                        help="concurrent simulated LAN clients (default 32)")
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="seconds per endpoint (default 5)")
+    parser.add_argument("--endpoints", nargs="+", default=DEFAULT_ENDPOINTS,
+                        metavar="SERVER:PATH", help="api:/status dashboard:/ ...")
+    parser.add_argument("--leases", type=int, default=50,
+                        help="fake DHCP leases (default 50)")
+    parser.add_argument("--no-keepalive", action="store_true",
+                        help="new connection per request")
+    parser.add_argument("--output", help="results JSON "
+                        "(default testing/results/bench-<timestamp>.json)")
+    parser.add_argument("--compare", metavar="JSON",
+                        help="print the change against an earlier results file")
+    args = parser.parse_args()
+
+    print("🌊 Tide gateway benchmark")
+    print("=" * 40)
+
+    control = FakeControlPort().start()
+    socks = FakeSocks().start()
+    check = FakeCheck().start()
+    root = make_root(args.leases)
+    ports = {"api": free_port(), "dashboard": free_port()}
+    env = dict(os.environ,
+               TIDE_ROOT=str(root),
+               TIDE_API_PORT=str(ports["api"]),
+               TIDE_DASHBOARD_PORT=str(ports["dashboard"]),
+               TIDE_API_TOKEN=TOKEN,
+               TIDE_CONTROL_PORT=str(control.port),
+               TIDE_SOCKS_PORT=str(socks.port),
+               TIDE_CHECK_URL=check.url)
+
+    servers = {
+        "api": subprocess.Popen([sys.executable, str(RUNTIME / "tide-api.py")],
+                                env=env, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL),
+        "dashboard": subprocess.Popen([sys.executable,
+                                       str(RUNTIME / "tide-web-dashboard.py")],
+                                      env=env, stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.DEVNULL),
+    }
+    results = {}
+    try:
+        for name, path in (("api", "/check"), ("dashboard", "/health")):
+            if not wait_ready(f"http://127.0.0.1:{ports[name]}{path}"):
+                print(f"✗ {name} did not start")
+                return 1
+
+        print(f"{args.clients} clients, {args.duration:g}s per endpoint, "
+              f"keep-alive {'off' if args.no_keepalive else 'on'}")
+        print()
+        for spec in args.endpoints:
+            server, _, path = spec.partition(":")
+            if server not in servers:
+                print(f"✗ unknown server in {spec!r} (use api: or dashboard:)")
+                return 1
+
+            # Warm caches and connections so the run measures steady state
+            asyncio.run(drive(ports[server], path, 4, 0.5, True))
+            latencies, errors, elapsed = asyncio.run(drive(
+                ports[server], path, args.clients, args.duration,
+                not args.no_keepalive))
+            latencies.sort()
+            rss, peak = rss_kb(servers[server].pid)
+            results[f"{server} {path}"] = {
+                "requests": len(latencies),
+                "errors": errors,
+                "rps": round(len(latencies) / elapsed, 1),
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+                "max_ms": percentile(latencies, 100),
+                "rss_kb": rss,
+                "rss_peak_kb": peak,
+            }
+    finally:
+        for proc in servers.values():
+            proc.terminate()
+            try:
+                proc.wait(5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        control.stop()
+        socks.stop()
+        check.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+    print_table(results)
+
+    output = args.output or str(REPO / "testing" / "results" / datetime.now()
+                                .strftime("bench-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "clients": args.clients,
+                "duration": args.duration,
+                "keep_alive": not args.no_keepalive,
+                "leases": args.leases,
+            },
+            "results": results,
+        }, f, indent=2)
+    print()
+    print(f"Saved {output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
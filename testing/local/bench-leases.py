@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Tide DHCP lease index benchmark
+===============================
+Times tide_leases.LeaseIndex against the dashboard's old client count
+(`len(f.readlines())` on every request) for lease files of growing size.
+Each file is a realistic mix: most leases are active, some have expired
+and a few never expire.
+
+Reports, per file size:
+- readlines   old per-request cost (and its over-count)
+- parse       LeaseIndex after dnsmasq rewrote the file (stat + parse)
+- cached      LeaseIndex when nothing changed (stat + bisect)
+
+Usage:
+    python3 testing/local/bench-leases.py
+    python3 testing/local/bench-leases.py --sizes 1000,10000,50000 --repeat 50
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+REPO = HERE.parent.parent
+sys.path.insert(0, str(REPO / "scripts" / "runtime"))
+
+from tide_leases import LeaseIndex
+
+
+def write_leases(path, count, seed=7):
+    """Lease file with ~80% active, ~15% expired, ~5% infinite -> active count"""
+    rng = random.Random(seed)
+    now = int(time.time())
+    active = 0
+    lines = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.05:
+            expiry = 0
+        elif roll < 0.20:
+            expiry = now - rng.randint(1, 86400)
+        else:
+            expiry = now + rng.randint(60, 86400)
+        active += expiry == 0 or expiry > now
+        lines.append(f"{expiry} 02:00:{i >> 24 & 255:02x}:{i >> 16 & 255:02x}:"
+                     f"{i >> 8 & 255:02x}:{i & 255:02x} 10.{i >> 16 & 255}."
+                     f"{i >> 8 & 255}.{i & 255} client-{i} 01:02:00:00:00:00:00\n")
+    lines.append("duid 00:01:00:01:2c:5f:1e:7a:02:00:00:00:00:01\n")
+    with open(path, "w") as f:
+        f.writelines(lines)
+    return active
+
+
+def timed(func, repeat):
+    """Median wall time of func() in milliseconds, plus its last result"""
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 4), result
+
+
+def bench(path, count, repeat):
+    expected = write_leases(path, count)
+
+    def readlines():
+        with open(path) as f:
+            return len(f.readlines())
+
+    def parse():
+        os.utime(path)  # What a dnsmasq rewrite looks like to the index
+        return index.active()
+
+    index = LeaseIndex(path)
+    old_ms, old_count = timed(readlines, repeat)
+    parse_ms, parsed = timed(parse, repeat)
+    cached_ms, cached = timed(index.active, repeat * 10)
+    return {
+        "leases": count,
+        "active": expected,
+        "readlines_ms": old_ms,
+        "readlines_count": old_count,
+        "parse_ms": parse_ms,
+        "cached_ms": cached_ms,
+        "correct": parsed == cached == expected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DHCP lease index")
+    parser.add_argument("--sizes", default="100,1000,10000",
+                        help="comma-separated lease counts (default 100,1000,10000)")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="timed runs per measurement (default 20)")
+    parser.add_argument("--output", help="results JSON "
+                        "(default testing/results/bench-leases-<timestamp>.json)")
+    args = parser.parse_args()
+
+    print("🌊 Tide DHCP lease index benchmark")
+    print("=" * 40)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="tide-leases-") as scratch:
+        path = os.path.join(scratch, "dnsmasq.leases")
+        for size in (int(s) for s in args.sizes.split(",") if s):
+            results.append(bench(path, size, args.repeat))
+
+    print(f"{'leases':>8}{'active':>8}{'readlines ms':>14}{'(counted)':>11}"
+          f"{'parse ms':>10}{'cached ms':>11}{'ok':>4}")
+    for r in results:
+        print(f"{r['leases']:>8}{r['active']:>8}{r['readlines_ms']:>14.3f}"
+              f"{r['readlines_count']:>11}{r['parse_ms']:>10.3f}"
+              f"{r['cached_ms']:>11.4f}{'✓' if r['correct'] else '✗':>4}")
+
+    output = args.output or str(REPO / "testing" / "results" / datetime.now()
+                                .strftime("bench-leases-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }, f, indent=2)
+    print()
+    print(f"Saved {output}")
+    return 0 if all(r["correct"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tide client subnet sweep benchmark
+==================================
+Times the client's opt-in subnet sweep (tide_gateway.discover_gateway
+with sweep=) over 127.0.0.0/24, with a stub Tide gateway on the last
+address and no other candidates or beacon.
+
+Two kinds of neighbours:
+- refused  hosts that answer the connect with RST (up, nothing on 9051)
+- silent   hosts that never answer the SYN, like addresses with no
+           machine behind them on a real LAN. Emulated with listeners
+           whose one-slot backlog is already full, so the kernel drops
+           further SYNs and each connect waits the full connect timeout.
+
+Reports, per concurrency cap, the median time until the gateway is found.
+The silent case is the LAN worst case: about
+ceil(hosts / concurrency) x SWEEP_CONNECT_TIMEOUT.
+
+Usage:
+    python3 testing/local/bench-sweep.py
+    python3 testing/local/bench-sweep.py --concurrency 32,128,256 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+REPO = HERE.parent.parent
+sys.path.insert(0, str(REPO / "client" / "shared"))
+
+import tide_gateway
+from tide_gateway import discover_gateway
+
+PORT = 19561
+GATEWAY = "127.0.0.254"
+HOSTS = [f"127.0.0.{i}" for i in range(1, 255)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        payload = json.dumps({"gateway": "tide", "version": "bench",
+                              "tor": "connected"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def silence(ip):
+    """Listener on ip:PORT whose full backlog makes it drop every SYN"""
+    listener = socket.socket()
+    listener.bind((ip, PORT))
+    listener.listen(0)
+    filler = socket.create_connection((ip, PORT))
+    return listener, filler
+
+
+def run(concurrency, repeat):
+    """Median seconds to find GATEWAY, and whether every run found it"""
+    samples, ok = [], True
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = discover_gateway([], PORT, deadline=30, beacon_port=None,
+                                 sweep=HOSTS, concurrency=concurrency)
+        samples.append(time.perf_counter() - started)
+        ok = ok and bool(found) and found[0] == GATEWAY
+    return round(statistics.median(samples), 4), ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the client subnet sweep")
+    parser.add_argument("--concurrency", default="32,64,128,256",
+                        help="comma-separated concurrency caps (default 32,64,128,256)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed sweeps per measurement (default 3)")
+    parser.add_argument("--output", help="results JSON "
+                        "(default testing/results/bench-sweep-<timestamp>.json)")
+    args = parser.parse_args()
+    caps = [int(c) for c in args.concurrency.split(",") if c]
+
+    print("🌊 Tide client subnet sweep benchmark")
+    print("=" * 40)
+    print(f"{len(HOSTS)} hosts, gateway at {GATEWAY}, "
+          f"connect timeout {tide_gateway.SWEEP_CONNECT_TIMEOUT}s")
+
+    server = Server((GATEWAY, PORT), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = []
+    for cap in caps:
+        seconds, ok = run(cap, args.repeat)
+        results.append({"neighbours": "refused", "concurrency": cap,
+                        "seconds": seconds, "found": ok})
+
+    silent = [silence(ip) for ip in HOSTS if ip != GATEWAY]
+    for cap in caps:
+        seconds, ok = run(cap, args.repeat)
+        results.append({"neighbours": "silent", "concurrency": cap,
+                        "seconds": seconds, "found": ok})
+    for listener, filler in silent:
+        filler.close()
+        listener.close()
+    server.shutdown()
+
+    print(f"{'neighbours':>11}{'concurrency':>13}{'seconds':>10}{'ok':>4}")
+    for r in results:
+        print(f"{r['neighbours']:>11}{r['concurrency']:>13}{r['seconds']:>10.3f}"
+              f"{'✓' if r['found'] else '✗':>4}")
+
+    output = args.output or str(REPO / "testing" / "results" / datetime.now()
+                                .strftime("bench-sweep-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "hosts": len(HOSTS),
+                "connect_timeout": tide_gateway.SWEEP_CONNECT_TIMEOUT,
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }, f, indent=2)
+    print()
+    print(f"Saved {output}")
+    return 0 if all(r["found"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
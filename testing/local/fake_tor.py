@@ -0,0 +1,334 @@
+"""
+Fake Tor for local testing
+==========================
+In-process stand-ins for the Tor daemon so the gateway services can be
+exercised without a VM or network access.
+
+- FakeControlPort: speaks enough of the control protocol for
+  tide_control.TorControl (PROTOCOLINFO, AUTHENTICATE, GETINFO, SIGNAL)
+- FakeSocks: SOCKS5 CONNECT relay standing in for Tor's SocksPort
+- FakeCheck: plain-HTTP check.torproject.org/api/ip (point
+  TIDE_CHECK_URL at it and curl reaches it through FakeSocks)
+- FakeDNS: UDP stand-in for Tor's DNSPort with a configurable
+  round-trip delay (point TIDE_DNS_UPSTREAM at it)
+
+Run as a script it impersonates the tor binary for the balancer
+(TIDE_TOR_BIN="python3 testing/local/fake_tor.py"): it reads `-f torrc`
+and serves a FakeSocks on every SocksPort and a FakeControlPort on the
+ControlPort until terminated.
+"""
+
+import http.server
+import json
+import os
+import select
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    def _reply(self, *lines):
+        self.wfile.write(''.join(l + '\r\n' for l in lines).encode())
+
+    def handle(self):
+        fake = self.server.fake
+        fake.connections += 1
+        authed = False
+
+        for raw in self.rfile:
+            line = raw.decode().strip()
+            if not line:
+                continue
+            verb, _, arg = line.partition(' ')
+            verb = verb.upper()
+            fake.commands.append(line)
+
+            if fake.drop_next:
+                fake.drop_next = False
+                return  # Simulate Tor restarting under us
+
+            if verb == 'PROTOCOLINFO':
+                self._reply('250-PROTOCOLINFO 1',
+                            f'250-AUTH METHODS=COOKIE,SAFECOOKIE '
+                            f'COOKIEFILE="{fake.cookie_path}"',
+                            '250-VERSION Tor="0.4.8.10"',
+                            '250 OK')
+            elif verb == 'AUTHENTICATE':
+                if arg.strip() == fake.cookie.hex() or \
+                        arg.strip() == f'"{fake.password}"':
+                    authed = True
+                    self._reply('250 OK')
+                else:
+                    self._reply('515 Authentication failed')
+                    return
+            elif not authed:
+                self._reply('514 Authentication required.')
+                return
+            elif verb == 'GETINFO':
+                lines = []
+                for key in arg.split():
+                    if key == 'status/bootstrap-phase':
+                        lines.append(
+                            f'250-status/bootstrap-phase=NOTICE BOOTSTRAP '
+                            f'PROGRESS={fake.progress} TAG={fake.tag} '
+                            f'SUMMARY="{fake.summary}"')
+                    elif key == 'circuit-status':
+                        lines.append('250+circuit-status=')
+                        lines.extend(fake.circuits)
+                        lines.append('.')
+                    else:
+                        self._reply(f'552 Unrecognized key "{key}"')
+                        break
+                else:
+                    self._reply(*lines, '250 OK')
+            elif verb == 'SIGNAL':
+                fake.signals.append(arg.strip())
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('250 closing connection')
+                return
+            else:
+                self._reply(f'510 Unrecognized command "{verb}"')
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class FakeControlPort:
+    """Threaded fake Tor ControlPort on 127.0.0.1 (random port by default)"""
+
+    def __init__(self, port=0, password='tide-test'):
+        self.password = password
+        self.cookie = os.urandom(32)
+        fd, self.cookie_path = tempfile.mkstemp(prefix='tide-cookie-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.cookie)
+
+        self.progress = 100
+        self.tag = 'done'
+        self.summary = 'Done'
+        self.circuits = [
+            '7 BUILT $AAAA~guard,$BBBB~middle,$CCCC~exit PURPOSE=GENERAL',
+            '8 EXTENDED $DDDD~guard2 PURPOSE=GENERAL',
+        ]
+        self.commands = []
+        self.signals = []
+        self.connections = 0
+        self.drop_next = False
+
+        self._server = _Server(('127.0.0.1', port), _ControlHandler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+
+    def set_bootstrap(self, progress, tag='starting', summary='Starting'):
+        self.progress, self.tag, self.summary = progress, tag, summary
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        try:
+            os.unlink(self.cookie_path)
+        except OSError:
+            pass
+
+
+class _SocksHandler(socketserver.BaseRequestHandler):
+    def _recv(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError()
+            data += chunk
+        return data
+
+    def handle(self):
+        try:
+            _ver, nmethods = self._recv(2)
+            if 2 in self._recv(nmethods):
+                # Username/password (accepted as-is, like Tor's IsolateSOCKSAuth)
+                self.request.sendall(b'\x05\x02')
+                _ver, ulen = self._recv(2)
+                user = self._recv(ulen)
+                self._recv(self._recv(1)[0])
+                self.server.fake.usernames.append(user.decode())
+                self.request.sendall(b'\x01\x00')
+            else:
+                self.request.sendall(b'\x05\x00')  # No authentication
+
+            _ver, cmd, _rsv, atyp = self._recv(4)
+            if atyp == 1:
+                host = socket.inet_ntoa(self._recv(4))
+            elif atyp == 3:
+                host = self._recv(self._recv(1)[0]).decode()
+            else:
+                host = socket.inet_ntop(socket.AF_INET6, self._recv(16))
+            port = struct.unpack('!H', self._recv(2))[0]
+
+            if cmd != 1:
+                self.request.sendall(b'\x05\x07\x00\x01' + bytes(6))
+                return
+            try:
+                upstream = socket.create_connection((host, port), timeout=5)
+            except OSError:
+                self.request.sendall(b'\x05\x05\x00\x01' + bytes(6))
+                return
+            self.request.sendall(b'\x05\x00\x00\x01' + bytes(6))
+            self.server.fake.connections += 1
+            self._relay(upstream)
+        except (ConnectionError, OSError, ValueError):
+            pass
+
+    def _relay(self, upstream):
+        with upstream:
+            sockets = [self.request, upstream]
+            while True:
+                readable, _, _ = select.select(sockets, [], [], 30)
+                if not readable:
+                    return
+                for sock in readable:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    (upstream if sock is self.request else self.request).sendall(data)
+
+
+class FakeSocks:
+    """Threaded SOCKS5 (no auth, CONNECT only) relay on 127.0.0.1"""
+
+    def __init__(self, port=0):
+        self.connections = 0
+        self.usernames = []
+        self._server = _Server(('127.0.0.1', port), _SocksHandler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _CheckHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        fake = self.server.fake
+        fake.requests += 1
+        body = json.dumps({"IsTor": True, "IP": fake.exit_ip}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # Quiet, like the real services
+
+
+class FakeCheck:
+    """Plain-HTTP stand-in for check.torproject.org/api/ip"""
+
+    def __init__(self, port=0, exit_ip='198.51.100.7'):
+        self.exit_ip = exit_ip
+        self.requests = 0
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', port),
+                                                       _CheckHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+        self.url = f'http://127.0.0.1:{self.port}/api/ip'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _DNSHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        fake = self.server.fake
+        fake.queries += 1
+        time.sleep(fake.delay)  # Tor circuit round-trip
+
+        # Question ends at the root label + QTYPE/QCLASS
+        end = 12
+        while end < len(data) and data[end]:
+            end += 1 + data[end]
+        question = data[12:end + 5]
+        name = data[12:end].lower()
+        flags = 0x8180 | (3 if name.endswith(b'\x07invalid') else 0)
+        answers = 0 if flags & 3 else 1
+        reply = data[:2] + struct.pack('!HHHHH', flags, 1, answers, 0, 0) + question
+        if answers:
+            # A record, name compressed to the question, address from the name
+            reply += struct.pack('!HHHIH', 0xC00C, 1, 1, fake.ttl, 4)
+            reply += bytes([198, 51, 100, sum(name) % 256])
+        sock.sendto(reply, self.client_address)
+
+
+class _UDPServer(socketserver.ThreadingMixIn, socketserver.UDPServer):
+    daemon_threads = True
+
+
+class FakeDNS:
+    """Threaded UDP fake of Tor's DNSPort: A answers after `delay` seconds"""
+
+    def __init__(self, port=0, delay=0.2, ttl=300):
+        self.delay = delay
+        self.ttl = ttl
+        self.queries = 0
+        self._server = _UDPServer(('127.0.0.1', port), _DNSHandler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _serve_torrc(path):
+    """Impersonate `tor -f path`: fake every SocksPort and the ControlPort"""
+    fakes = []
+    with open(path) as f:
+        for line in f:
+            words = line.split()
+            if len(words) < 2 or words[0] not in ('SocksPort', 'ControlPort'):
+                continue
+            port = int(words[1].rsplit(':', 1)[-1])
+            if words[0] == 'SocksPort':
+                fakes.append(FakeSocks(port).start())
+            else:
+                fakes.append(FakeControlPort(port).start())
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        signal.pause()
+    finally:
+        for fake in fakes:
+            fake.stop()
+
+
+if __name__ == '__main__':
+    _serve_torrc(sys.argv[sys.argv.index('-f') + 1])
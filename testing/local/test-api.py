@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Tide API - local test
+=====================
+Starts tide-api.py against fake Tor (fake_tor: ControlPort, SOCKS5 relay
+and check endpoint) and a scratch state tree, and checks request
+handling that the benchmarks do not look at: HEAD on write routes,
+/snapshot deadline parsing, /status conditional GETs across samples,
+who gets the opt-in "processes" field and what /newcircuit?wait=1
+reports; then, with TIDE_WORKERS=3, that prefork workers share the
+supervisor's exit lookup and NEWNYM scheduler. No Tor, VM or network
+needed.
+
+Usage: python3 testing/local/test-api.py
+"""
+
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+REPO = HERE.parent.parent
+RUNTIME = REPO / "scripts" / "runtime"
+sys.path.insert(0, str(HERE))
+
+from fake_tor import FakeCheck, FakeControlPort, FakeSocks
+
+TOKEN = "tide-test-token"
+
+failures = 0
+
+
+def check(name, condition):
+    global failures
+    print(f"  {'✓' if condition else '✗'} {name}")
+    if not condition:
+        failures += 1
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_root():
+    root = Path(tempfile.mkdtemp(prefix="tide-api-"))
+    for rel, value in (("etc/tide/mode", "router"),
+                       ("etc/tide/security", "standard"),
+                       ("opt/tide/VERSION", "1.2.0-test")):
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(value + "\n")
+    return root
+
+
+def get(port, path, headers=None, host="127.0.0.1", method="GET"):
+    """(status, headers, parsed JSON body or None)"""
+    conn = http.client.HTTPConnection(host, port, timeout=20)
+    try:
+        conn.request(method, path, headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        return (response.status, dict(response.getheaders()),
+                json.loads(body) if body else None)
+    finally:
+        conn.close()
+
+
+def lan_address():
+    """This machine's non-loopback address (None without one)"""
+    try:
+        # connect() on UDP only picks a route - nothing is sent
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(("10.101.101.10", 9))
+            address = sock.getsockname()[0]
+    except OSError:
+        return None
+    return None if address.startswith("127.") else address
+
+
+def wait_ready(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if get(port, "/discover")[0] == 200:
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def start_api(control, socks, check_url, **extra):
+    """(tide-api.py process, port) on a scratch state tree"""
+    port = free_port()
+    env = dict(os.environ,
+               TIDE_ROOT=str(make_root()),
+               TIDE_API_PORT=str(port),
+               TIDE_CONTROL_PORT=str(control.port),
+               TIDE_SOCKS_PORT=str(socks.port),
+               TIDE_CHECK_URL=check_url.url,
+               TIDE_STATUS_INTERVAL="0.5",
+               TIDE_BEACON_INTERVAL="0",
+               TIDE_API_TOKEN=TOKEN,
+               **extra)
+    api = subprocess.Popen([sys.executable, str(RUNTIME / "tide-api.py")], env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return api, port
+
+
+def stop_api(api):
+    api.terminate()
+    api.wait(5)
+
+
+def main():
+    print("🌊 Tide API")
+    print("=" * 40)
+    control = FakeControlPort().start()
+    socks = FakeSocks().start()
+    check_url = FakeCheck().start()
+    auth = {"Authorization": f"Bearer {TOKEN}"}
+
+    api, port = start_api(control, socks, check_url)
+    try:
+        check("API up", wait_ready(port))
+
+        print("[1/6] HEAD")
+        status, _, _ = get(port, "/status", method="HEAD")
+        check("HEAD /status -> 200", status == 200)
+        signals = len(control.signals)
+        status, headers, _ = get(port, "/newcircuit?wait=1", auth, method="HEAD")
+        check("HEAD /newcircuit -> 405, no NEWNYM sent",
+              status == 405 and headers.get("Allow") == "GET" and
+              len(control.signals) == signals)
+
+        print("[2/6] /newcircuit?wait=1")
+        status, _, body = get(port, "/newcircuit?wait=1", auth)
+        check("no exit looked up before -> changed is null",
+              status == 200 and body and body.get("ready") and
+              "changed" in body and body["changed"] is None)
+        status, _, body = get(port, "/newcircuit?wait=1", auth)
+        check("known previous exit -> changed is a boolean (same fake exit)",
+              status == 200 and body and body.get("changed") is False)
+
+        print("[3/6] /snapshot deadline")
+        for value in ("nan", "inf", "-inf", "bogus"):
+            status, _, body = get(port, f"/snapshot?deadline={value}")
+            check(f"deadline={value} -> default deadline, nothing partial",
+                  status == 200 and body and body["partial"] == [])
+        status, _, body = get(port, "/snapshot?deadline=0")
+        check("deadline=0 -> slow parts listed as partial",
+              status == 200 and body and "circuit" in body["partial"])
+
+        print("[4/6] /status conditional GET")
+        status, headers, first = get(port, "/status")
+        etag = headers.get("ETag")
+        time.sleep(1.5)  # Several samples; uptime moves on
+        status, _, _ = get(port, "/status", {"If-None-Match": etag or ""})
+        check(f"unchanged gateway -> 304 on the next poll ({etag})",
+              etag and first.get("uptime") is not None and status == 304)
+        control.set_bootstrap(45, "loading_descriptors", "Loading relay descriptors")
+        time.sleep(1.5)
+        status, headers, body = get(port, "/status", {"If-None-Match": etag or ""})
+        check("Tor state change -> 200 with a new ETag",
+              status == 200 and headers.get("ETag") != etag and
+              body and body["bootstrap"] == 45)
+
+        print("[5/6] processes field")
+        _, _, body = get(port, "/status")
+        check("not in the default response", body and "processes" not in body)
+        _, _, body = get(port, "/status?fields=tor,processes")
+        check("?fields=processes from loopback", body and "processes" in body)
+        lan = lan_address()
+        if lan:
+            _, _, body = get(port, "/status?fields=tor,processes", host=lan)
+            check(f"?fields=processes from {lan} without the token -> dropped",
+                  body and "tor" in body and "processes" not in body)
+            _, _, body = get(port, "/status?fields=processes", auth, host=lan)
+            check(f"?fields=processes from {lan} with the token",
+                  body and "processes" in body)
+        else:
+            print("  - no LAN address, LAN client checks skipped")
+    finally:
+        stop_api(api)
+
+    print("[6/6] Prefork workers share circuit state")
+    control.set_bootstrap(100, "done", "Done")
+    api, port = start_api(control, socks, check_url, TIDE_WORKERS="3")
+    try:
+        check("3 workers up", wait_ready(port))
+        time.sleep(1)  # Every worker bound, supervisor serving
+        with ThreadPoolExecutor(12) as pool:
+            lookups = check_url.requests
+            exits = list(pool.map(lambda _: get(port, "/circuit")[2], range(12)))
+            check(f"12 /circuit calls -> one exit lookup "
+                  f"({check_url.requests - lookups})",
+                  all(e and e.get("IP") for e in exits) and
+                  check_url.requests - lookups == 1)
+            signals = len(control.signals)
+            replies = list(pool.map(
+                lambda _: get(port, "/newcircuit", auth)[2], range(6)))
+            sent = control.signals[signals:]
+            check(f"6 /newcircuit calls -> one NEWNYM now, the rest scheduled "
+                  f"({len(sent)})",
+                  sent == ["NEWNYM"] and all(r and r["success"] for r in replies))
+        lookups = check_url.requests
+        exits = [get(port, "/circuit")[2] for _ in range(6)]
+        check("after the NEWNYM every worker looks the exit up again, once",
+              all(e and e.get("IP") for e in exits) and
+              check_url.requests - lookups == 1)
+    finally:
+        stop_api(api)
+        control.stop()
+        socks.stop()
+        check_url.stop()
+
+    print()
+    print("✅ All checks passed" if not failures else f"❌ {failures} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tide Tor balancer - local test
+==============================
+Checks TorPool's placement rules in-process, then runs tide-balancer.py
+with two fake tor instances (fake_tor.py run as the tor binary) and
+sends SOCKS5 streams through it to fake_tor.FakeCheck.
+No Tor, VM or network needed. Uses instance ports 19050-19300.
+
+Usage: python3 testing/local/test-balancer.py
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+RUNTIME = HERE.parent.parent / "scripts" / "runtime"
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(RUNTIME))
+
+SCRATCH = tempfile.mkdtemp(prefix="tide-balancer-")
+os.environ["TIDE_ROOT"] = SCRATCH  # Before tide_balance picks STATE_DIR
+
+from fake_tor import FakeCheck
+import tide_balance
+from tide_balance import TorInstance, TorPool
+
+failures = 0
+
+
+def check(name, condition):
+    global failures
+    print(f"  {'✓' if condition else '✗'} {name}")
+    if not condition:
+        failures += 1
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def socks5_get(port, url, user=None):
+    """HTTP GET through a SOCKS5 proxy -> response body"""
+    host, _, rest = url.split("//", 1)[1].partition(":")
+    target, path = int(rest.split("/", 1)[0]), "/" + rest.split("/", 1)[1]
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as s:
+        if user:
+            s.sendall(b"\x05\x01\x02")
+            assert s.recv(2) == b"\x05\x02"
+            s.sendall(b"\x01" + bytes([len(user)]) + user.encode() + b"\x01x")
+            assert s.recv(2) == b"\x01\x00"
+        else:
+            s.sendall(b"\x05\x01\x00")
+            assert s.recv(2) == b"\x05\x00"
+        s.sendall(b"\x05\x01\x00\x03" + bytes([len(host)]) + host.encode()
+                  + target.to_bytes(2, "big"))
+        reply = s.recv(10)
+        if len(reply) < 2 or reply[1] != 0:
+            return None
+        s.sendall(f"GET {path} HTTP/1.0\r\nHost: {host}\r\n\r\n".encode())
+        data = b""
+        while chunk := s.recv(4096):
+            data += chunk
+    return data.split(b"\r\n\r\n", 1)[-1]
+
+
+def read_state(timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = tide_balance.read_state()
+        if state and all(i["state"] == "ready" for i in state["instances"]):
+            return state
+        time.sleep(0.5)
+    return tide_balance.read_state()
+
+
+def placement():
+    pool = TorPool(os.devnull, 3, 3)
+    for index in range(3):
+        inst = TorInstance(index, "/nonexistent", 0)
+        inst.proc, inst.state = object(), "ready"
+        pool.instances.append(inst)
+
+    picks = [pool.pick(f"client{i}") for i in range(6)]
+    check("new clients spread by open streams",
+          [i.index for i in picks] == [0, 1, 2, 0, 1, 2])
+    again = [pool.pick("client0") for _ in range(3)]
+    check("client stays on its instance", {i.index for i in again} == {0})
+    pool.instances[0].state = "unhealthy"
+    moved = pool.pick("client0")
+    check("client moves off an unhealthy instance", moved.index != 0)
+    pool.instances[0].state = "ready"
+    for inst in picks + again + [moved]:
+        pool.release(inst)
+    check("released streams are no longer counted",
+          [i.streams for i in pool.instances] == [0, 0, 0])
+
+
+def main():
+    print("🌊 Tide Tor balancer")
+    print("=" * 40)
+
+    print("[1/3] Placement")
+    placement()
+
+    print("[2/3] SOCKS5 through two fake tor instances")
+    fake_check = FakeCheck().start()
+    socks_port = free_port()
+    torrc = os.path.join(SCRATCH, "torrc")
+    with open(torrc, "w") as f:
+        f.write(f"DataDirectory {SCRATCH}/tor\n"
+                "SocksPort 0.0.0.0:9050 IsolateDestPort\n"
+                f"ControlPort 127.0.0.1:{free_port()}\n"
+                "SafeLogging 1\n")
+    env = dict(os.environ,
+               TIDE_TOR_INSTANCES="2",
+               TIDE_TORRC=torrc,
+               TIDE_TOR_BIN=f"{sys.executable} {HERE / 'fake_tor.py'}",
+               TIDE_SOCKS_LISTEN=f"127.0.0.1:{socks_port}",
+               TIDE_TRANS_LISTEN="")
+    proc = subprocess.Popen([sys.executable, str(RUNTIME / "tide-balancer.py")],
+                            env=env, stdout=subprocess.DEVNULL)
+    try:
+        state = read_state(20)
+        check("two instances ready",
+              state is not None and len(state["instances"]) == 2 and
+              all(i["state"] == "ready" for i in state["instances"]))
+        with open(f"{tide_balance.STATE_DIR}/tor-1.torrc") as f:
+            generated = f.read()
+        check("instance torrc keeps SocksPort flags on its own port",
+              "SocksPort 127.0.0.1:19051 IsolateDestPort" in generated and
+              "SafeLogging 1" in generated)
+
+        bodies = [socks5_get(socks_port, fake_check.url) for _ in range(3)]
+        check("streams reach the exit",
+              all(b and json.loads(b)["IsTor"] for b in bodies))
+        body = socks5_get(socks_port, fake_check.url, user="isolated")
+        check("client credentials accepted", body and json.loads(body)["IsTor"])
+
+        time.sleep(tide_balance.HEALTH_INTERVAL + 1)
+        state = tide_balance.read_state()
+        check("one client, pinned to one instance",
+              state and sum(i["clients"] for i in state["instances"]) == 1)
+        check("no streams left open",
+              state and sum(i["streams"] for i in state["instances"]) == 0)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        fake_check.stop()
+
+    print("[3/3] Shutdown")
+    check("balancer exited", proc.returncode is not None)
+    check("state file removed", not os.path.exists(tide_balance.STATE_FILE))
+
+    print()
+    print("✅ All checks passed" if not failures else f"❌ {failures} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
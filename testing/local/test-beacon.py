@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Tide beacon - local test
+========================
+Starts tide-api.py against fake Tor with its beacon aimed at loopback,
+and checks what arrives on the UDP port: the payload layout, repeats
+every interval with an unchanged sequence, an immediate beacon with a
+new sequence when Tor state changes, and that the client's discovery
+finds the gateway from the beacon alone. No Tor, VM or network needed.
+
+Usage: python3 testing/local/test-beacon.py
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+REPO = HERE.parent.parent
+RUNTIME = REPO / "scripts" / "runtime"
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(RUNTIME))
+sys.path.insert(0, str(REPO / "client" / "shared"))
+
+from fake_tor import FakeCheck, FakeControlPort, FakeSocks
+from tide_beacon import decode
+from tide_gateway import discover_gateway
+
+INTERVAL = 1.0
+
+failures = 0
+
+
+def check(name, condition):
+    global failures
+    print(f"  {'✓' if condition else '✗'} {name}")
+    if not condition:
+        failures += 1
+
+
+def free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_root():
+    root = Path(tempfile.mkdtemp(prefix="tide-beacon-"))
+    for rel, value in (("etc/tide/mode", "router"),
+                       ("etc/tide/security", "standard"),
+                       ("opt/tide/VERSION", "1.2.0-test")):
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(value + "\n")
+    return root
+
+
+def receive(sock, timeout):
+    """(decoded beacon, seconds waited) or (None, timeout)"""
+    started = time.monotonic()
+    sock.settimeout(timeout)
+    try:
+        data, _addr = sock.recvfrom(1024)
+    except socket.timeout:
+        return None, timeout
+    return decode(data), time.monotonic() - started
+
+
+def main():
+    print("🌊 Tide beacon")
+    print("=" * 40)
+    control = FakeControlPort().start()
+    socks = FakeSocks().start()
+    check_url = FakeCheck().start()
+    api_port = free_port()
+    beacon_port = free_port(socket.SOCK_DGRAM)
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(("127.0.0.1", beacon_port))
+
+    env = dict(os.environ,
+               TIDE_ROOT=str(make_root()),
+               TIDE_API_PORT=str(api_port),
+               TIDE_CONTROL_PORT=str(control.port),
+               TIDE_SOCKS_PORT=str(socks.port),
+               TIDE_CHECK_URL=check_url.url,
+               TIDE_STATUS_INTERVAL="0.5",
+               TIDE_GATEWAY_IP="127.0.0.1",
+               TIDE_BEACON_TARGET="127.0.0.1",
+               TIDE_BEACON_PORT=str(beacon_port),
+               TIDE_BEACON_INTERVAL=str(INTERVAL))
+    api = subprocess.Popen([sys.executable, str(RUNTIME / "tide-api.py")], env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        print("[1/3] Startup beacon")
+        first, _ = receive(listener, 10)
+        check("beacon received", first is not None)
+        first = first or {}
+        check("payload: ip, API port, protocol, version",
+              first.get("ip") == "127.0.0.1" and first.get("api_port") == api_port
+              and first.get("protocol") == 1 and first.get("version") == "1.2.0-test")
+        check("Tor state and bootstrap",
+              first.get("tor") == "connected" and first.get("bootstrap") == 100)
+
+        print("[2/3] Repeats and changes")
+        again, waited = receive(listener, INTERVAL * 3)
+        check(f"repeated after ~{INTERVAL:g}s with the same seq ({waited:.2f}s)",
+              again is not None and again.get("seq") == first.get("seq") and
+              INTERVAL * 0.5 < waited < INTERVAL * 2)
+        control.set_bootstrap(45, "loading_descriptors", "Loading relay descriptors")
+        changed, waited = None, 0.0
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            beacon, took = receive(listener, deadline - time.monotonic())
+            waited += took
+            if beacon and beacon.get("seq") != first.get("seq"):
+                changed = beacon
+                break
+        check(f"state change beacon at once with the next seq ({waited:.2f}s)",
+              changed is not None and changed.get("seq") == first.get("seq") + 1 and
+              changed.get("tor") == "bootstrapping" and changed.get("bootstrap") == 45
+              and waited < INTERVAL)
+
+        print("[3/3] Client discovery from the beacon")
+        listener.close()
+        found = discover_gateway([], api_port, deadline=INTERVAL * 3,
+                                 beacon_port=beacon_port)
+        check("discover_gateway finds the API via its beacon",
+              found is not None and found[0] == "127.0.0.1" and
+              found[1].get("gateway") == "tide")
+    finally:
+        api.terminate()
+        api.wait(5)
+        control.stop()
+        socks.stop()
+        check_url.stop()
+
+    print()
+    print("✅ All checks passed" if not failures else f"❌ {failures} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tide ControlPort client - local test
+====================================
+Runs tide_control.TorControl against fake_tor.FakeControlPort.
+No Tor, VM or network needed.
+
+Usage: python3 testing/local/test-control-port.py
+"""
+
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(HERE.parent.parent / "scripts" / "runtime"))
+
+from fake_tor import FakeControlPort
+from tide_control import TorControl, ControlError
+
+failures = 0
+
+
+def check(name, condition):
+    global failures
+    print(f"  {'✓' if condition else '✗'} {name}")
+    if not condition:
+        failures += 1
+
+
+def main():
+    print("🌊 Tide ControlPort client")
+    print("=" * 40)
+
+    fake = FakeControlPort().start()
+    try:
+        ctl = TorControl(port=fake.port)
+
+        print("[1/4] Cookie authentication + bootstrap phase")
+        phase = ctl.bootstrap_phase()
+        check("progress parsed", phase["progress"] == 100)
+        check("summary unquoted", phase["summary"] == "Done")
+        check("authenticated with cookie",
+              f"AUTHENTICATE {fake.cookie.hex()}" in fake.commands)
+
+        print("[2/4] Persistent connection, circuits, NEWNYM")
+        fake.set_bootstrap(45, "loading_descriptors", "Loading relay descriptors")
+        check("bootstrapping reported",
+              ctl.tor_status() == ("bootstrapping", 45))
+        circuits = ctl.circuit_status()
+        check("circuit-status parsed",
+              [c["id"] for c in circuits] == ["7", "8"]
+              and circuits[0]["path"] == ["guard", "middle", "exit"])
+        check("NEWNYM sent", ctl.newnym() and fake.signals == ["NEWNYM"])
+        check("single connection reused", fake.connections == 1)
+
+        print("[3/4] Reconnect after Tor drops the connection")
+        fake.drop_next = True
+        fake.set_bootstrap(100, "done", "Done")
+        check("command retried transparently",
+              ctl.tor_status() == ("connected", 100))
+        check("reconnected once", fake.connections == 2)
+
+        print("[4/4] Password auth and failures")
+        pw = TorControl(port=fake.port, password=fake.password)
+        check("password accepted", pw.bootstrap_phase()["progress"] == 100)
+        bad = TorControl(port=fake.port, password="wrong")
+        try:
+            bad.bootstrap_phase()
+            check("bad password rejected", False)
+        except ControlError:
+            check("bad password rejected", True)
+        for c in (ctl, pw, bad):
+            c.close()
+    finally:
+        fake.stop()
+
+    gone = TorControl(port=fake.port, timeout=0.5)
+    state, _ = gone.tor_status()
+    check("unreachable ControlPort falls back to SOCKS probe",
+          state in ("offline", "connected"))
+
+    print()
+    print("✅ All checks passed" if not failures else f"❌ {failures} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
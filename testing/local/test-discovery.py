@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Tide client discovery - local test
+==================================
+Runs the shared client's discover_gateway against stub gateways on
+loopback addresses (127.0.0.x): a Tide gateway answering slowly, a
+non-Tide web server and a host that accepts but never answers. Checks
+that the first valid answer wins, that a beacon-announced gateway is
+found, and that the deadline holds. Also covers the on-disk discovery
+cache: a cached gateway is revalidated with one conditional probe and
+full discovery is skipped, the opt-in subnet sweep, and the background
+beacon listener's gateway table, whose gateways are only trusted once
+they answer as Tide. No Tor, VM or network needed.
+
+Usage: python3 testing/local/test-discovery.py
+"""
+
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent.parent / "client" / "shared"))
+
+from ipaddress import IPv4Interface
+
+from tide_gateway import (BeaconListener, DiscoveryCache, beacon_listener,
+                          discover_gateway, locate_gateway, network_identity,
+                          sweep_hosts)
+
+PORT = 19551
+BEACON = 19552
+
+failures = 0
+not_modified = []   # IPs that answered 304
+requests = []       # IPs that got a request
+
+
+def check(name, condition):
+    global failures
+    print(f"  {'✓' if condition else '✗'} {name}")
+    if not condition:
+        failures += 1
+
+
+def stub(ip, body, delay=0.0):
+    """HTTP server on ip:PORT answering every GET with body after delay"""
+
+    etag = f'W/"{ip}"'
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(ip)
+            time.sleep(delay)
+            if self.headers.get("If-None-Match") == etag:
+                not_modified.append(ip)
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            pass  # Cancelled probes hang up before the answer
+
+    server = Server((ip, PORT), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def black_hole(ip):
+    """Accepts connections on ip:PORT and never answers"""
+    sock = socket.socket()
+    sock.bind((ip, PORT))
+    sock.listen(16)
+    return sock
+
+
+def timed(*args, **kwargs):
+    started = time.monotonic()
+    found = discover_gateway(*args, **kwargs)
+    return found, time.monotonic() - started
+
+
+def main():
+    print("🌊 Tide client discovery")
+    print("=" * 40)
+    tide = {"gateway": "tide", "version": "1.2.0", "tor": "connected"}
+    servers = [
+        stub("127.0.0.2", {"hello": "router"}),
+        stub("127.0.0.3", tide, delay=0.3),
+        stub("127.0.0.4", tide, delay=1.5),
+        stub("127.0.0.5", tide),
+    ]
+    hole = black_hole("127.0.0.6")
+
+    print("[1/6] Concurrent probes")
+    found, took = timed(["127.0.0.6", "127.0.0.2", "127.0.0.4", "127.0.0.3"],
+                        PORT, deadline=5, beacon_port=None)
+    check(f"fastest Tide gateway wins ({took:.2f}s)",
+          found and found[0] == "127.0.0.3" and found[1]["version"] == "1.2.0"
+          and found[2] == 'W/"127.0.0.3"' and took < 1.0)
+    found, took = timed(["127.0.0.6", "127.0.0.2"], PORT, deadline=1,
+                        beacon_port=None)
+    check(f"no gateway -> None at the deadline ({took:.2f}s)",
+          found is None and 0.9 < took < 1.5)
+    found, took = timed(["127.0.0.2", "127.0.0.7"], PORT, deadline=5,
+                        beacon_port=None)
+    check(f"all probes refused -> None without waiting ({took:.2f}s)",
+          found is None and took < 0.5)
+
+    print("[2/6] Beacon")
+
+    def announce():
+        time.sleep(0.3)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b"TIDE:127.0.0.5", ("127.0.0.1", BEACON))
+
+    threading.Thread(target=announce, daemon=True).start()
+    found, took = timed(["127.0.0.6"], PORT, deadline=3, beacon_port=BEACON)
+    check(f"beacon-announced gateway found ({took:.2f}s)",
+          found and found[0] == "127.0.0.5" and took < 1.0)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.bind(("", BEACON))
+            released = True
+        except OSError:
+            released = False
+    check("beacon port released after discovery", released)
+
+    print("[3/6] Deadline")
+    found, took = timed(["127.0.0.4"], PORT, deadline=0.5, beacon_port=None)
+    check(f"slow gateway past the deadline -> None ({took:.2f}s)",
+          found is None and took < 1.0)
+
+    print("[4/6] Discovery cache")
+    cache = DiscoveryCache(os.path.join(tempfile.mkdtemp(prefix="tide-discovery-"),
+                                        "gateways.json"))
+    lookups = []
+
+    def default_gateway():
+        lookups.append(1)
+        return "127.0.0.5"
+
+    found = locate_gateway(default_gateway, PORT, deadline=3, cache=cache,
+                           beacon_port=None)
+    check("first run: full discovery, result cached",
+          found and found[0] == "127.0.0.5" and len(lookups) == 1)
+    started = time.monotonic()
+    found = locate_gateway(default_gateway, PORT, deadline=3, cache=cache,
+                           beacon_port=None)
+    took = time.monotonic() - started
+    check(f"second run: cached gateway revalidated with a 304 ({took * 1000:.0f} ms)",
+          found == ("127.0.0.5", tide, PORT) and len(lookups) == 1 and
+          not_modified == ["127.0.0.5"])
+    with open(cache.path) as f:
+        check(f"cache file does not name the network ({network_identity()})",
+              network_identity().split(":", 1)[1] not in f.read())
+    cache.put("stale-network", "127.0.0.9", PORT, tide, None)
+    check("unreachable cached gateway -> no revalidation",
+          cache.revalidate("stale-network") is None)
+
+    print("[5/6] Subnet sweep")
+    found, took = timed(["127.0.0.2"], PORT, deadline=3, beacon_port=None,
+                        sweep=[f"127.0.0.{i}" for i in range(2, 64)])
+    check(f"gateway off the candidate list found by the sweep ({took:.2f}s)",
+          found and found[0] == "127.0.0.5" and took < 1.0)
+    hosts = sweep_hosts([IPv4Interface("127.0.0.1/8"), IPv4Interface("169.254.3.4/16"),
+                         IPv4Interface("10.7.3.9/16"), IPv4Interface("192.168.5.21/30")])
+    check("sweep skips loopback/link-local, cuts wide nets to our /24",
+          hosts[0] == "10.7.3.1" and len(hosts) == 253 + 1 and
+          "10.7.3.9" not in hosts and hosts[-1] == "192.168.5.22")
+
+    print("[6/6] Beacon listener")
+    listener = beacon_listener(BEACON)
+
+    def beacon(payload):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(payload, ("127.0.0.1", BEACON))
+        time.sleep(0.05)
+
+    beacon(f"TIDE:127.0.0.5:{PORT}:1:1760000000:bootstrapping:45:1.2.0".encode())
+    beacon(b"TIDE:127.0.0.3")
+    heard = listener.gateways()
+    check("table holds both gateways, latest first",
+          [g["ip"] for g in heard] == ["127.0.0.3", "127.0.0.5"])
+    check("protocol 1 beacon parsed",
+          heard[1:] and heard[1]["api_port"] == PORT and heard[1]["seq"] == 1760000000
+          and heard[1]["tor"] == "bootstrapping" and heard[1]["bootstrap"] == 45)
+    beacon(f"TIDE:127.0.0.5:{PORT}:1:1760000001:connected:100:1.2.0".encode())
+    # Latest beacon: a LAN host that is no Tide gateway claiming to be one
+    beacon(f"TIDE:127.0.0.2:{PORT}:1:1760000000:connected:100:1.2.0".encode())
+    lookups.clear()
+    requests.clear()
+    found = locate_gateway(default_gateway, PORT, deadline=3, cache=cache,
+                           beacon_port=BEACON)
+    check("forged beacon rejected, real gateway verified with one probe",
+          found and found[0] == "127.0.0.5" and found[2] == PORT and
+          "127.0.0.2" in requests and requests.count("127.0.0.5") == 1
+          and not lookups)
+    requests.clear()
+    started = time.monotonic()
+    found = locate_gateway(default_gateway, PORT, deadline=3, cache=cache,
+                           beacon_port=BEACON)
+    took = time.monotonic() - started
+    check(f"verified gateway answered from the table, no probe ({took * 1000:.0f} ms)",
+          found and found[0] == "127.0.0.5" and found[1]["tor"] == "connected"
+          and not requests and not lookups and took < 0.1)
+    beacon(f"TIDE:127.0.0.5:{PORT + 7}:1:1760000002:connected:100:1.2.0".encode())
+    requests.clear()
+    found = locate_gateway(default_gateway, PORT, deadline=3, cache=cache,
+                           beacon_port=BEACON)
+    check("beacon naming another API port is probed there -> next gateway wins",
+          found and found[0] == "127.0.0.3" and "127.0.0.5" not in requests)
+    found, took = timed(["127.0.0.6"], PORT, deadline=3, beacon_port=BEACON)
+    check(f"discovery round follows the running listener ({took:.2f}s)",
+          found and found[0] in ("127.0.0.3", "127.0.0.5") and took < 1.0)
+    listener.stop()
+    time.sleep(1.2)
+    check("listener stops and releases the port", not listener.running)
+
+    short = BeaconListener(BEACON, expiry=0.3)
+    short.start()
+    beacon(b"TIDE:127.0.0.5")
+    fresh = [g["ip"] for g in short.gateways()]
+    time.sleep(0.4)
+    check("entries expire after the last beacon",
+          fresh == ["127.0.0.5"] and short.gateways() == [])
+    short.stop()
+
+    for server in servers:
+        server.shutdown()
+    hole.close()
+
+    print()
+    print("✅ All checks passed" if not failures else f"❌ {failures} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tide status record - local test
+===============================
+Runs tide_record's writer in a separate process rewriting the record as
+fast as it can, and checks that readers never see a torn record. Also
+covers staleness, the layout check and the `tide status` shell output.
+No Tor, VM or network needed.
+
+Usage: python3 testing/local/test-status-record.py
+"""
+
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+RUNTIME = HERE.parent.parent / "scripts" / "runtime"
+sys.path.insert(0, str(RUNTIME))
+
+SCRATCH = tempfile.mkdtemp(prefix="tide-record-")
+os.environ["TIDE_ROOT"] = SCRATCH  # Before tide_record picks RECORD_FILE
+
+import tide_record
+from tide_record import StatusRecord, StatusRecordWriter
+
+failures = 0
+
+
+def check(name, condition):
+    global failures
+    print(f"  {'✓' if condition else '✗'} {name}")
+    if not condition:
+        failures += 1
+
+
+def fields(n):
+    """Snapshot whose string fields all encode n - a torn read mixes them"""
+    return {"tor": "connected", "bootstrap": n % 101, "mode": f"m{n}",
+            "security": f"s{n}", "version": f"v{n}", "clients": n}
+
+
+def exit_info(n):
+    return {"IsTor": True, "IP": f"198.51.{n % 256}.{n % 7}"}
+
+
+def hammer(path, stop):
+    writer = StatusRecordWriter(path)
+    n = 0
+    while not stop.is_set():
+        n += 1
+        writer.write(fields(n), exit_info(n), time.time())
+
+
+def main():
+    print("🌊 Tide status record")
+    print("=" * 40)
+    path = tide_record.RECORD_FILE
+
+    print("[1/3] Missing and fresh records")
+    reader = StatusRecord(path)
+    check("no record -> None", reader.read() is None)
+    writer = StatusRecordWriter(path)
+    writer.write(fields(7), {"IsTor": True, "IP": "198.51.100.7", "Country": "NL"},
+                 time.time() - 3)
+    data = reader.read()
+    check("fields round-trip",
+          data and data["mode"] == "m7" and data["clients"] == 7 and
+          data["bootstrap"] == 7 and data["tor"] == "connected")
+    check("exit info and its age",
+          data and data["exit"] == {"IsTor": True, "IP": "198.51.100.7",
+                                    "Country": "NL"} and
+          2.5 < data["exit_age"] < 4)
+    out = subprocess.run([sys.executable, str(RUNTIME / "tide_record.py")],
+                         capture_output=True, text=True, env=os.environ)
+    check("shell output for tide status",
+          out.returncode == 0 and "TIDE_MODE=m7" in out.stdout and
+          "TIDE_EXIT_IP=198.51.100.7" in out.stdout)
+
+    print("[2/3] Concurrent writer")
+    writer.write(fields(0), exit_info(0), time.time())
+    stop = multiprocessing.Event()
+    proc = multiprocessing.Process(target=hammer, args=(path, stop))
+    proc.start()
+    reads = torn = missed = 0
+    deadline = time.monotonic() + 2
+    started = time.perf_counter()
+    while time.monotonic() < deadline:
+        data = reader.read()
+        reads += 1
+        if data is None:
+            missed += 1
+            continue
+        n = data["clients"]
+        if (data["mode"], data["version"], data["bootstrap"], data["exit"]) != \
+                (f"m{n}", f"v{n}", n % 101, exit_info(n)):
+            torn += 1
+    elapsed = time.perf_counter() - started
+    stop.set()
+    proc.join(5)
+    check(f"{reads} reads, none torn", reads > 1000 and torn == 0)
+    check(f"writer never starved readers ({missed} misses)", missed < reads / 20)
+    print(f"    {elapsed / reads * 1e6:.1f} us per read under write load")
+
+    print("[3/3] Stale and foreign records")
+    check("stale record -> None", StatusRecord(path, max_age=-1).read() is None)
+    with open(path, "r+b") as f:
+        f.seek(4)
+        f.write(b"\xff\xff")   # Layout from the future
+    check("unknown layout -> None", StatusRecord(path).read() is None)
+    StatusRecordWriter(path).write(fields(9))
+    check("writer restarts the record", (StatusRecord(path).read() or {}).get("mode") == "m9")
+
+    print()
+    print("✅ All checks passed" if not failures else f"❌ {failures} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())